@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+数据和训练流程的性能基准测试。
+
+使用确定性的合成行情(股票数 x 交易日数)逐阶段测量吞吐量和峰值内存，结果保存为 JSON，
+可以与之前保存的结果对比，吞吐量下降超过阈值时以非零状态码退出。
+
+用法:
+    python -m benchmarks.run_benchmarks --codes 200 --days 750 --output result.json
+    python -m benchmarks.run_benchmarks --baseline result.json --max-regression 0.2
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from data.RL_data.baostock_data import FIELDS, _parse_rows
+from data.RL_data.build_dataset import DatasetBuilder
+from data.RL_data.compact import to_compact
+from data.RL_data.data_factory import DataSourceFactory
+from data.RL_data.dataset_store import save_dataset
+from data.RL_data.feature_store import FeatureStore, compute_features
+from data.RL_data.replay_data import ReplayDataFetcher
+from data.RL_data.trend_analysis import TrendAnalyzer
+from logger.logging_config import logger
+
+START_DATE = '20150105'
+
+def measure(func, repeat):
+    """
+    测量一个阶段：先在 tracemalloc 下运行一次得到峰值内存，再不带跟踪运行 repeat 次计时。
+
+    返回:
+        dict: best_seconds(最快一次耗时)、median_seconds、peak_memory_mb
+    """
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'best_seconds': min(timings),
+        'median_seconds': float(np.median(timings)),
+        'peak_memory_mb': peak / 1024 / 1024
+    }
+
+def make_windows(data, window, max_windows):
+    """从合成行情中切出最多 max_windows 个等长收盘价窗口"""
+    windows = [
+        sliding_window_view(group['close'].to_numpy(dtype=np.float64), window)
+        for _, group in data.groupby('code', sort=False)
+        if len(group) >= window
+    ]
+    return np.concatenate(windows)[:max_windows]
+
+def make_baostock_rows(data):
+    """把合成行情转换为 Baostock 返回的原始字符串行"""
+    raw = pd.DataFrame({
+        'date': data['date'].str[:4] + '-' + data['date'].str[4:6] + '-' + data['date'].str[6:],
+        'code': 'sh.' + data['code'],
+        **{col: data[col].map('{:.4f}'.format) for col in ['open', 'high', 'low', 'close']},
+        'volume': data['volume'].map('{:.0f}'.format),
+        'amount': (data['volume'] * data['close']).map('{:.4f}'.format)
+    })
+    return raw[FIELDS].to_numpy(dtype=object)
+
+def build_stages(args, data, codes, end_date, work_dir, selected=None):
+    """
+    构造各阶段的 (名称, 处理量, 单位, 函数)。
+
+    指定 selected 时只构造其中的阶段，写入回放缓存、保存环境数据集等准备工作只在需要时进行。
+    """
+    def wanted(*names):
+        return selected is None or any(name in selected for name in names)
+
+    def make_builder(**kwargs):
+        params = dict(codes=codes, start_date=START_DATE, end_date=end_date, input_window=args.input_window,
+                      output_window=args.output_window, stride=args.stride)
+        params.update(kwargs)
+        return DatasetBuilder(**params)
+
+    builder = make_builder()
+    stages = []
+    if wanted('zigzag_pivots', 'zigzag_pivots_batch', 'analyze_stock_trend', 'analyze_trend_batch'):
+        windows = make_windows(data, args.output_window, args.max_windows)
+        window_frames = [pd.DataFrame({'close': window}) for window in windows]
+        stages += [
+            ('zigzag_pivots', len(windows), 'windows',
+             lambda: [TrendAnalyzer.zigzag_pivots(frame, pct_threshold=2.0) for frame in window_frames]),
+            ('zigzag_pivots_batch', len(windows), 'windows',
+             lambda: TrendAnalyzer.zigzag_pivots_batch(windows, 2.0)),
+            ('analyze_stock_trend', len(windows), 'windows',
+             lambda: [TrendAnalyzer.analyze_stock_trend(frame) for frame in window_frames]),
+            ('analyze_trend_batch', len(windows), 'windows',
+             lambda: TrendAnalyzer.analyze_trend_batch(windows)),
+        ]
+
+    if wanted('baostock_parse'):
+        baostock_rows = make_baostock_rows(data)
+        stages.append(('baostock_parse', len(data), 'bars', lambda: _parse_rows(baostock_rows)))
+
+    parallel_builder = make_builder(workers=args.workers)
+    # 多预测期：一次构建 5 天、10 天和 output_window 天的标签
+    horizon_builder = make_builder(output_window=sorted({5, 10, args.output_window}))
+    feature_builder = make_builder(feature_store=FeatureStore(root_path=os.path.join(work_dir, 'featurestore')))
+    stages += [
+        ('build_samples', len(data), 'bars',
+         lambda: builder.build_samples(data)),
+        ('build_samples_parallel', len(data), 'bars',
+         lambda: parallel_builder.build_samples(data)),
+        ('build_samples_horizons', len(data), 'bars',
+         lambda: horizon_builder.build_samples(data)),
+    ]
+    if wanted('compute_features'):
+        groups = [group for _, group in data.groupby('code', sort=False)]
+        stages.append(('compute_features', len(data), 'bars',
+                       lambda: [compute_features(group) for group in groups]))
+    # 第一次运行后特征已在缓存中，计时的是特征窗口的切片和拼接
+    stages.append(('build_samples_features', len(data), 'bars', lambda: feature_builder.build_samples(data)))
+    if wanted('build_samples_compact'):
+        compact_builder = make_builder(compact=True)
+        compact_data = to_compact(data, codes)
+        stages.append(('build_samples_compact', len(data), 'bars',
+                       lambda: compact_builder.build_samples(compact_data)))
+
+    if wanted('handle_cached_data', 'handle_cached_data_compact', 'replay_cold', 'replay_warm'):
+        # 把合成行情写入临时缓存，再通过回放数据源读取
+        cache_root = os.path.join(work_dir, 'cachedata')
+        replay = DataSourceFactory.create_data_source(
+            'replay', 'zh', START_DATE, end_date, codes, replay_source='synthetic', cache_root=cache_root)
+        replay.cache.write(data)
+        replay.cache.add_coverage(codes, START_DATE, end_date)
+        compact_replay = DataSourceFactory.create_data_source(
+            'replay', 'zh', START_DATE, end_date, codes, replay_source='synthetic', cache_root=cache_root,
+            compact=True)
+
+        def run_replay():
+            ReplayDataFetcher.clear_memory()
+            replay.get_day_trade_data()
+
+        stages += [
+            ('handle_cached_data', len(data), 'bars', replay._handle_cached_data),
+            ('handle_cached_data_compact', len(data), 'bars', compact_replay._handle_cached_data),
+            ('replay_cold', len(data), 'bars', run_replay),
+            ('replay_warm', len(data), 'bars', replay.get_day_trade_data),
+        ]
+
+    stages += build_model_stages(args, builder, data, work_dir, wanted)
+    return [stage for stage in stages if wanted(stage[0])]
+
+def build_model_stages(args, builder, data, work_dir, wanted):
+    """构造环境和 PyTorch 数据集的阶段，两者共用一个保存到 work_dir 的数据集，都不需要时不保存"""
+    env_stages = ('trend_predict_env_step', 'vec_trend_predict_env_step')
+    torch_stages = ('torch_loader_per_sample', 'torch_loader_batched')
+    if not wanted(*env_stages, *torch_stages):
+        return []
+    try:
+        from rl_model.trend_predict_env import TrendPredictEnv
+        from rl_model.vec_trend_predict_env import VecTrendPredictEnv
+    except ImportError as e:
+        logger.warning(f'跳过环境基准测试: {str(e)}')
+        return []
+
+    samples = builder.build_samples(data)
+    dataset_dir = os.path.join(work_dir, 'dataset')
+    save_dataset(builder.split_dataset(samples['X'], samples['y']), dataset_dir, builder.get_metadata())
+
+    stages = []
+    if wanted(*env_stages):
+        env = TrendPredictEnv(dataset_dir=dataset_dir)
+        vec_env = VecTrendPredictEnv(num_envs=args.num_envs, dataset_dir=dataset_dir, seed=0)
+        actions = np.zeros(args.num_envs, dtype=np.int64)
+
+        def run_env():
+            env.reset()
+            for _ in range(args.env_steps):
+                if env.step(1)[2]:
+                    env.reset()
+
+        def run_vec_env():
+            vec_env.reset()
+            for _ in range(args.env_steps // args.num_envs):
+                vec_env.step(actions)
+
+        stages += [
+            ('trend_predict_env_step', args.env_steps, 'steps', run_env),
+            ('vec_trend_predict_env_step', args.env_steps // args.num_envs * args.num_envs, 'steps', run_vec_env),
+        ]
+
+    if not wanted(*torch_stages):
+        return stages
+    try:
+        from torch.utils.data import DataLoader
+        from rl_model.torch_dataset import TrendDataset, make_data_loader
+    except ImportError as e:
+        logger.warning(f'跳过 PyTorch 数据集基准测试: {str(e)}')
+        return stages
+
+    torch_dataset = TrendDataset.from_directory(dataset_dir)
+    n_train = len(torch_dataset)
+
+    def run_per_sample_loader():
+        # 逐样本取数据再合并的默认用法，作为对比
+        for _ in DataLoader(torch_dataset.X, batch_size=args.torch_batch_size, shuffle=True):
+            pass
+
+    def run_batch_loader():
+        for _ in make_data_loader(torch_dataset, args.torch_batch_size):
+            pass
+
+    stages += [
+        ('torch_loader_per_sample', n_train, 'samples', run_per_sample_loader),
+        ('torch_loader_batched', n_train, 'samples', run_batch_loader),
+    ]
+    return stages
+
+def run(args):
+    """运行全部(或指定的)阶段，返回结果字典"""
+    codes = [f'{600000 + i:06d}' for i in range(args.codes)]
+    end_date = pd.bdate_range(START_DATE, periods=args.days)[-1].strftime('%Y%m%d')
+    data = DataSourceFactory.create_data_source(
+        'synthetic', 'zh', START_DATE, end_date, codes, seed=args.seed).get_day_trade_data()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, items, unit, func in build_stages(args, data, codes, end_date, work_dir, args.stages):
+            stats = measure(func, args.repeat)
+            stats.update({
+                'stage': name,
+                'items': items,
+                'unit': unit,
+                'throughput': items / stats['best_seconds'] if stats['best_seconds'] > 0 else float('inf')
+            })
+            results.append(stats)
+            print(f"{name}: {stats['throughput']:.1f} {unit}/s, 峰值内存 {stats['peak_memory_mb']:.1f} MB")
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__
+        },
+        'results': results
+    }
+
+def compare(report, baseline, max_regression):
+    """
+    与基准结果对比各阶段的吞吐量。
+
+    返回:
+        list[str]: 吞吐量下降超过 max_regression 的阶段说明
+    """
+    previous = {item['stage']: item for item in baseline['results']}
+    regressions = []
+    for item in report['results']:
+        if item['stage'] not in previous:
+            continue
+        ratio = item['throughput'] / previous[item['stage']]['throughput']
+        if ratio < 1 - max_regression:
+            regressions.append(f"{item['stage']}: 吞吐量为基准的 {ratio:.0%}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='数据和训练流程性能基准测试')
+    parser.add_argument('--codes', type=int, default=100, help='合成股票数量')
+    parser.add_argument('--days', type=int, default=750, help='每只股票的交易日数量')
+    parser.add_argument('--input-window', type=int, default=60, help='输入窗口大小')
+    parser.add_argument('--output-window', type=int, default=20, help='输出窗口大小')
+    parser.add_argument('--stride', type=int, default=5, help='滑动窗口步长')
+    parser.add_argument('--max-windows', type=int, default=2000, help='逐窗口阶段最多处理的窗口数')
+    parser.add_argument('--env-steps', type=int, default=10000, help='环境交互步数')
+    parser.add_argument('--num-envs', type=int, default=64, help='批量环境的游标数量')
+    parser.add_argument('--workers', type=int, default=4, help='并行构建样本的进程数')
+    parser.add_argument('--torch-batch-size', type=int, default=256, help='PyTorch 数据集基准测试的批大小')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段计时的重复次数')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--stages', type=lambda s: s.split(','), default=None,
+                        help='只运行指定的阶段，用逗号分隔')
+    parser.add_argument('--output', type=str, default=None, help='结果 JSON 文件路径')
+    parser.add_argument('--baseline', type=str, default=None, help='用于对比的基准结果 JSON 文件')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='允许的吞吐量下降比例，超过时以非零状态码退出')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # 逐窗口分析会输出大量 INFO 日志，测试期间只保留警告
+    root_logger = logging.getLogger()
+    level = root_logger.level
+    root_logger.setLevel(logging.WARNING)
+    try:
+        report = run(args)
+    finally:
+        root_logger.setLevel(level)
+
+    output = args.output or os.path.join(
+        'benchmark_results', f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'基准测试结果已保存到: {output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print('性能回退:')
+            for line in regressions:
+                print(f'- {line}')
+            return 1
+        print('与基准相比没有性能回退')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
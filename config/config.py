@@ -12,4 +12,36 @@ class ConfigJson:
         self.mjs_token = os.getenv('MJS_TOKEN')
         
         if not self.tushare_token or not self.mjs_token:
-            raise ValueError("TUSHARE_TOKEN or MJS_TOKEN not found in environment variables") 
\ No newline at end of file
+            raise ValueError("TUSHARE_TOKEN or MJS_TOKEN not found in environment variables") 
+    def get_cache_budgets(self):
+        """
+        读取缓存目录的容量预算，未设置的项为 None(不限制)。
+
+        环境变量:
+            FSLLM_MARKET_CACHE_MAX_BYTES / FSLLM_MARKET_CACHE_MAX_AGE_DAYS    行情缓存 data/cachedata
+            FSLLM_DATASET_CACHE_MAX_BYTES / FSLLM_DATASET_CACHE_MAX_AGE_DAYS  数据集目录 cachedataset
+        容量可以带单位，如 500M、20G。
+
+        返回:
+            dict: {'market': {'max_bytes': ..., 'max_age_days': ...}, 'dataset': {...}}
+        """
+        budgets = {}
+        for target in ('market', 'dataset'):
+            max_bytes = os.getenv(f'FSLLM_{target.upper()}_CACHE_MAX_BYTES')
+            max_age_days = os.getenv(f'FSLLM_{target.upper()}_CACHE_MAX_AGE_DAYS')
+            budgets[target] = {
+                'max_bytes': parse_size(max_bytes) if max_bytes else None,
+                'max_age_days': float(max_age_days) if max_age_days else None
+            }
+        return budgets
+
+def parse_size(text):
+    """把 500M、20G、1048576 这样的容量解析为字节数"""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    text = str(text).strip().upper().removesuffix('B')
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise ValueError(f"无效的容量: {text}，请使用字节数或 K/M/G/T 单位") from None
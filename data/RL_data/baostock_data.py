@@ -1,21 +1,133 @@
-import os
 import baostock as bs
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from multiprocessing import util
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from .base_data import BaseDataFetcher, prue_num_code
 from logger.logging_config import logger
+from logger.instrumentation import span
+
+def _login():
+    """登录 Baostock，baostock 客户端的会话是进程内全局的"""
+    lg = bs.login()
+    if lg.error_code != '0':
+        raise ConnectionError(f"Baostock login failed: {lg.error_msg}")
+
+def _init_worker():
+    """子进程初始化：每个进程只登录一次，进程退出时登出"""
+    _login()
+    util.Finalize(None, bs.logout, exitpriority=10)
+
+# 查询的字段，与返回数据的列一致
+FIELDS = ['date', 'code', 'open', 'high', 'low', 'close', 'volume', 'amount']
+NUMERIC_FIELDS = FIELDS[2:]
+
+def _read_pages(rs):
+    """
+    按页读取查询结果：每次取出当前页剩余的全部行，再由 next() 请求下一页，不逐行调用 get_row_data。
+
+    返回:
+        list[list[list[str]]]: 各页的原始数据行
+    """
+    pages = []
+    while rs.next():
+        pages.append(rs.data[rs.cur_row_num:])
+        rs.cur_row_num = len(rs.data)
+    return pages
+
+def _query_rows(formatted_codes, formatted_start_date, formatted_end_date):
+    """
+    查询一组股票的日线数据，需要当前进程已登录。
+
+    返回:
+        ndarray: (行数, 字段数) 的原始字符串数组，按总行数预先分配后逐页整块填入
+    """
+    pages = []
+    for formatted_code in formatted_codes:
+        rs = bs.query_history_k_data_plus(
+            formatted_code,
+            ','.join(FIELDS),
+            start_date=formatted_start_date,
+            end_date=formatted_end_date,
+            frequency='d',
+            adjustflag="3"
+        )
+        
+        if rs is None or rs.error_code != '0':
+            raise ValueError(f"Failed to get data for {formatted_code}: {rs.error_msg if rs else 'No response'}")
+            
+        pages += _read_pages(rs)
+
+    rows = np.empty((sum(len(page) for page in pages), len(FIELDS)), dtype=object)
+    offset = 0
+    for page in pages:
+        rows[offset:offset + len(page)] = page
+        offset += len(page)
+    return rows
+
+def _map_unique(values, func):
+    """重复很多的列(日期、代码)只转换不重复的值，再按编码映射回每一行"""
+    codes, uniques = pd.factorize(values)
+    return np.array([func(value) for value in uniques], dtype=object)[codes]
+
+def _to_float(values):
+    """
+    字符串数组转换为 float64，有无法直接转换的值时去掉千位分隔符再逐个解析，
+    仍无法解析的值(如空字符串)视为缺失值
+    """
+    try:
+        return values.astype(np.float64)
+    except ValueError:
+        stripped = pd.Series(values, dtype=object).str.replace(',', '', regex=False).str.strip()
+        return pd.to_numeric(stripped, errors='coerce').to_numpy(dtype=np.float64)
+
+def _parse_rows(rows):
+    """
+    把原始字符串数组解析为数据：日期去掉连字符，代码只保留数字，数值列转换为 float64，
+    无法解析的数值(如停牌日的空字符串)视为缺失，缺失数值的行被过滤掉。
+
+    返回:
+        DataFrame: 列为 FIELDS
+    """
+    df = pd.DataFrame({
+        'date': _map_unique(rows[:, 0], lambda x: x.replace('-', '')),
+        'code': _map_unique(rows[:, 1], prue_num_code),
+        **{col: _to_float(rows[:, i]) for i, col in enumerate(FIELDS) if col in NUMERIC_FIELDS}
+    })
+    result = df.dropna(subset=NUMERIC_FIELDS).reset_index(drop=True)
+    if len(result) < len(df):
+        logger.warning(f"{len(df) - len(result)} 行数据的数值无法解析，已过滤")
+    return result
+
+def _query_frame(formatted_codes, formatted_start_date, formatted_end_date):
+    """查询并解析一组股票的数据，多进程模式下解析也在子进程中完成"""
+    return _parse_rows(_query_rows(formatted_codes, formatted_start_date, formatted_end_date))
 
 class BaostockDataFetcher(BaseDataFetcher):
-    def __init__(self, country, start_date, end_date, code_list):
-        super().__init__(country, start_date, end_date, code_list)
-        lg = bs.login()
-        if lg.error_code != '0':
-            raise ConnectionError(f"Baostock login failed: {lg.error_msg}")
+    source_name = 'baostock'
+    columns = ['date', 'code', 'open', 'high', 'low', 'close', 'volume', 'amount']
+
+    def __init__(self, country, start_date, end_date, code_list, workers=1, chunk_size=20, compact=False):
+        """
+        参数:
+            workers (int): 下载进程数，大于1时每个子进程独立登录，分批获取股票数据；
+                为1时在当前进程串行获取
+            chunk_size (int): 多进程模式下每个任务包含的股票数量
+            compact (bool): 是否以紧凑格式返回数据
+        """
+        super().__init__(country, start_date, end_date, code_list, compact=compact)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.logged_in = False
+        if self.workers <= 1:
+            _login()
+            self.logged_in = True
 
     def __del__(self):
         """析构函数，确保退出时登出"""
-        bs.logout()
+        if self.logged_in:
+            bs.logout()
 
     def _format_stock_code(self, code):
         """格式化股票代码"""
@@ -27,87 +139,42 @@ class BaostockDataFetcher(BaseDataFetcher):
         """将YYYYMMDD格式转换为YYYY-MM-DD格式"""
         return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
 
-    def _process_result(self, df):
-        """处理返回的数据"""
-        if df.empty:
-            return df
+    def _fetch_frame_parallel(self, formatted_codes, formatted_start_date, formatted_end_date):
+        """多进程获取数据：股票按 chunk_size 分片，各进程登录一次后依次获取并解析分到的分片"""
+        chunks = [formatted_codes[i:i + self.chunk_size]
+                  for i in range(0, len(formatted_codes), self.chunk_size)]
+        results = [None] * len(chunks)
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks)),
+                                 initializer=_init_worker) as executor:
+            futures = {
+                executor.submit(_query_frame, chunk, formatted_start_date, formatted_end_date): i
+                for i, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                logger.debug(f"Baostock 分片 {futures[future] + 1}/{len(chunks)} 获取完成")
+        # 按分片顺序合并，保证结果顺序与串行获取一致
+        return pd.concat(results, ignore_index=True)
 
-        # 处理日期和代码
-        df['date'] = df['date'].apply(lambda x: x.replace('-', ''))
-        df['code'] = df['code'].apply(prue_num_code)
-        
-        # 确保数值列的类型正确
-        numeric_columns = ['open', 'high', 'low', 'close', 'volume', 'amount']
-        for col in numeric_columns:
-            # 先移除可能的逗号和空格
-            if df[col].dtype == 'object':
-                df[col] = df[col].str.replace(',', '').str.strip()
-            # 转换为float类型
-            df[col] = df[col].astype(np.float64)
-        
-        # 过滤掉无效数据
-        df = df.dropna(subset=numeric_columns)
+    def _fetch_day_trade_data(self, code_list, start_date, end_date):
+        """从 Baostock 获取指定股票和日期区间的日线数据"""
+        formatted_start_date = self._format_date(start_date)
+        formatted_end_date = self._format_date(end_date)
+        formatted_codes = [self._format_stock_code(code) for code in code_list]
         
-        return df[['date', 'code', 'open', 'high', 'low', 'close', 'volume', 'amount']]
-
-    def _handle_cached_data(self, cache_path):
-        """处理缓存数据"""
-        df = pd.read_csv(cache_path, dtype={
-            'date': str,
-            'code': str,
-            'open': np.float64,
-            'high': np.float64,
-            'low': np.float64,
-            'close': np.float64,
-            'volume': np.float64,
-            'amount': np.float64
-        })
-        return df[df['code'].isin(self.code_list)]
-
-    def get_day_trade_data(self):
-        cache_path = self.get_cache_path("trade_data")
-        if os.path.exists(cache_path):
-            return self._handle_cached_data(cache_path)
-            
-        data_list = []
-        formatted_start_date = self._format_date(self.start_date)
-        formatted_end_date = self._format_date(self.end_date)
-        
-        for bs_code in self.code_list:
-            formatted_code = self._format_stock_code(bs_code)
-            rs = bs.query_history_k_data_plus(
-                formatted_code,
-                "date,code,open,high,low,close,volume,amount",
-                start_date=formatted_start_date,
-                end_date=formatted_end_date,
-                frequency='d',
-                adjustflag="3"
-            )
-            
-            if rs is None or rs.error_code != '0':
-                raise ValueError(f"Failed to get data for {bs_code}: {rs.error_msg if rs else 'No response'}")
+        if self.workers > 1 and len(formatted_codes) > 1:
+            result = self._fetch_frame_parallel(formatted_codes, formatted_start_date, formatted_end_date)
+        else:
+            if not self.logged_in:
+                _login()
+                self.logged_in = True
+            rows = _query_rows(formatted_codes, formatted_start_date, formatted_end_date)
+            with span('parse', items=len(rows), source=self.source_name):
+                result = _parse_rows(rows)
                 
-            while rs.next():
-                data_list.append(rs.get_row_data())
-                
-        if not data_list:
-            logger.warning(f"No data found for period {formatted_start_date} to {formatted_end_date}")
-            return pd.DataFrame(columns=["date", "code", "open", "high", "low", "close", "volume", "amount"])
-            
-        result = pd.DataFrame(data_list, columns=["date", "code", "open", "high", "low", "close", "volume", "amount"])
-        result = self._process_result(result)
+        if result.empty:
+            logger.info(f"No data found for period {formatted_start_date} to {formatted_end_date}")
+            return pd.DataFrame(columns=self.columns)
         
         # 保存前再次确认数据类型
-        result = result.astype({
-            'date': str,
-            'code': str,
-            'open': np.float64,
-            'high': np.float64,
-            'low': np.float64,
-            'close': np.float64,
-            'volume': np.float64,
-            'amount': np.float64
-        })
-        
-        result.to_csv(cache_path, index=False)
-        return result 
\ No newline at end of file
+        return result.astype(self.dtypes)
@@ -1,8 +1,12 @@
 import datetime
-import os
+import numpy as np
 import pandas as pd
 from config.config import ConfigJson
 from logger.logging_config import logger
+from logger.instrumentation import span
+from .market_cache import MarketDataCache
+from .compact import to_compact
+from .cache_manager import enforce_market_budget
 
 def timestampchange(x):
     return datetime.datetime.strptime(x, '%Y-%m-%d').strftime('%Y%m%d')
@@ -11,31 +15,122 @@ def prue_num_code(x):
     return ''.join(e for e in x if e.isdigit())
 
 class BaseDataFetcher:
-    def __init__(self, country, start_date, end_date, code_list):
+    # 数据源名称，用于区分缓存目录
+    source_name = None
+    # 返回数据的列
+    columns = ['date', 'code', 'open', 'high', 'low', 'close', 'volume']
+    # 数据频率和复权方式，作为缓存目录的键
+    frequency = 'd'
+    adjust = 'none'
+
+    def __init__(self, country, start_date, end_date, code_list, compact=False):
+        """
+        参数:
+            compact (bool): 是否以紧凑格式返回数据(见 compact.to_compact)，缓存中始终保存标准格式
+        """
         self.country = country.lower()
         self.start_date = start_date
         self.end_date = end_date
         self.code_list = code_list
-        
-    def get_cache_path(self, data_type):
-        """获取缓存文件路径，如果缓存目录不存在则创建"""
-        root_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cachedata')
-        # 确保缓存目录存在
-        os.makedirs(root_path, exist_ok=True)
-        
-        # 根据国家类型处理代码
+        self.compact = compact
+        self.cache = MarketDataCache(self.source_name, self.country,
+                                     frequency=self.frequency, adjust=self.adjust)
+        # 最近一次获取中失败的股票，这些股票不会记为已缓存
+        self.failed_codes = set()
+
+    @property
+    def dtypes(self):
+        """返回数据各列的类型：日期和代码为字符串，其余为float64"""
+        return {col: (str if col in ('date', 'code') else np.float64) for col in self.columns}
+
+    def _to_cache_code(self, code):
+        """获取用于缓存的股票代码"""
         if self.country == 'zh':
             # 中国股票只保留数字部分
-            codes_str = '_'.join(sorted([prue_num_code(code) for code in self.code_list]))
-        else:
-            # 其他市场（如美股）保留原始代码
-            codes_str = '_'.join(sorted(self.code_list))
-        
-        file_name = f"{self.country}_{data_type}_{codes_str}_{self.start_date}to{self.end_date}.csv"
-        return os.path.join(root_path, file_name)
+            return prue_num_code(code)
+        # 其他市场（如美股）保留原始代码
+        return code
+
+    def get_cache_codes(self):
+        """获取全部请求股票用于缓存的代码"""
+        return [self._to_cache_code(code) for code in self.code_list]
+
+    def get_missing_ranges(self):
+        """
+        计算每只股票在请求日期范围内尚未缓存的区间，并把缺失区间相同的股票合并到一起，
+        以便一次请求获取。全部股票的已缓存区间在一个连接中批量查询。
+
+        返回:
+            dict: {(开始日期, 结束日期): [股票代码, ...]}
+        """
+        gaps = self.cache.missing_ranges_for(self.get_cache_codes(), self.start_date, self.end_date)
+        missing = {}
+        for code in self.code_list:
+            for gap in gaps[self._to_cache_code(code)]:
+                missing.setdefault(gap, []).append(code)
+        return missing
+
+    def save_to_cache(self, df, code_list, start_date, end_date):
+        """
+        将获取到的数据写入缓存，并记录这些股票在该区间内已缓存。
+        今天及以后的日期数据可能还不完整，不记为已缓存，下次请求时会重新获取。
+        """
+        with span('cache_write', items=len(df), source=self.source_name):
+            self.cache.write(df)
+        yesterday = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime('%Y%m%d')
+        self.cache.add_coverage([self._to_cache_code(code) for code in code_list],
+                                start_date, min(end_date, yesterday))
+
+    def _to_output(self, df):
+        """把标准格式的数据转换为返回给调用方的格式"""
+        if self.compact:
+            return to_compact(df, self.get_cache_codes())
+        return df.astype(self.dtypes)
+
+    def _handle_cached_data(self):
+        """处理缓存数据，股票代码和日期过滤、列选择都下推到缓存读取"""
+        df = self.cache.read(self.get_cache_codes(), self.start_date, self.end_date, columns=self.columns)
+        return self._to_output(df)
+
+    def _fetch_day_trade_data(self, code_list, start_date, end_date):
+        """
+        从数据源获取指定股票和日期区间的日线数据，由子类实现。
+        单只股票获取失败时应记录到 self.failed_codes 中，而不是让整批失败。
+        """
+        raise NotImplementedError
+
+    def _fetch_and_cache(self, code_list, start_date, end_date):
+        """获取缺失区间的数据并写入缓存，子类可覆盖以实现边获取边写入"""
+        result = self._fetch_day_trade_data(code_list, start_date, end_date)
+        self.save_to_cache(result, [code for code in code_list if code not in self.failed_codes],
+                           start_date, end_date)
         
     def get_trade_cal(self):
         raise NotImplementedError
         
     def get_day_trade_data(self):
-        raise NotImplementedError 
\ No newline at end of file
+        """
+        获取日线数据。只从数据源获取缓存中缺失的股票和日期区间，合并入缓存后统一从缓存读取，
+        因此请求已缓存数据的任意子区间或子集时不会访问数据源。
+        """
+        missing = self.get_missing_ranges()
+        # 记录本次请求中获取失败的股票，调用方可据此判断结果是否完整
+        self.failed_codes = set()
+        for (start_date, end_date), code_list in missing.items():
+            logger.info(f"从 {self.source_name} 获取 {len(code_list)} 只股票 {start_date} 到 {end_date} 的数据")
+            failed_before = set(self.failed_codes)
+            with span('fetch', unit='codes', items=len(code_list), source=self.source_name):
+                self._fetch_and_cache(code_list, start_date, end_date)
+            failed = self.failed_codes - failed_before
+            if failed:
+                logger.warning(f"{len(failed)} 只股票获取失败，下次请求时会重新获取: {sorted(failed)}")
+
+        with span('cache_read', source=self.source_name) as s:
+            result = self._handle_cached_data()
+            s.add_items(len(result))
+        if missing:
+            # 缓存增长后按配置的预算淘汰最久未使用的分区，本次读取的分区访问时间最新，最后才会被淘汰
+            enforce_market_budget(self.cache.root_path)
+        if result.empty:
+            logger.warning(f"No data found for period {self.start_date} to {self.end_date}")
+        return result
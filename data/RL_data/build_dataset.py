@@ -2,17 +2,50 @@
 
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timedelta
 from data.RL_data.data_factory import DataSourceFactory
 from data.RL_data.trend_analysis import TrendAnalyzer
+from data.RL_data.dataset_store import (
+    MANIFEST_FILE, FORMAT_VERSION, save_dataset, save_manifest, load_manifest, load_dataset, append_shards,
+    remove_shards, remove_unlisted_shards, load_checkpoint, save_checkpoint, clear_checkpoint
+)
+from data.RL_data.cache_manager import DATASET_CACHE_DIR, enforce_dataset_budget
+from data.RL_data.compact import days_to_dates
 from logger.logging_config import logger
+from logger.instrumentation import instrumentation, span
 import os
 
+# 趋势到数值标签的映射
+TREND_LABELS = {
+    'Uptrend': 2,
+    'Sideways': 1,
+    'Downtrend': 0
+}
+
+def date_strings(dates):
+    """行情的日期列转换为 YYYYMMDD 字符串，紧凑格式的日期是天数"""
+    dates = np.asarray(dates)
+    return days_to_dates(dates) if np.issubdtype(dates.dtype, np.integer) else dates.astype(str)
+
+def _analyze_chunk(output_windows, return_pivots, horizons=None):
+    """进程池任务：分析一批输出窗口的趋势，窗口以 NumPy 数组传入"""
+    if horizons is not None:
+        return TrendAnalyzer.analyze_trend_horizons(output_windows, horizons, return_pivots=return_pivots)
+    return TrendAnalyzer.analyze_trend_batch(output_windows, return_pivots=return_pivots)
+
 class DatasetBuilder:
+    # 窗口数少于该值时不启动进程池，直接在当前进程计算
+    MIN_PARALLEL_WINDOWS = 4096
+    # 每个工作进程平均分到的任务数，任务更小可以让各进程的负载更均衡
+    CHUNKS_PER_WORKER = 4
+
     def __init__(self, market='zh', source='baostock', codes=None, 
                  start_date=None, end_date=None,
                  input_window=60, output_window=20,
-                 train_ratio=0.7):
+                 train_ratio=0.7, stride=5, source_kwargs=None, label_cache=None, compact=False,
+                 workers=1, feature_store=None):
         """
         初始化数据集构建器
         
@@ -23,15 +56,33 @@ class DatasetBuilder:
             start_date (str): 开始日期，格式YYYYMMDD，默认为3年前
             end_date (str): 结束日期，格式YYYYMMDD，默认为今天
             input_window (int): 输入窗口大小，默认60天
-            output_window (int): 输出窗口大小，默认20天
+            output_window (int | list[int]): 输出窗口大小，默认20天。为列表时一次构建多个预测期的标签，
+                窗口按最长的预测期切分，y 为 (样本数, 预测期数)，每列是输出窗口前 h 天的趋势标签
             train_ratio (float): 训练集比例，默认0.7
+            stride (int): 滑动窗口的步长，默认5天
+            source_kwargs (dict): 传给数据源的额外参数，如并发线程数
+            label_cache (LabelCache): 趋势标签缓存，已计算过的输出窗口直接复用标签，默认不使用
+            compact (bool): 以紧凑格式获取行情(float32 价格、天数日期、分类代码)，样本特征也为 float32
+            workers (int): 计算趋势标签的进程数，大于1时按股票分批在进程池中并行计算，结果与串行完全一致
+            feature_store (FeatureStore): 归一化特征缓存，指定时 X 为 (样本数, input_window, 特征数) 的
+                float32 特征窗口，默认 X 为输入窗口的收盘价
         """
         self.market = market
         self.source = source
         self.codes = codes if codes else []
         self.input_window = input_window
-        self.output_window = output_window
+        # 多预测期时 output_window 为最长的预测期，输出窗口按它切分
+        self.horizons = [int(h) for h in output_window] if isinstance(output_window, (list, tuple)) else None
+        if self.horizons is not None and (not self.horizons or min(self.horizons) < 2):
+            raise ValueError(f"预测期必须不少于2天: {output_window}")
+        self.output_window = max(self.horizons) if self.horizons is not None else output_window
         self.train_ratio = train_ratio
+        self.stride = stride
+        self.source_kwargs = source_kwargs or {}
+        self.label_cache = label_cache
+        self.compact = compact
+        self.workers = workers
+        self.feature_store = feature_store
         
         # 设置默认日期范围（如果未指定）
         if not end_date:
@@ -45,66 +96,267 @@ class DatasetBuilder:
         # 初始化数据源
         self.factory = DataSourceFactory()
         self.data_source = None
+        # 最近一次构建的数据集保存目录
+        self.dataset_dir = None
         
-    def fetch_data(self):
-        """获取股票数据"""
+    def fetch_data(self, codes=None, start_date=None, strict=False):
+        """
+        获取股票数据，默认获取全部股票，start_date 默认为构建器的开始日期。
+        strict 为 True 时获取出错或有股票获取失败都抛出异常，而不是返回不完整的数据。
+        """
         try:
             self.data_source = self.factory.create_data_source(
                 self.source,
                 self.market,
-                self.start_date,
+                start_date or self.start_date,
                 self.end_date,
-                self.codes
+                self.codes if codes is None else codes,
+                compact=self.compact,
+                **self.source_kwargs
             )
-            return self.data_source.get_day_trade_data()
+            data = self.data_source.get_day_trade_data()
         except Exception as e:
             logger.error(f'获取数据失败: {str(e)}')
+            if strict:
+                raise
             return pd.DataFrame()
+        failed_codes = getattr(self.data_source, 'failed_codes', None)
+        if strict and failed_codes:
+            raise RuntimeError(f'{len(failed_codes)} 只股票获取数据失败: {sorted(failed_codes)}')
+        return data
     
-    def build_samples(self, data):
-        """构建样本数据集"""
-        samples = []
-        labels = []
-        input_windows = []  # 存储输入窗口的原始数据
-        output_windows = []  # 存储输出窗口的原始数据
-        
-        # 按股票代码分组处理
-        for code in self.codes:
-            stock_data = data[data['code'] == code].sort_values('date')
-            if len(stock_data) < self.input_window + self.output_window:
+    @staticmethod
+    def trends_to_labels(trends):
+        """把趋势字符串数组转换为数值标签，形状不变"""
+        labels = np.full(np.shape(trends), TREND_LABELS['Sideways'], dtype=np.int64)
+        labels[trends == 'Uptrend'] = TREND_LABELS['Uptrend']
+        labels[trends == 'Downtrend'] = TREND_LABELS['Downtrend']
+        return labels
+
+    def code_state(self, dates, next_start):
+        """
+        记录一只股票的构建进度，供增量更新时只获取和计算新的窗口。
+
+        参数:
+            dates (ndarray): 本次用到的该股票全部交易日，YYYYMMDD 字符串
+            next_start (int): 下一个窗口在 dates 中的起始位置，可以超出 dates 的长度
+
+        返回:
+            dict: last_date(最后一个交易日)、resume_date(增量更新时从哪个交易日开始取数据，
+                为 None 时从 last_date 之后开始)、offset(下一个窗口相对 resume_date 的位置)
+        """
+        # 特征需要窗口之前 lookback 天的数据预热
+        warmup = self.feature_store.lookback if self.feature_store is not None else 0
+        resume = min(max(0, next_start - warmup), len(dates))
+        return {
+            'last_date': str(dates[-1]),
+            'resume_date': str(dates[resume]) if resume < len(dates) else None,
+            'offset': int(next_start - resume)
+        }
+
+    def build_samples(self, data, codes=None, offsets=None):
+        """
+        构建样本数据集
+        
+        按股票代码只分组一次，用 sliding_window_view 一次性切出所有滑动窗口，
+        再对所有输出窗口批量计算趋势标签。
+        指定了 feature_store 时，每只股票的特征矩阵只计算一次，输入窗口的特征是其上的滑动窗口视图。
+        
+        参数:
+            data (DataFrame): 行情数据
+            codes (list): 按顺序构建样本的股票代码，默认为全部股票
+            offsets (dict): 每只股票第一个窗口在其行情中的起始位置，默认为0，增量更新时使用
+        
+        返回:
+            dict: X(输入特征，收盘价或特征窗口)、y(标签，多预测期时每列一个预测期)、input_windows(输入窗口收盘价)、
+                output_windows(输出窗口收盘价)、code_state(每只股票的构建进度，见 code_state)
+        """
+        window_size = self.input_window + self.output_window
+        offsets = offsets or {}
+        windows = []
+        # 每只股票的窗口数，用于按股票边界把窗口分批并行计算
+        window_counts = []
+        # 每只股票的 (代码, 输出窗口开始日期, 输出窗口结束日期)，用于查找标签缓存
+        window_dates = []
+        # 每只股票输入窗口的特征，只在指定了 feature_store 时使用
+        feature_windows = []
+        code_states = {}
+        
+        # 紧凑格式的行情保持 float32，否则为 float64
+        dtype = np.float32 if self.compact else np.float64
+        # 按股票代码分组处理，紧凑格式的代码为分类类型，只保留出现过的代码
+        groups = dict(tuple(data.groupby('code', sort=False, observed=True)))
+        for code in (self.codes if codes is None else codes):
+            if code not in groups or groups[code].empty:
+                continue
+            group = groups[code].sort_values('date')
+            close = group['close'].to_numpy(dtype=dtype)
+            dates = date_strings(group['date'].to_numpy())
+            offset = offsets.get(code, 0)
+            n_windows = (len(close) - offset - window_size) // self.stride + 1 if len(close) - offset >= window_size else 0
+            code_states[code] = self.code_state(dates, offset + n_windows * self.stride)
+            if n_windows == 0:
                 continue
-                
             # 使用滑动窗口构建样本
-            for i in range(0, len(stock_data) - self.input_window - self.output_window + 1, 5):
-                # 输入特征窗口
-                input_data = stock_data.iloc[i:i+self.input_window]
-                # 输出标签窗口
-                output_data = stock_data.iloc[i+self.input_window:i+self.input_window+self.output_window]
-                
-                # 检查output_data是否有足够的数据
-                if len(output_data) < self.output_window:
-                    continue
-                
-                # 使用趋势分析器判断趋势
-                trend, _ = TrendAnalyzer.analyze_stock_trend(output_data)
-                
-                # 将趋势转换为数值标签
-                trend_label = {
-                    'Uptrend': 2,
-                    'Sideways': 1,
-                    'Downtrend': 0
-                }[trend]
-                
-                # 将所有数据存入字典
-                sample_dict = {
-                    'features': input_data['close'].values,
-                    'label': trend_label,
-                    'input_window': input_data['close'].values.tolist(),
-                    'output_window': output_data['close'].values.tolist()
-                }
-                samples.append(sample_dict)
-
-        return samples
+            code_windows = sliding_window_view(close[offset:], window_size)[::self.stride]
+            windows.append(code_windows)
+            window_counts.append(len(code_windows))
+            if self.feature_store is not None:
+                features = self.feature_store.get(self.source, self.market, code, group)
+                # (窗口数, 特征数, input_window) 的视图，转置为 (窗口数, input_window, 特征数)，不复制数据
+                views = sliding_window_view(features[offset:], self.input_window, axis=0)[::self.stride]
+                feature_windows.append(views[:len(code_windows)].transpose(0, 2, 1))
+            if self.label_cache is None:
+                continue
+            output_starts = offset + np.arange(len(code_windows)) * self.stride + self.input_window
+            output_ends = output_starts[:, None] + np.array(self.label_horizons()) - 1
+            window_dates.append((code, dates[output_starts], dates[output_ends]))
+        
+        if windows:
+            windows = np.concatenate(windows, axis=0)
+        else:
+            windows = np.empty((0, window_size), dtype=dtype)
+        input_windows = windows[:, :self.input_window]
+        output_windows = windows[:, self.input_window:]
+        X = input_windows
+        if self.feature_store is not None:
+            n_features = len(self.feature_store.features)
+            X = (np.concatenate(feature_windows, axis=0) if feature_windows
+                 else np.empty((0, self.input_window, n_features), dtype=np.float32))
+        
+        if self.label_cache is not None:
+            labels = self.label_windows_cached(output_windows, window_dates)
+            if self.horizons is None:
+                labels = labels[:, 0]
+        else:
+            # 使用趋势分析器批量判断趋势，并转换为数值标签
+            labels = self.trends_to_labels(self.analyze_windows(output_windows, window_counts, horizons=self.horizons))
+        
+        return {
+            'X': X,
+            'y': labels,
+            'input_windows': input_windows,
+            'output_windows': output_windows,
+            'code_state': code_states
+        }
+
+    @staticmethod
+    def chunk_bounds(window_counts, n_chunks):
+        """
+        在最接近等分点的股票边界处把窗口切成最多 n_chunks 批，同一只股票的窗口总在同一批中。
+
+        返回:
+            list[int]: 各批的起止行位置，第一个为0，最后一个为窗口总数
+        """
+        boundaries = np.cumsum(window_counts)
+        total = int(boundaries[-1]) if len(boundaries) else 0
+        targets = np.arange(1, n_chunks) * total / n_chunks
+        cuts = np.unique(boundaries[np.minimum(np.searchsorted(boundaries, targets), len(boundaries) - 1)])
+        return [0] + [int(cut) for cut in cuts if 0 < cut < total] + [total]
+
+    def label_horizons(self):
+        """标签的预测期列表，单预测期时为 [output_window]"""
+        return self.horizons if self.horizons is not None else [self.output_window]
+
+    def analyze_windows(self, output_windows, window_counts, return_pivots=False, horizons=None):
+        """
+        批量分析输出窗口的趋势，返回值同 TrendAnalyzer.analyze_trend_batch，
+        指定 horizons 时同 TrendAnalyzer.analyze_trend_horizons。
+
+        workers 大于1且窗口足够多时，按股票边界把窗口分成若干批，以 NumPy 数组发送到进程池中计算，
+        各批结果按原顺序合并。每个窗口的计算互不依赖，因此结果与串行计算逐字节一致。
+
+        参数:
+            output_windows (ndarray): 所有股票的输出窗口，按股票顺序排列
+            window_counts (list[int]): 每只股票的窗口数
+            return_pivots (bool): 是否同时返回枢纽点
+            horizons (list[int]): 预测期，一次计算输出窗口的多个前缀，默认只分析整个输出窗口
+        """
+        if self.workers <= 1 or len(window_counts) < 2 or len(output_windows) < self.MIN_PARALLEL_WINDOWS:
+            return _analyze_chunk(output_windows, return_pivots, horizons)
+
+        cuts = self.chunk_bounds(window_counts, self.workers * self.CHUNKS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(cuts) - 1)) as executor:
+            results = list(executor.map(
+                _analyze_chunk,
+                [output_windows[begin:end] for begin, end in zip(cuts[:-1], cuts[1:])],
+                [return_pivots] * (len(cuts) - 1),
+                [horizons] * (len(cuts) - 1)))
+        if not return_pivots:
+            return np.concatenate(results)
+        if horizons is None:
+            return tuple(np.concatenate(parts) for parts in zip(*results))
+        # 每批为 (趋势, [每个预测期的枢纽点])，按预测期分别合并
+        pivots = [tuple(np.concatenate(parts) for parts in zip(*horizon_parts))
+                  for horizon_parts in zip(*(result[1] for result in results))]
+        return np.concatenate([result[0] for result in results]), pivots
+
+    def label_windows_cached(self, output_windows, window_dates):
+        """
+        通过标签缓存计算标签：先按预测期查缓存，任一预测期未命中的窗口合并成一批一次算出所有预测期，
+        再按股票和预测期把未命中的结果写回缓存。缓存按输出窗口的价格类型区分，紧凑格式的 float32 价格
+        与 float64 价格的标签互不复用。
+
+        参数:
+            output_windows (ndarray): 所有股票的输出窗口，按 window_dates 的顺序排列
+            window_dates (list[tuple]): 每只股票的 (代码, 输出窗口开始日期数组, 结束日期矩阵)，
+                结束日期矩阵每列对应 label_horizons() 中的一个预测期
+
+        返回:
+            ndarray: 形状为 (窗口数, 预测期数) 的标签
+        """
+        horizons = self.label_horizons()
+        labels = np.empty((len(output_windows), len(horizons)), dtype=np.int64)
+        hit = np.empty(labels.shape, dtype=bool)
+        code_counts = [len(start_dates) for _, start_dates, _ in window_dates]
+        code_offsets = np.concatenate([[0], np.cumsum(code_counts)]).astype(np.int64)
+        for (code, start_dates, end_dates), offset in zip(window_dates, code_offsets):
+            part = slice(offset, offset + len(start_dates))
+            for j, h in enumerate(horizons):
+                labels[part, j], hit[part, j] = self.label_cache.lookup(
+                    self.source, self.market, code, h, start_dates, end_dates[:, j], output_windows.dtype)
+
+        rows = np.flatnonzero(~hit.all(axis=1))
+        if len(rows):
+            code_ids = np.repeat(np.arange(len(window_dates)), code_counts)[rows]
+            pending_counts = np.bincount(code_ids, minlength=len(window_dates))
+            trends, pivots = self.analyze_windows(
+                output_windows[rows], pending_counts[pending_counts > 0], return_pivots=True, horizons=horizons)
+            labels[rows] = self.trends_to_labels(trends)
+            for i, (code, start_dates, end_dates) in enumerate(window_dates):
+                # 本只股票待计算的窗口在 rows 中的位置
+                pending = np.flatnonzero(code_ids == i)
+                local = rows[pending] - code_offsets[i]
+                for j, h in enumerate(horizons):
+                    miss = ~hit[rows[pending], j]
+                    if not miss.any():
+                        continue
+                    positions, pivot_prices, counts = pivots[j]
+                    self.label_cache.store(
+                        self.source, self.market, code, h, start_dates[local[miss]], end_dates[local[miss], j],
+                        labels[rows[pending[miss]], j], positions[pending[miss]], pivot_prices[pending[miss]],
+                        counts[pending[miss]], output_windows.dtype)
+
+        n_computed = int(np.count_nonzero(~hit))
+        logger.info(f'标签缓存: 命中 {hit.size - n_computed} 个标签，计算 {n_computed} 个标签')
+        return labels
+    
+    def get_metadata(self):
+        """数据集元信息"""
+        return {
+            'market': self.market,
+            'source': self.source,
+            'codes': self.codes,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'input_window': self.input_window,
+            'output_window': self.output_window,
+            'horizons': self.horizons,
+            'train_ratio': self.train_ratio,
+            'stride': self.stride,
+            'compact': self.compact,
+            'features': self.feature_store.params() if self.feature_store is not None else None
+        }
     
     def split_dataset(self, samples):
         """划分训练集和验证集"""
@@ -134,88 +386,314 @@ class DatasetBuilder:
             }
         }
     
-    def build(self):
-        """构建完整的数据集"""
+    def default_dataset_dir(self):
+        """数据集的默认保存目录"""
+        cache_dir = DATASET_CACHE_DIR
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+            
+        # 构造目录名
+        codes_str = '_'.join(self.codes) if len(self.codes) <= 3 else f'{self.codes[0]}_{len(self.codes)}stocks'
+        outputs = '-'.join(str(h) for h in self.label_horizons())
+        dirname = f'dataset_{self.market}_{self.source}_{codes_str}_in{self.input_window}_out{outputs}'
+        if self.feature_store is not None:
+            # 不同特征配置的数据集分开保存
+            dirname += f'_feat{self.feature_store.params_hash()[:8]}'
+        return os.path.join(cache_dir, dirname)
+    
+    def build(self, dataset_dir=None):
+        """构建完整的数据集，dataset_dir 默认为 default_dataset_dir()"""
         # 1. 获取数据
         logger.info('正在获取股票数据...')
-        data = self.fetch_data()
+        with span('fetch_data', source=self.source) as s:
+            data = self.fetch_data()
+            s.add_items(len(data))
         if data.empty:
             logger.warning('获取的数据为空')
             return None
             
         # 2. 构建样本
         logger.info('正在构建样本...')
-        samples = self.build_samples(data)
-        if len(samples) == 0:
+        with span('build_samples', unit='samples', source=self.source) as s:
+            samples = self.build_samples(data)
+            s.add_items(len(samples['y']))
+        if len(samples['y']) == 0:
             logger.warning('没有足够的数据构建样本')
             return None
             
-        # 一次性提取所有特征和标签
-        data_arrays = [(sample['features'], sample['label'], sample['input_window'], sample['output_window']) for sample in samples]
-        X, y, input_windows, output_windows = map(list, zip(*data_arrays))
-        X = np.array(X)
-        y = np.array(y)
+        X, y = samples['X'], samples['y']
             
         # 3. 划分数据集
         logger.info('正在划分训练集和验证集...')
-        dataset = self.split_dataset(X, y)
+        with span('split_dataset', unit='samples', items=len(y), source=self.source):
+            dataset = self.split_dataset(X, y)
         
         logger.info('数据集构建完成:')
         logger.info(f'- 训练集: {len(dataset["train"]["X"])} 个样本')
         logger.info(f'- 验证集: {len(dataset["val"]["X"])} 个样本')
         
         # 4. 保存数据集
-        cache_dir = 'cachedataset'
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-            
-        # 构造文件名
-        codes_str = '_'.join(self.codes) if len(self.codes) <= 3 else f'{self.codes[0]}_{len(self.codes)}stocks'
-        filename = f'dataset_{self.market}_{self.source}_{codes_str}_in{self.input_window}_out{self.output_window}.npz'
-        filepath = os.path.join(cache_dir, filename)
-        
-        # 保存数据集
-        np.savez(filepath,
-                 train_X=dataset['train']['X'],
-                 train_y=dataset['train']['y'],
-                 val_X=dataset['val']['X'],
-                 val_y=dataset['val']['y'],
-                 metadata={
-                     'market': self.market,
-                     'source': self.source,
-                     'codes': self.codes,
-                     'start_date': self.start_date,
-                     'end_date': self.end_date,
-                     'input_window': self.input_window,
-                     'output_window': self.output_window,
-                     'train_ratio': self.train_ratio
-                 })
-        logger.info(f'数据集已保存到: {filepath}')
+        self.dataset_dir = dataset_dir or self.default_dataset_dir()
+        
+        # 保存数据集：.npy 分片加 JSON 清单，可以内存映射读取
+        with span('save_dataset', unit='samples', items=len(y), source=self.source):
+            manifest = save_dataset(dataset, self.dataset_dir, metadata=self.get_metadata())
+            # 记录每只股票的构建进度，供 update 增量更新
+            manifest['code_state'] = samples['code_state']
+            save_manifest(self.dataset_dir, manifest)
         
         # 保存CSV格式的数据集，方便直接查看
-        csv_filename = filepath.replace('.npz', '.csv')
+        with span('export_csv', unit='samples', items=len(y), source=self.source):
+            self.export_csv(dataset, samples)
+        self.enforce_dataset_budget()
+        all_labels = np.concatenate([dataset['train']['y'], dataset['val']['y']], axis=0)
+        
+        # 打印数据分布统计，多预测期时每个预测期分别统计
+        total_samples = len(all_labels)
+        for h, labels in zip(self.label_horizons(), all_labels.reshape(total_samples, -1).T):
+            label_dist = np.bincount(labels, minlength=3)
+            logger.info(f'\n完整数据集的标签分布 ({h}天):')
+            logger.info(f'- 下跌趋势 (0): {label_dist[0]} 个样本 ({label_dist[0]/total_samples*100:.2f}%)')
+            logger.info(f'- 震荡趋势 (1): {label_dist[1]} 个样本 ({label_dist[1]/total_samples*100:.2f}%)')
+            logger.info(f'- 上涨趋势 (2): {label_dist[2]} 个样本 ({label_dist[2]/total_samples*100:.2f}%)')
+        
+        instrumentation.log_summary()
+        return dataset
+
+    def export_csv(self, dataset, samples, first_id=0):
+        """
+        保存CSV格式的数据集，方便直接查看
+
+        参数:
+            first_id (int): 第一个样本的编号，大于0时追加到已有的 samples.csv 之后
+        """
+        csv_filename = os.path.join(self.dataset_dir, 'samples.csv')
         all_samples = np.concatenate([dataset['train']['X'], dataset['val']['X']], axis=0)
         all_labels = np.concatenate([dataset['train']['y'], dataset['val']['y']], axis=0)
         
         # 创建DataFrame，只保留必要的列并重命名
-        df_data = {
-            'sample_id': range(len(all_samples)),
-            'label': all_labels,
-            'label_name': ['下跌趋势' if l == 0 else '震荡趋势' if l == 1 else '上涨趋势' for l in all_labels],
-            'input_list': input_windows,
-            'output_list': output_windows
-        }
+        df_data = {'sample_id': range(first_id, first_id + len(all_samples))}
+        if self.horizons is None:
+            df_data['label'] = all_labels
+            df_data['label_name'] = ['下跌趋势' if l == 0 else '震荡趋势' if l == 1 else '上涨趋势' for l in all_labels]
+        else:
+            # 多预测期时每个预测期一列标签
+            for h, labels in zip(self.horizons, all_labels.T):
+                df_data[f'label_{h}'] = labels
+        df_data['input_list'] = samples['input_windows'].tolist()
+        df_data['output_list'] = samples['output_windows'].tolist()
             
         df = pd.DataFrame(df_data)
-        df.to_csv(csv_filename, index=False, encoding='utf-8')
+        if first_id > 0:
+            df.to_csv(csv_filename, mode='a', header=False, index=False, encoding='utf-8')
+        else:
+            df.to_csv(csv_filename, index=False, encoding='utf-8')
         logger.info(f'CSV格式数据集已保存到: {csv_filename}')
-        
-        # 打印数据分布统计
-        label_dist = np.bincount(all_labels)
-        total_samples = len(all_labels)
-        logger.info('\n完整数据集的标签分布:')
-        logger.info(f'- 下跌趋势 (0): {label_dist[0]} 个样本 ({label_dist[0]/total_samples*100:.2f}%)')
-        logger.info(f'- 震荡趋势 (1): {label_dist[1]} 个样本 ({label_dist[1]/total_samples*100:.2f}%)')
-        logger.info(f'- 上涨趋势 (2): {label_dist[2]} 个样本 ({label_dist[2]/total_samples*100:.2f}%)')
-        
-        return dataset
+
+    def iter_sample_batches(self, batch_size, start=0):
+        """
+        按批获取行情并构建样本的生成器，内存中只保留当前一批股票的数据。
+
+        参数:
+            batch_size (int): 每批的股票数量
+            start (int): 从第几只股票开始
+
+        生成:
+            tuple: (下一批的起始位置, 本批样本)，本批没有数据时样本为 None
+
+        异常:
+            获取数据失败时抛出异常，不会跳过获取失败的股票
+        """
+        for begin in range(start, len(self.codes), batch_size):
+            codes = self.codes[begin:begin + batch_size]
+            with span('fetch_data', source=self.source) as s:
+                data = self.fetch_data(codes, strict=True)
+                s.add_items(len(data))
+            samples = None
+            if not data.empty:
+                with span('build_samples', unit='samples', source=self.source) as s:
+                    samples = self.build_samples(data, codes)
+                    s.add_items(len(samples['y']))
+            del data
+            yield begin + len(codes), samples
+
+    def build_streaming(self, batch_size=50, shard_size=65536, dataset_dir=None):
+        """
+        流式构建数据集，适合股票数量很多的情况。
+
+        按批获取数据、构建样本并划分训练集和验证集，每批的样本立即追加写入分片，
+        峰值内存只和批大小有关。每批完成后记录断点(checkpoint.json)，
+        中断后用相同的参数再次调用会从下一只未处理的股票继续。
+        某批获取数据失败时抛出异常，断点停在这一批之前，再次调用时会重新获取这一批。
+        流式构建不生成 samples.csv，训练集和验证集在每批内部按 train_ratio 随机划分。
+
+        参数:
+            batch_size (int): 每批的股票数量
+            shard_size (int): 每个分片的最大样本数
+            dataset_dir (str): 数据集目录，默认与 build 相同
+
+        返回:
+            dict: 以内存映射方式打开的数据集，没有样本时返回 None
+        """
+        self.dataset_dir = dataset_dir or self.default_dataset_dir()
+        os.makedirs(self.dataset_dir, exist_ok=True)
+        metadata = dict(self.get_metadata(), batch_size=batch_size)
+
+        checkpoint = load_checkpoint(self.dataset_dir)
+        if (checkpoint is not None and checkpoint['metadata'] == metadata and checkpoint['shard_size'] == shard_size
+                and 'code_state' in checkpoint):
+            logger.info(f'从断点继续构建: 已完成 {checkpoint["next_code"]}/{len(self.codes)} 只股票')
+        else:
+            # 参数不同或没有断点时重新开始，清理目录中已有的数据集
+            remove_shards(self.dataset_dir)
+            checkpoint = {
+                'metadata': metadata,
+                'shard_size': shard_size,
+                'next_code': 0,
+                'splits': {'train': {}, 'val': {}},
+                'code_state': {}
+            }
+        # 上次中断在写完分片、保存断点之前时，删除断点之后多写的分片
+        remove_unlisted_shards(self.dataset_dir, checkpoint['splits'])
+
+        for next_code, samples in self.iter_sample_batches(batch_size, checkpoint['next_code']):
+            if samples is not None and len(samples['y']) > 0:
+                batch = self.split_dataset(samples['X'], samples['y'])
+                with span('save_shards', unit='samples', items=len(samples['y']), source=self.source):
+                    append_shards(self.dataset_dir, checkpoint['splits'], batch, shard_size)
+            if samples is not None:
+                checkpoint['code_state'].update(samples['code_state'])
+            # 本批分片写完后再记录断点，中断时未记录的分片会在继续构建前删除
+            checkpoint['next_code'] = next_code
+            save_checkpoint(self.dataset_dir, checkpoint)
+            logger.info(f'已处理 {next_code}/{len(self.codes)} 只股票')
+
+        splits = checkpoint['splits']
+        if not splits['train'] and not splits['val']:
+            logger.warning('没有足够的数据构建样本')
+            remove_shards(self.dataset_dir)
+            return None
+        # 所有批次都没有分到某个集合的样本时，补上空数组，保证两个集合的结构一致
+        reference = splits['train'] or splits['val']
+        for arrays in splits.values():
+            for name, info in reference.items():
+                arrays.setdefault(name, {'dtype': info['dtype'], 'shape': [0] + info['shape'][1:], 'shards': []})
+
+        save_manifest(self.dataset_dir, {
+            'format_version': FORMAT_VERSION,
+            'metadata': metadata,
+            'shard_size': shard_size,
+            'splits': splits,
+            'code_state': checkpoint['code_state']
+        })
+        clear_checkpoint(self.dataset_dir)
+        self.enforce_dataset_budget()
+        logger.info('数据集构建完成:')
+        for split, arrays in splits.items():
+            logger.info(f'- {split}: {arrays["y"]["shape"][0]} 个样本')
+        instrumentation.log_summary()
+        return load_dataset(self.dataset_dir)[0]
+
+    def update(self, dataset_dir=None):
+        """
+        增量更新已构建的数据集，适合每天延长 end_date 后刷新数据集。
+
+        根据清单中记录的每只股票的构建进度(code_state)，只获取续接所需的行情，
+        只对新凑齐的窗口计算特征和标签，按 train_ratio 划分后写入新的分片追加到数据集中，
+        已有的分片不会改写。builder 中新增的股票从数据集记录的 start_date 开始构建。
+        以 build 构建的数据集同时在 samples.csv 末尾追加新样本。
+
+        start_date 沿用数据集中记录的值，默认的 start_date 随当天日期变化也不影响增量更新。
+        数据集不存在、没有构建进度或构建参数(start_date、end_date 和 codes 以外)不一致时，改为完整构建。
+
+        参数:
+            dataset_dir (str): 数据集目录，默认与 build 相同
+
+        返回:
+            dict: 以内存映射方式打开的数据集，完整构建时同 build 或 build_streaming 的返回值
+        """
+        self.dataset_dir = dataset_dir or self.default_dataset_dir()
+        manifest = None
+        if os.path.exists(os.path.join(self.dataset_dir, MANIFEST_FILE)):
+            manifest = load_manifest(self.dataset_dir)
+        if manifest is None or 'code_state' not in manifest or not self.can_update(manifest['metadata']):
+            logger.info('没有可以增量更新的数据集，重新完整构建')
+            if manifest is not None and 'batch_size' in manifest['metadata']:
+                return self.build_streaming(manifest['metadata']['batch_size'], manifest['shard_size'], self.dataset_dir)
+            return self.build(self.dataset_dir)
+
+        # 已有数据集的起点不变，新增的股票也从这一天开始
+        self.start_date = manifest['metadata']['start_date']
+        # 上次更新中断在写完分片、保存清单之前时，删除清单之外多写的分片
+        remove_unlisted_shards(self.dataset_dir, manifest['splits'])
+        states = manifest['code_state']
+        old_codes = [code for code in self.codes if code in states]
+        new_codes = [code for code in self.codes if code not in states]
+        frames = []
+        with span('fetch_data', source=self.source) as s:
+            if old_codes:
+                # 从各股票续接位置中最早的一天开始获取，再按股票截取
+                fetch_start = min(states[code]['resume_date'] or states[code]['last_date'] for code in old_codes)
+                frames.append(self.fetch_data(old_codes, start_date=fetch_start))
+            if new_codes:
+                frames.append(self.fetch_data(new_codes))
+            frames = [frame for frame in frames if not frame.empty]
+            s.add_items(sum(len(frame) for frame in frames))
+
+        parts, offsets = [], {}
+        for frame in frames:
+            for code, group in frame.groupby('code', sort=False, observed=True):
+                state = states.get(code)
+                if state is not None:
+                    dates = date_strings(group['date'].to_numpy())
+                    if state['resume_date'] is not None:
+                        group = group[dates >= state['resume_date']]
+                    else:
+                        group = group[dates > state['last_date']]
+                    offsets[code] = state['offset']
+                parts.append(group)
+        data = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+        n_old = manifest['splits']['train']['y']['shape'][0] + manifest['splits']['val']['y']['shape'][0]
+        n_new = 0
+        if not data.empty:
+            with span('build_samples', unit='samples', source=self.source) as s:
+                samples = self.build_samples(data, offsets=offsets)
+                s.add_items(len(samples['y']))
+            n_new = len(samples['y'])
+            states.update(samples['code_state'])
+            if n_new > 0:
+                batch = self.split_dataset(samples['X'], samples['y'])
+                with span('save_shards', unit='samples', items=n_new, source=self.source):
+                    append_shards(self.dataset_dir, manifest['splits'], batch, manifest['shard_size'])
+                if os.path.exists(os.path.join(self.dataset_dir, 'samples.csv')):
+                    with span('export_csv', unit='samples', items=n_new, source=self.source):
+                        self.export_csv(batch, samples, first_id=n_old)
+
+        # 分片写完后再更新清单，中断时未记录的分片会在下次更新前删除
+        codes = manifest['metadata']['codes']
+        manifest['metadata'].update({
+            'codes': codes + [code for code in self.codes if code not in codes],
+            'end_date': self.end_date
+        })
+        save_manifest(self.dataset_dir, manifest)
+        self.enforce_dataset_budget()
+        logger.info(f'数据集增量更新完成: 新增 {n_new} 个样本，共 {n_old + n_new} 个样本')
+        instrumentation.log_summary()
+        return load_dataset(self.dataset_dir)[0]
+
+    def enforce_dataset_budget(self):
+        """
+        数据集保存在默认目录 DATASET_CACHE_DIR 中时，按配置的预算淘汰其中的其他数据集。
+        调用方指定的其他目录不是数据集缓存，不做淘汰，避免删除同级的无关目录。
+        """
+        parent = os.path.dirname(os.path.abspath(self.dataset_dir))
+        if parent == os.path.abspath(DATASET_CACHE_DIR):
+            enforce_dataset_budget(DATASET_CACHE_DIR, keep=[self.dataset_dir])
+
+    def can_update(self, metadata):
+        """已有数据集的构建参数除 start_date、end_date 和 codes 外都与当前构建器一致时，才可以增量更新"""
+        ignored = ('codes', 'start_date', 'end_date', 'batch_size')
+        current = self.get_metadata()
+        return ({key: value for key, value in metadata.items() if key not in ignored}
+                == {key: value for key, value in current.items() if key not in ignored})
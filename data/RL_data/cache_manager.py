@@ -0,0 +1,187 @@
+import os
+import glob
+import time
+import shutil
+from config.config import ConfigJson
+from logger.logging_config import logger
+from .market_cache import MarketDataCache
+from .dataset_store import MANIFEST_FILE, CHECKPOINT_FILE, load_manifest
+
+# 数据集的默认保存目录，与 DatasetBuilder.default_dataset_dir 一致
+DATASET_CACHE_DIR = 'cachedataset'
+
+def default_market_cache_root():
+    """行情缓存的默认根目录 data/cachedata"""
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cachedata')
+
+def select_evictions(items, max_bytes=None, max_age_days=None, now=None):
+    """
+    按预算选出要淘汰的条目：先淘汰超过 max_age_days 未访问的条目，
+    剩余容量仍超过 max_bytes 时再按最近最少使用(访问时间从早到晚)依次淘汰。
+
+    参数:
+        items (list[dict]): 包含 bytes 和 accessed_at(时间戳) 的条目
+        max_bytes (int): 容量上限(字节)，None 表示不限制
+        max_age_days (float): 最长未访问天数，None 表示不限制
+        now (float): 当前时间戳，默认为 time.time()
+
+    返回:
+        list[dict]: 要淘汰的条目，按访问时间从早到晚排列
+    """
+    now = time.time() if now is None else now
+    evicted, kept = [], []
+    for item in sorted(items, key=lambda item: item['accessed_at']):
+        if max_age_days is not None and now - item['accessed_at'] > max_age_days * 86400:
+            evicted.append(item)
+        else:
+            kept.append(item)
+    if max_bytes is not None:
+        total = sum(item['bytes'] for item in kept)
+        for item in kept:
+            if total <= max_bytes:
+                break
+            evicted.append(item)
+            total -= item['bytes']
+    return sorted(evicted, key=lambda item: item['accessed_at'])
+
+def find_market_caches(root=None):
+    """找到根目录下全部数据源和市场的行情缓存"""
+    root = root or default_market_cache_root()
+    caches = []
+    for pattern in (MarketDataCache.CATALOG_FILE, MarketDataCache.LEGACY_COVERAGE_FILE):
+        for path in glob.glob(os.path.join(root, '*', '*', pattern)):
+            country_dir = os.path.dirname(path)
+            key = (os.path.basename(os.path.dirname(country_dir)), os.path.basename(country_dir))
+            if key not in [(cache.source, cache.country) for cache in caches]:
+                caches.append(MarketDataCache(key[0], key[1], root_path=root))
+    return sorted(caches, key=lambda cache: (cache.source, cache.country))
+
+def market_cache_usage(root=None):
+    """
+    统计行情缓存的用量，内容相同的文件只计算一次。
+
+    返回:
+        list[dict]: 每个数据源和市场一项，包含 source、country、entries、files、bytes、oldest_access
+    """
+    usage = []
+    for cache in find_market_caches(root):
+        entries = cache.entries()
+        sizes = {entry['path']: entry['bytes'] for entry in entries}
+        usage.append({
+            'source': cache.source,
+            'country': cache.country,
+            'entries': len(entries),
+            'files': len(sizes),
+            'bytes': sum(sizes.values()),
+            'oldest_access': min((entry['accessed_at'] for entry in entries), default=None)
+        })
+    return usage
+
+def evict_market_cache(root=None, max_bytes=None, max_age_days=None, now=None, dry_run=False):
+    """
+    按预算淘汰行情缓存。容量上限针对整个根目录(所有数据源和市场)，按最近最少使用的顺序淘汰
+    (股票, 年份)分区，被淘汰的年份从已缓存区间中去掉，下次请求时会重新获取。
+
+    参数:
+        root (str): 行情缓存根目录，默认为 data/cachedata
+        max_bytes (int): 容量上限(字节)
+        max_age_days (float): 最长未访问天数
+        now (float): 当前时间戳
+        dry_run (bool): 只统计要淘汰的条目，不删除
+
+    返回:
+        dict: 淘汰的 entries(条目数) 和 bytes(字节数)
+    """
+    items = []
+    for cache in find_market_caches(root):
+        items += [dict(entry, cache=cache) for entry in cache.entries()]
+    evicted = select_evictions(items, max_bytes, max_age_days, now)
+    if not dry_run:
+        for cache in {id(item['cache']): item['cache'] for item in evicted}.values():
+            cache.remove_entries([item for item in evicted if item['cache'] is cache])
+    result = {'entries': len(evicted), 'bytes': sum(item['bytes'] for item in evicted)}
+    if evicted and not dry_run:
+        logger.info(f"已从行情缓存淘汰 {result['entries']} 个分区，释放 {result['bytes']} 字节")
+    return result
+
+def _directory_size(path):
+    return sum(os.path.getsize(os.path.join(dir_path, name))
+               for dir_path, _, names in os.walk(path) for name in names)
+
+def find_datasets(root=DATASET_CACHE_DIR):
+    """
+    列出数据集目录下的全部数据集。
+
+    只有包含清单(manifest.json)或断点(checkpoint.json，未完成的流式构建)的子目录才视为数据集，
+    其他目录和文件不会被列出，也不会被淘汰。
+    访问时间取清单中记录的 accessed_at；只有断点时取目录中文件最后的修改时间。
+
+    返回:
+        list[dict]: 包含 path、bytes、accessed_at，按路径排列
+    """
+    if not os.path.isdir(root):
+        return []
+    datasets = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        has_manifest = os.path.exists(os.path.join(path, MANIFEST_FILE))
+        if not has_manifest and not os.path.exists(os.path.join(path, CHECKPOINT_FILE)):
+            continue
+        accessed_at = None
+        if has_manifest:
+            manifest = load_manifest(path)
+            accessed_at = manifest.get('accessed_at', manifest.get('created_at'))
+        if accessed_at is None:
+            accessed_at = max((os.path.getmtime(os.path.join(dir_path, file_name))
+                               for dir_path, _, names in os.walk(path) for file_name in names),
+                              default=os.path.getmtime(path))
+        datasets.append({'path': path, 'bytes': _directory_size(path), 'accessed_at': accessed_at})
+    return datasets
+
+def evict_datasets(root=DATASET_CACHE_DIR, max_bytes=None, max_age_days=None, now=None,
+                   dry_run=False, keep=()):
+    """
+    按预算淘汰数据集，整个数据集目录(分片、清单和 samples.csv)一起删除。
+
+    参数:
+        root (str): 数据集根目录
+        keep (iterable): 不淘汰的数据集目录，如刚刚构建完成的数据集
+        其余参数同 evict_market_cache
+
+    返回:
+        dict: 淘汰的 datasets(数据集数) 和 bytes(字节数)
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    datasets = find_datasets(root)
+    candidates = [item for item in datasets if os.path.abspath(item['path']) not in keep]
+    if max_bytes is not None:
+        # 保留的数据集也占用预算
+        protected = sum(item['bytes'] for item in datasets) - sum(item['bytes'] for item in candidates)
+        max_bytes = max(max_bytes - protected, 0)
+    evicted = select_evictions(candidates, max_bytes, max_age_days, now)
+    if not dry_run:
+        for item in evicted:
+            shutil.rmtree(item['path'], ignore_errors=True)
+    result = {'datasets': len(evicted), 'bytes': sum(item['bytes'] for item in evicted)}
+    if evicted and not dry_run:
+        logger.info(f"已淘汰 {result['datasets']} 个数据集，释放 {result['bytes']} 字节")
+    return result
+
+def enforce_market_budget(root=None):
+    """按配置的预算淘汰行情缓存，没有配置预算时不做任何事"""
+    budget = ConfigJson().get_cache_budgets()['market']
+    if budget['max_bytes'] is None and budget['max_age_days'] is None:
+        return None
+    return evict_market_cache(root, **budget)
+
+def enforce_dataset_budget(root=DATASET_CACHE_DIR, keep=()):
+    """
+    按配置的预算淘汰数据集，没有配置预算时不做任何事。
+    构建数据集后只对默认的数据集目录调用；自定义目录中的数据集可以用 manage_cache.py --dataset-root 手动淘汰。
+    """
+    budget = ConfigJson().get_cache_budgets()['dataset']
+    if budget['max_bytes'] is None and budget['max_age_days'] is None:
+        return None
+    return evict_datasets(root, keep=keep, **budget)
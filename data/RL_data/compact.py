@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+# 紧凑格式各列的类型：日期为距 1970-01-01 的天数，股票代码为分类，价格为 float32，成交量为 int64
+COMPACT_DATE_DTYPE = np.int32
+COMPACT_PRICE_DTYPE = np.float32
+COMPACT_VOLUME_DTYPE = np.int64
+
+def dates_to_days(dates):
+    """YYYYMMDD 字符串日期转换为距 1970-01-01 的天数"""
+    parsed = pd.to_datetime(pd.Series(dates, dtype=str), format='%Y%m%d')
+    return parsed.to_numpy().astype('datetime64[D]').astype(COMPACT_DATE_DTYPE)
+
+def days_to_dates(days):
+    """距 1970-01-01 的天数转换回 YYYYMMDD 字符串日期"""
+    # 用整数运算拼出 YYYYMMDD，比逐个格式化日期快得多
+    dates = np.asarray(days).astype('datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    years = dates.astype('datetime64[Y]')
+    number = ((years.astype(np.int64) + 1970) * 10000
+              + ((months - years).astype(np.int64) + 1) * 100
+              + (dates - months).astype(np.int64) + 1)
+    return number.astype(str)
+
+def to_compact(df, codes=None):
+    """
+    把标准格式的行情(日期和代码为字符串，其余列为 float64)转换为紧凑格式:
+        date    int32 天数，可以直接比较大小和做差
+        code    分类类型，类别顺序为 codes 中的顺序，数据中其他代码排在后面
+        volume  int64
+        其余数值列 float32
+
+    全市场多年的日线数据约占标准格式的四分之一内存，按代码分组和按日期过滤也更快。
+    价格转为 float32 后约有 7 位有效数字，缓存中始终保存完整精度的标准格式。
+
+    参数:
+        df (DataFrame): 标准格式的行情数据
+        codes (list): 股票代码的类别顺序，默认按数据中出现的顺序
+
+    返回:
+        DataFrame: 列顺序不变的紧凑格式数据
+    """
+    result = {}
+    for col in df.columns:
+        values = df[col]
+        if col == 'date':
+            result[col] = dates_to_days(values)
+        elif col == 'code':
+            values = values.astype(str)
+            categories = pd.unique(pd.concat([pd.Series(list(codes or []), dtype=str), values]))
+            result[col] = pd.Categorical(values, categories=categories)
+        elif col == 'volume':
+            result[col] = np.round(values.astype(np.float64).fillna(0)).astype(COMPACT_VOLUME_DTYPE)
+        else:
+            result[col] = values.astype(COMPACT_PRICE_DTYPE)
+    return pd.DataFrame(result, index=df.index)
@@ -1,17 +1,23 @@
 from .tushare_data import TushareDataFetcher
 from .baostock_data import BaostockDataFetcher
 from .yfinance_data import YFinanceDataFetcher
+from .synthetic_data import SyntheticDataFetcher
+from .replay_data import ReplayDataFetcher
+from logger.instrumentation import span
 
 class DataSourceFactory:
     @staticmethod
-    def create_data_source(source_name, country, start_date, end_date, code_list):
+    def create_data_source(source_name, country, start_date, end_date, code_list, **kwargs):
         sources = {
             'tushare': TushareDataFetcher,
             'baostock': BaostockDataFetcher,
-            'yfinance': YFinanceDataFetcher
+            'yfinance': YFinanceDataFetcher,
+            'synthetic': SyntheticDataFetcher,
+            'replay': ReplayDataFetcher
         }
         
         if source_name not in sources:
             raise ValueError(f"Unsupported data source: {source_name}")
             
-        return sources[source_name](country, start_date, end_date, code_list) 
\ No newline at end of file
+        with span('create_data_source', unit='codes', items=len(code_list), source=source_name):
+            return sources[source_name](country, start_date, end_date, code_list, **kwargs) 
\ No newline at end of file
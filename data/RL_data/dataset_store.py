@@ -0,0 +1,275 @@
+import os
+import re
+import json
+import time
+import numpy as np
+from logger.logging_config import logger
+
+MANIFEST_FILE = 'manifest.json'
+CHECKPOINT_FILE = 'checkpoint.json'
+FORMAT_VERSION = 1
+# 加载数据集时最多每隔这么多秒更新一次清单中的访问时间，避免频繁加载时反复写清单
+ACCESS_UPDATE_INTERVAL = 3600
+
+def _dump_json(obj, path):
+    """先写临时文件再替换，避免中断时留下损坏的清单文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def write_array_shards(dataset_dir, prefix, array, shard_size, start_index=0):
+    """
+    将数组按行切分为多个 .npy 分片写入目录。
+
+    参数:
+        dataset_dir (str): 数据集目录
+        prefix (str): 分片文件名前缀，如 train_X
+        array (ndarray): 要写入的数组
+        shard_size (int): 每个分片的最大行数
+        start_index (int): 第一个分片的编号，追加分片时使用
+
+    返回:
+        list[dict]: 分片信息，包含文件名和行数
+    """
+    shards = []
+    for i, offset in enumerate(range(0, len(array), shard_size)):
+        file_name = f"{prefix}_{start_index + i:05d}.npy"
+        chunk = np.ascontiguousarray(array[offset:offset + shard_size])
+        np.save(os.path.join(dataset_dir, file_name), chunk)
+        shards.append({'file': file_name, 'rows': len(chunk)})
+    return shards
+
+def array_manifest(array, shards):
+    """生成单个数组的清单信息"""
+    return {
+        'dtype': np.dtype(array.dtype).str,
+        'shape': [sum(shard['rows'] for shard in shards)] + list(array.shape[1:]),
+        'shards': shards
+    }
+
+def append_shards(dataset_dir, splits, dataset, shard_size):
+    """
+    把一批样本写入新的分片追加到已有数组之后，并更新 splits 中各数组的清单信息。
+    已有的分片不会被改写，调用方应在分片全部写完后再保存清单或断点。
+
+    参数:
+        dataset_dir (str): 数据集目录
+        splits (dict): 清单或断点中的 splits，原地更新
+        dataset (dict): {'train': {'X': ..., 'y': ...}, 'val': {...}}
+        shard_size (int): 每个分片的最大行数
+    """
+    for split, arrays in dataset.items():
+        for name, array in arrays.items():
+            info = splits.setdefault(split, {}).setdefault(name, {'shards': []})
+            shards = info['shards'] + write_array_shards(
+                dataset_dir, f'{split}_{name}', array, shard_size, start_index=len(info['shards']))
+            info.update(array_manifest(array, shards))
+
+def _remove_listed_shards(dataset_dir, splits):
+    for arrays in splits.values():
+        for info in arrays.values():
+            for shard in info['shards']:
+                path = os.path.join(dataset_dir, shard['file'])
+                if os.path.exists(path):
+                    os.remove(path)
+
+# 分片文件名: {split}_{name}_{编号}.npy
+SHARD_FILE_PATTERN = re.compile(r'^(train|val)_\w+_\d{5}\.npy$')
+
+def remove_unlisted_shards(dataset_dir, splits):
+    """
+    删除目录中不在 splits 中列出的分片文件。写完一批分片、保存断点或清单之前中断时，
+    编号更大的分片不在任何断点或清单中，继续构建写出的分片较少时不会被覆盖，需要在继续前删除。
+
+    返回:
+        int: 删除的文件数
+    """
+    listed = {shard['file'] for arrays in splits.values() for info in arrays.values() for shard in info['shards']}
+    removed = 0
+    for file_name in os.listdir(dataset_dir):
+        if SHARD_FILE_PATTERN.match(file_name) and file_name not in listed:
+            os.remove(os.path.join(dataset_dir, file_name))
+            removed += 1
+    if removed:
+        logger.info(f"已删除 {removed} 个未记录的分片: {dataset_dir}")
+    return removed
+
+def remove_shards(dataset_dir):
+    """删除目录中已有数据集清单和未完成构建的断点列出的全部分片，以及清单和断点本身"""
+    checkpoint = load_checkpoint(dataset_dir)
+    if checkpoint is not None:
+        _remove_listed_shards(dataset_dir, checkpoint['splits'])
+        clear_checkpoint(dataset_dir)
+    if not os.path.exists(os.path.join(dataset_dir, MANIFEST_FILE)):
+        return
+    _remove_listed_shards(dataset_dir, load_manifest(dataset_dir)['splits'])
+    os.remove(os.path.join(dataset_dir, MANIFEST_FILE))
+
+def save_dataset(dataset, dataset_dir, metadata, shard_size=65536):
+    """
+    将数据集保存为 .npy 分片加 JSON 清单的格式，分片可以用 np.load(mmap_mode='r') 内存映射读取。
+
+    目录结构:
+        manifest.json          数据集清单：格式版本、元信息、各数组的形状、类型和分片列表、创建和访问时间
+        train_X_00000.npy      训练集特征分片
+        train_y_00000.npy      训练集标签分片
+        val_X_00000.npy ...    验证集分片
+
+    参数:
+        dataset (dict): {'train': {'X': ..., 'y': ...}, 'val': {...}}
+        dataset_dir (str): 数据集目录
+        metadata (dict): 数据集元信息，需可以 JSON 序列化
+        shard_size (int): 每个分片的最大样本数
+
+    返回:
+        dict: 数据集清单
+    """
+    os.makedirs(dataset_dir, exist_ok=True)
+    remove_shards(dataset_dir)
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'metadata': metadata,
+        'shard_size': shard_size,
+        'splits': {}
+    }
+    for split, arrays in dataset.items():
+        manifest['splits'][split] = {
+            name: array_manifest(array, write_array_shards(dataset_dir, f"{split}_{name}", array, shard_size))
+            for name, array in arrays.items()
+        }
+    save_manifest(dataset_dir, manifest)
+    logger.info(f'数据集已保存到: {dataset_dir}')
+    return manifest
+
+def load_manifest(dataset_dir):
+    """只读取数据集清单，不加载任何数组"""
+    with open(os.path.join(dataset_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(dataset_dir, manifest):
+    """写回数据集清单，新清单会记录创建和访问时间，用于按最近使用时间淘汰数据集"""
+    now = time.time()
+    manifest.setdefault('created_at', now)
+    manifest.setdefault('accessed_at', now)
+    _dump_json(manifest, os.path.join(dataset_dir, MANIFEST_FILE))
+
+def load_checkpoint(dataset_dir):
+    """读取流式构建的断点，不存在时返回 None"""
+    path = os.path.join(dataset_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_checkpoint(dataset_dir, checkpoint):
+    """写入流式构建的断点，应在本批分片全部写完之后调用"""
+    _dump_json(checkpoint, os.path.join(dataset_dir, CHECKPOINT_FILE))
+
+def clear_checkpoint(dataset_dir):
+    """构建完成后删除断点"""
+    path = os.path.join(dataset_dir, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+class ShardedArray:
+    """
+    由多个 .npy 分片组成的只读数组，按需内存映射分片。
+
+    只有被访问到的分片才会打开，被访问到的样本才会由操作系统换入内存。
+    """
+
+    def __init__(self, dataset_dir, array_info, mmap_mode='r'):
+        self.dataset_dir = dataset_dir
+        self.shards = array_info['shards']
+        self.shape = tuple(array_info['shape'])
+        self.dtype = np.dtype(array_info['dtype'])
+        self.mmap_mode = mmap_mode
+        # 每个分片第一行的全局位置
+        self.offsets = np.concatenate([[0], np.cumsum([shard['rows'] for shard in self.shards])])
+        self._opened = [None] * len(self.shards)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def shard(self, i):
+        """获取第 i 个分片，首次访问时才打开"""
+        if self._opened[i] is None:
+            path = os.path.join(self.dataset_dir, self.shards[i]['file'])
+            self._opened[i] = np.load(path, mmap_mode=self.mmap_mode)
+        return self._opened[i]
+
+    def __getstate__(self):
+        # 已打开的内存映射不随对象序列化，在子进程中重新打开
+        state = self.__dict__.copy()
+        state['_opened'] = [None] * len(self.shards)
+        return state
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(f"index {index} is out of bounds for size {len(self)}")
+            i = np.searchsorted(self.offsets, index, side='right') - 1
+            return self.shard(i)[index - self.offsets[i]]
+
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self._read_range(start, stop)
+            index = np.arange(start, stop, step)
+
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        index = np.where(index < 0, index + len(self), index)
+        result = np.empty((len(index),) + self.shape[1:], dtype=self.dtype)
+        shard_ids = np.searchsorted(self.offsets, index, side='right') - 1
+        for i in np.unique(shard_ids):
+            mask = shard_ids == i
+            result[mask] = self.shard(i)[index[mask] - self.offsets[i]]
+        return result
+
+    def _read_range(self, start, stop):
+        """读取连续的一段样本，只涉及一个分片时直接返回内存映射的视图"""
+        if start >= stop:
+            return np.empty((0,) + self.shape[1:], dtype=self.dtype)
+        first = np.searchsorted(self.offsets, start, side='right') - 1
+        last = np.searchsorted(self.offsets, stop - 1, side='right') - 1
+        if first == last:
+            return self.shard(first)[start - self.offsets[first]:stop - self.offsets[first]]
+        return np.concatenate([
+            self.shard(i)[max(start, self.offsets[i]) - self.offsets[i]:min(stop, self.offsets[i + 1]) - self.offsets[i]]
+            for i in range(first, last + 1)
+        ])
+
+    def __array__(self, dtype=None, copy=None):
+        array = self._read_range(0, len(self))
+        return array.astype(dtype) if dtype is not None else np.asarray(array)
+
+def load_dataset(dataset_dir, mmap_mode='r'):
+    """
+    以内存映射方式打开分片数据集。
+
+    返回:
+        tuple: (数据集, 清单)，数据集结构为 {'train': {'X': ShardedArray, 'y': ShardedArray}, 'val': {...}}
+    """
+    manifest = load_manifest(dataset_dir)
+    now = time.time()
+    if now - manifest.get('accessed_at', 0) > ACCESS_UPDATE_INTERVAL:
+        manifest['accessed_at'] = now
+        try:
+            save_manifest(dataset_dir, manifest)
+        except OSError as e:
+            # 只读目录中的数据集仍然可以加载
+            logger.debug(f'无法更新数据集访问时间 {dataset_dir}: {str(e)}')
+    dataset = {
+        split: {name: ShardedArray(dataset_dir, info, mmap_mode) for name, info in arrays.items()}
+        for split, arrays in manifest['splits'].items()
+    }
+    return dataset, manifest
@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from data.RL_data.compact import days_to_dates
+from logger.logging_config import logger
+
+# 特征计算方式的版本，修改任一特征的计算方式时递增，旧的缓存文件随之失效
+FEATURE_VERSION = 1
+
+def _squash(x, scale):
+    """把实数映射到 (0, 1)，0 映射到 0.5，scale 越大曲线越平缓"""
+    return 0.5 + 0.5 * np.tanh(x / scale)
+
+def _ratio(numerator, denominator, default=0.5):
+    """分母为0(如全天一字板)时取 default"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = numerator / denominator
+    return np.where(denominator > 0, result, default)
+
+def _close_range(frame, lookback):
+    """收盘价在最近 lookback 天最低价和最高价之间的位置"""
+    close = frame['close']
+    low = close.rolling(lookback, min_periods=1).min().to_numpy()
+    high = close.rolling(lookback, min_periods=1).max().to_numpy()
+    return _ratio(close.to_numpy() - low, high - low)
+
+def _log_return(frame, lookback):
+    """日对数收益率，±5% 左右映射到 (0.12, 0.88)"""
+    close = frame['close'].to_numpy()
+    returns = np.zeros(len(close))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = np.log(close[1:] / close[:-1])
+    return _squash(np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0), 0.05)
+
+def _volume_z(frame, lookback):
+    """成交量相对最近 lookback 天的 z 分数"""
+    volume = frame['volume']
+    mean = volume.rolling(lookback, min_periods=2).mean().to_numpy()
+    std = volume.rolling(lookback, min_periods=2).std().to_numpy()
+    z = _ratio(volume.to_numpy() - mean, std, default=0.0)
+    return _squash(np.nan_to_num(z, nan=0.0), 2.0)
+
+def _hl_range(frame, lookback):
+    """当日振幅 (最高价 - 最低价) / 收盘价，映射到 [0, 1)"""
+    amplitude = _ratio((frame['high'] - frame['low']).to_numpy(), frame['close'].to_numpy(), default=0.0)
+    return np.tanh(np.maximum(amplitude, 0) / 0.05)
+
+def _close_position(frame, lookback):
+    """收盘价在当日最低价和最高价之间的位置"""
+    high, low = frame['high'].to_numpy(), frame['low'].to_numpy()
+    return np.clip(_ratio(frame['close'].to_numpy() - low, high - low), 0, 1)
+
+# 可用的特征：全部只使用当天及之前的数据，取值在 [0, 1] 之间
+FEATURE_FUNCTIONS = {
+    'close_range': _close_range,
+    'log_return': _log_return,
+    'volume_z': _volume_z,
+    'hl_range': _hl_range,
+    'close_position': _close_position
+}
+DEFAULT_FEATURES = tuple(FEATURE_FUNCTIONS)
+
+def compute_features(frame, features=DEFAULT_FEATURES, lookback=20):
+    """
+    用向量化的滚动计算一只股票的全部特征列。
+
+    参数:
+        frame (DataFrame): 一只股票按日期升序排列的行情，需要包含特征用到的 OHLCV 列
+        features (sequence): 特征名称，见 FEATURE_FUNCTIONS
+        lookback (int): 滚动统计的天数
+
+    返回:
+        ndarray: 形状为 (行数, 特征数) 的 float32 特征矩阵，行与 frame 一一对应
+    """
+    unknown = [name for name in features if name not in FEATURE_FUNCTIONS]
+    if unknown:
+        raise ValueError(f"不支持的特征: {unknown}，可用的特征: {list(FEATURE_FUNCTIONS)}")
+    frame = frame.reset_index(drop=True)
+    frame = frame.astype({col: np.float64 for col in ('open', 'high', 'low', 'close', 'volume') if col in frame})
+    result = np.empty((len(frame), len(features)), dtype=np.float32)
+    for i, name in enumerate(features):
+        result[:, i] = FEATURE_FUNCTIONS[name](frame, lookback)
+    return result
+
+class FeatureStore:
+    """
+    归一化特征的持久化缓存，按 数据源/市场/股票代码 分目录，每种特征配置一个 .npz 文件:
+        featurestore/{source}/{market}/{code}/{params_hash}.npz
+
+    每只股票的特征矩阵只计算一次，文件中同时保存对应的日期，日期完全一致时直接复用。
+    磁盘文件前面有一层按股票代码的内存 LRU。
+    """
+
+    def __init__(self, features=DEFAULT_FEATURES, lookback=20, root_path=None, max_entries=256):
+        """
+        参数:
+            features (sequence): 特征名称，见 FEATURE_FUNCTIONS
+            lookback (int): 滚动统计的天数
+            root_path (str): 缓存根目录，默认为 data/featurestore
+            max_entries (int): 内存中最多保留的股票数
+        """
+        unknown = [name for name in features if name not in FEATURE_FUNCTIONS]
+        if unknown:
+            raise ValueError(f"不支持的特征: {unknown}，可用的特征: {list(FEATURE_FUNCTIONS)}")
+        if root_path is None:
+            root_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'featurestore')
+        self.features = tuple(features)
+        self.lookback = lookback
+        self.root_path = root_path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def params(self):
+        """特征配置，记录在数据集元信息中"""
+        return {'features': list(self.features), 'lookback': self.lookback, 'version': FEATURE_VERSION}
+
+    def params_hash(self):
+        """特征配置的摘要"""
+        return hashlib.sha1(json.dumps(self.params(), sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    def entry_path(self, source, market, code):
+        """获取某只股票的特征缓存文件路径"""
+        return os.path.join(self.root_path, source, market.lower(), str(code), f"{self.params_hash()}.npz")
+
+    def _load_entry(self, path):
+        if path in self._entries:
+            self._entries.move_to_end(path)
+            return self._entries[path]
+        entry = None
+        if os.path.exists(path):
+            try:
+                with np.load(path) as f:
+                    entry = {name: f[name] for name in f.files}
+            except Exception as e:
+                logger.warning(f"读取特征缓存失败，将重新计算: {path}, {str(e)}")
+        if entry is not None:
+            self._remember(path, entry)
+        return entry
+
+    def _remember(self, path, entry):
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, source, market, code, frame):
+        """
+        获取一只股票的特征矩阵，缓存中的日期与 frame 完全一致时直接返回，否则重新计算并写入缓存。
+
+        参数:
+            frame (DataFrame): 一只股票按日期升序排列的行情，日期可以是 YYYYMMDD 字符串或紧凑格式的天数
+
+        返回:
+            ndarray: 形状为 (行数, 特征数) 的 float32 特征矩阵
+        """
+        dates = frame['date'].to_numpy()
+        dates = days_to_dates(dates) if np.issubdtype(dates.dtype, np.integer) else dates.astype('<U8')
+        path = self.entry_path(source, market, code)
+        entry = self._load_entry(path)
+        if entry is not None and np.array_equal(entry['dates'], dates):
+            self.hits += 1
+            return entry['features']
+
+        self.misses += 1
+        entry = {'dates': dates, 'features': compute_features(frame, self.features, self.lookback)}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **entry)
+        os.replace(tmp_path, path)
+        self._remember(path, entry)
+        return entry['features']
+
+    def clear_memory(self):
+        """清空内存中的 LRU，磁盘文件保留"""
+        self._entries.clear()
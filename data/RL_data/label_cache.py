@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from data.RL_data.trend_analysis import TrendAnalyzer
+from logger.logging_config import logger
+
+# 每个窗口保存的枢纽点个数：趋势判断只用到最后4个枢纽点
+STORED_PIVOTS = 4
+
+class LabelCache:
+    """
+    趋势标签的持久化缓存，按 数据源/市场/股票代码 分目录，每种标签配置一个 .npz 文件:
+        labelcache/{source}/{market}/{code}/out{output_window}_{params_hash}.npz
+
+    缓存键为 股票代码 + 输出窗口的开始/结束日期 + 输出窗口长度 + 价格类型 + 趋势分析参数，
+    只改变输入窗口长度、步长或训练集比例时可以直接复用已有标签。
+    float32 价格(紧凑格式)在阈值附近可能得到与 float64 不同的标签，因此两种价格类型的标签分开保存。
+    每个窗口保存标签和最后几个枢纽点(位置、价格)，磁盘文件前面有一层按股票代码的内存 LRU。
+    """
+
+    def __init__(self, root_path=None, max_entries=256):
+        """
+        参数:
+            root_path (str): 缓存根目录，默认为 data/labelcache
+            max_entries (int): 内存中最多保留的 (股票代码, 标签配置) 条目数
+        """
+        if root_path is None:
+            root_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'labelcache')
+        self.root_path = root_path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def params_hash(output_window, dtype=np.float64):
+        """标签配置的摘要：输出窗口长度、价格类型和趋势分析参数"""
+        params = dict(TrendAnalyzer.params(), output_window=output_window, dtype=np.dtype(dtype).name)
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    def entry_path(self, source, market, code, output_window, dtype=np.float64):
+        """获取某只股票某种标签配置的缓存文件路径，dtype 为计算标签的价格类型"""
+        file_name = f"out{output_window}_{self.params_hash(output_window, dtype)}.npz"
+        return os.path.join(self.root_path, source, market.lower(), str(code), file_name)
+
+    @staticmethod
+    def window_keys(start_dates, end_dates):
+        """把窗口的开始、结束日期(YYYYMMDD)拼成定长字符串作为查找键"""
+        return np.char.add(np.asarray(start_dates, dtype='<U8'), np.asarray(end_dates, dtype='<U8'))
+
+    def _load_entry(self, path):
+        """从内存 LRU 或磁盘读取缓存条目，条目中的数组按查找键排序"""
+        if path in self._entries:
+            self._entries.move_to_end(path)
+            return self._entries[path]
+        entry = None
+        if os.path.exists(path):
+            try:
+                with np.load(path) as f:
+                    entry = {name: f[name] for name in f.files}
+            except Exception as e:
+                logger.warning(f"读取标签缓存失败，将重新计算: {path}, {str(e)}")
+        if entry is not None:
+            self._remember(path, entry)
+        return entry
+
+    def _remember(self, path, entry):
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, source, market, code, output_window, start_dates, end_dates, dtype=np.float64):
+        """
+        查找一只股票一批输出窗口的缓存标签。
+
+        参数:
+            start_dates/end_dates (array-like): 每个输出窗口的开始、结束日期(YYYYMMDD)
+            dtype: 输出窗口价格的类型
+
+        返回:
+            tuple: (labels, hit)，labels 为 int64 标签数组(未命中的位置为-1)，hit 为是否命中的布尔数组
+        """
+        keys = self.window_keys(start_dates, end_dates)
+        labels = np.full(len(keys), -1, dtype=np.int64)
+        hit = np.zeros(len(keys), dtype=bool)
+        entry = self._load_entry(self.entry_path(source, market, code, output_window, dtype))
+        if entry is not None and len(entry['keys']) > 0 and len(keys) > 0:
+            pos = np.minimum(np.searchsorted(entry['keys'], keys), len(entry['keys']) - 1)
+            hit = entry['keys'][pos] == keys
+            labels[hit] = entry['labels'][pos[hit]]
+        self.hits += int(hit.sum())
+        self.misses += int(len(keys) - hit.sum())
+        return labels, hit
+
+    def store(self, source, market, code, output_window, start_dates, end_dates,
+              labels, pivot_positions, pivot_prices, pivot_counts, dtype=np.float64):
+        """
+        保存一只股票一批输出窗口的标签和枢纽点，与已有条目合并(同一窗口以新结果为准)。
+
+        参数:
+            labels (ndarray): 每个窗口的标签
+            pivot_positions/pivot_prices/pivot_counts: _zigzag_pivot_arrays 格式的枢纽点
+            dtype: 计算标签时输出窗口价格的类型
+        """
+        if len(labels) == 0:
+            return
+        counts = np.asarray(pivot_counts, dtype=np.int64)
+        # 只保留最后 STORED_PIVOTS 个枢纽点，不足的位置填 -1
+        slots = counts[:, None] - STORED_PIVOTS + np.arange(STORED_PIVOTS)
+        valid = slots >= 0
+        rows = np.arange(len(counts))[:, None]
+        slots = np.clip(slots, 0, None)
+        new_entry = {
+            'keys': self.window_keys(start_dates, end_dates),
+            'labels': np.asarray(labels, dtype=np.int8),
+            'pivot_counts': counts.astype(np.int16),
+            'pivot_positions': np.where(valid, pivot_positions[rows, slots], -1).astype(np.int16),
+            'pivot_prices': np.where(valid, pivot_prices[rows, slots], np.nan).astype(np.float32)
+        }
+
+        path = self.entry_path(source, market, code, output_window, dtype)
+        old_entry = self._load_entry(path)
+        if old_entry is not None:
+            # 新结果放在前面，去重时保留新结果
+            merged = {name: np.concatenate([new_entry[name], old_entry[name]]) for name in new_entry}
+        else:
+            merged = new_entry
+        _, first = np.unique(merged['keys'], return_index=True)
+        entry = {name: array[first] for name, array in merged.items()}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **entry)
+        os.replace(tmp_path, path)
+        self._remember(path, entry)
+
+    def clear_memory(self):
+        """清空内存中的 LRU，磁盘文件保留"""
+        self._entries.clear()
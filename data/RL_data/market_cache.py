@@ -0,0 +1,425 @@
+import io
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import datetime
+from contextlib import closing
+import pandas as pd
+from logger.logging_config import logger
+
+def shift_date(date_str, days):
+    """日期(YYYYMMDD)加减天数"""
+    date = datetime.datetime.strptime(date_str, '%Y%m%d') + datetime.timedelta(days=days)
+    return date.strftime('%Y%m%d')
+
+class MarketDataCache:
+    """
+    列式行情缓存。每只股票每年的数据保存为一个 Parquet 文件，文件按内容的 SHA-256 命名:
+        cachedata/{source}/{country}/objects/{sha256[:2]}/{sha256}.parquet
+
+    文件名不包含任何股票代码或日期，缓存内容全部记录在 SQLite 目录 _catalog.sqlite 中：
+        files    (股票代码, 频率, 复权方式, 年份) -> 文件路径、行数、字节数、校验和、日期范围、创建和访问时间
+        coverage (股票代码, 频率, 复权方式) 已缓存的日期区间，用于只获取缺失的区间
+    两张表都按主键建立索引，查找是 O(log n) 的索引查询，不需要扫描目录。
+    内容相同的文件只保存一份，读取时把日期过滤和列选择下推到 Parquet 读取层。
+    """
+
+    CATALOG_FILE = '_catalog.sqlite'
+    OBJECTS_DIR = 'objects'
+    # 旧版本按 {code}/{year}.parquet 存储并在 _coverage.json 中记录区间，首次打开目录时自动迁移
+    LEGACY_COVERAGE_FILE = '_coverage.json'
+    # 单条 SQL 中 IN 查询的最大参数数
+    QUERY_CHUNK = 500
+
+    def __init__(self, source, country, root_path=None, frequency='d', adjust='none'):
+        """
+        参数:
+            source (str): 数据源名称
+            country (str): 市场
+            root_path (str): 缓存根目录，默认为 data/cachedata
+            frequency (str): 数据频率，如 d(日线)
+            adjust (str): 复权方式，如 none(不复权)
+        """
+        if root_path is None:
+            root_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cachedata')
+        self.source = source
+        self.country = country.lower()
+        self.frequency = frequency
+        self.adjust = adjust
+        self.root_path = root_path
+        self.base_path = os.path.join(root_path, source, self.country)
+        self.catalog_path = os.path.join(self.base_path, self.CATALOG_FILE)
+        # 本实例是否已确认目录中的表存在，建表语句每个实例只执行一次
+        self._schema_ready = False
+
+    def _connect(self, create=False):
+        """
+        打开缓存目录。目录不存在且 create 为 False 时返回 None，只读操作不会创建任何文件。
+        """
+        legacy = os.path.exists(os.path.join(self.base_path, self.LEGACY_COVERAGE_FILE))
+        if not os.path.exists(self.catalog_path):
+            if not create and not legacy:
+                return None
+            os.makedirs(self.base_path, exist_ok=True)
+            # 目录文件被删除后重新创建时需要重新建表
+            self._schema_ready = False
+        conn = sqlite3.connect(self.catalog_path, timeout=30)
+        if not self._schema_ready:
+            self._create_schema(conn)
+            self._schema_ready = True
+        if legacy:
+            self._migrate_legacy(conn)
+        return conn
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                code TEXT NOT NULL,
+                frequency TEXT NOT NULL,
+                adjust TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (code, frequency, adjust, year)
+            );
+            CREATE INDEX IF NOT EXISTS files_path ON files (path);
+            CREATE TABLE IF NOT EXISTS coverage (
+                code TEXT NOT NULL,
+                frequency TEXT NOT NULL,
+                adjust TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT NOT NULL,
+                PRIMARY KEY (code, frequency, adjust, start_date)
+            );
+        """)
+
+    def _key(self, code):
+        return (str(code), self.frequency, self.adjust)
+
+    def get_coverage(self, code):
+        """
+        获取某只股票已缓存的日期区间。
+
+        返回:
+            list[list[str]]: 按时间排序、互不相邻的闭区间 [开始日期, 结束日期]
+        """
+        return self.get_coverages([code])[str(code)]
+
+    def get_coverages(self, codes):
+        """
+        在一个连接中批量获取多只股票已缓存的日期区间，按 QUERY_CHUNK 分批用 IN 查询。
+
+        返回:
+            dict: {股票代码: 同 get_coverage 的区间列表}，没有缓存的股票为空列表
+        """
+        codes = [str(code) for code in codes]
+        coverage = {code: [] for code in codes}
+        conn = self._connect()
+        if conn is None:
+            return coverage
+        with closing(conn):
+            for i in range(0, len(codes), self.QUERY_CHUNK):
+                chunk = codes[i:i + self.QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT code, start_date, end_date FROM coverage WHERE code IN ({','.join('?' * len(chunk))}) "
+                    "AND frequency=? AND adjust=? ORDER BY code, start_date",
+                    chunk + [self.frequency, self.adjust]).fetchall()
+                for code, start_date, end_date in rows:
+                    coverage[code].append([start_date, end_date])
+        return coverage
+
+    def add_coverage(self, codes, start_date, end_date):
+        """
+        记录一批股票在 [start_date, end_date] 区间内的数据已缓存，与已有区间合并。
+        区间覆盖的是请求的日期范围而不只是有数据的日期，停牌和节假日同样视为已缓存。
+        """
+        if start_date > end_date:
+            return
+        with closing(self._connect(create=True)) as conn, conn:
+            for code in codes:
+                key = self._key(code)
+                # 与新区间重叠或相邻(相差一天)的已有区间
+                overlapping = conn.execute(
+                    "SELECT start_date, end_date FROM coverage WHERE code=? AND frequency=? AND adjust=? "
+                    "AND start_date<=? AND end_date>=?",
+                    key + (shift_date(end_date, 1), shift_date(start_date, -1))).fetchall()
+                merged_start = min([start_date] + [row[0] for row in overlapping])
+                merged_end = max([end_date] + [row[1] for row in overlapping])
+                conn.executemany(
+                    "DELETE FROM coverage WHERE code=? AND frequency=? AND adjust=? AND start_date=?",
+                    [key + (row[0],) for row in overlapping])
+                conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?)", key + (merged_start, merged_end))
+
+    def missing_ranges(self, code, start_date, end_date):
+        """
+        计算 [start_date, end_date] 中尚未缓存的日期区间。
+
+        返回:
+            list[tuple]: 缺失的闭区间 (开始日期, 结束日期) 列表
+        """
+        return self.missing_ranges_for([code], start_date, end_date)[str(code)]
+
+    def missing_ranges_for(self, codes, start_date, end_date):
+        """
+        批量计算多只股票在 [start_date, end_date] 中尚未缓存的日期区间，只查询一次目录。
+
+        返回:
+            dict: {股票代码: 同 missing_ranges 的缺失区间列表}
+        """
+        if start_date > end_date:
+            return {str(code): [] for code in codes}
+        return {code: self._gaps(intervals, start_date, end_date)
+                for code, intervals in self.get_coverages(codes).items()}
+
+    @staticmethod
+    def _gaps(coverage, start_date, end_date):
+        """已缓存区间在 [start_date, end_date] 中的空缺"""
+        gaps = []
+        cursor = start_date
+        for interval_start, interval_end in coverage:
+            if interval_end < cursor:
+                continue
+            if interval_start > end_date:
+                break
+            if interval_start > cursor:
+                gaps.append((cursor, shift_date(interval_start, -1)))
+            cursor = shift_date(interval_end, 1)
+            if cursor > end_date:
+                return gaps
+        gaps.append((cursor, end_date))
+        return gaps
+
+    @staticmethod
+    def _atomic_write(path, writer):
+        """先写临时文件再替换，避免中断时留下损坏的缓存文件"""
+        tmp_path = f"{path}.tmp"
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _store_object(self, df):
+        """
+        把数据保存为按内容命名的 Parquet 文件，内容相同的文件已存在时直接复用。
+
+        返回:
+            tuple: (相对路径, 字节数, SHA-256)
+        """
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        content = buffer.getvalue()
+        digest = hashlib.sha256(content).hexdigest()
+        relative_path = os.path.join(self.OBJECTS_DIR, digest[:2], f"{digest}.parquet")
+        path = os.path.join(self.base_path, relative_path)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            def write_content(tmp_path):
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+            self._atomic_write(path, write_content)
+        return relative_path, len(content), digest
+
+    def _release_object(self, conn, relative_path):
+        """没有任何条目再引用该文件时删除它"""
+        referenced = conn.execute("SELECT 1 FROM files WHERE path=? LIMIT 1", (relative_path,)).fetchone()
+        path = os.path.join(self.base_path, relative_path)
+        if referenced is None and os.path.exists(path):
+            os.remove(path)
+
+    def _lookup(self, conn, code, year):
+        """查找某只股票某一年的数据文件相对路径"""
+        row = conn.execute(
+            "SELECT path FROM files WHERE code=? AND frequency=? AND adjust=? AND year=?",
+            self._key(code) + (int(year),)).fetchone()
+        return row[0] if row else None
+
+    def _register(self, conn, code, year, part):
+        """保存一个分区的数据并写入目录，替换该分区原有的文件"""
+        key = self._key(code)
+        previous = self._lookup(conn, code, year)
+        relative_path, size, digest = self._store_object(part)
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + (int(year), relative_path, len(part), size, digest,
+                   part['date'].iloc[0], part['date'].iloc[-1], now, now))
+        if previous is not None and previous != relative_path:
+            self._release_object(conn, previous)
+
+    def partition_path(self, code, year):
+        """获取某只股票某一年的数据文件路径，没有缓存时返回 None"""
+        conn = self._connect()
+        if conn is None:
+            return None
+        with closing(conn):
+            relative_path = self._lookup(conn, code, year)
+        return os.path.join(self.base_path, relative_path) if relative_path else None
+
+    def write(self, df):
+        """
+        写入行情数据，按股票代码和年份拆分后与已有分区合并(同一日期以新数据为准)。
+
+        参数:
+            df (DataFrame): 包含 date(YYYYMMDD) 和 code 列的行情数据
+        """
+        if df.empty:
+            return
+        with closing(self._connect(create=True)) as conn, conn:
+            for (code, year), part in df.groupby([df['code'], df['date'].str[:4]], sort=False):
+                relative_path = self._lookup(conn, code, year)
+                if relative_path is not None:
+                    existing = pd.read_parquet(os.path.join(self.base_path, relative_path))
+                    part = pd.concat([existing, part], ignore_index=True)
+                    part = part.drop_duplicates(subset=['date'], keep='last')
+                part = part.sort_values('date').reset_index(drop=True)
+                self._register(conn, code, year, part)
+        logger.debug(f"已写入 {len(df)} 条行情到缓存 {self.base_path}")
+
+    def read(self, codes, start_date, end_date, columns=None):
+        """
+        读取行情数据，通过目录索引找到涉及的文件，日期过滤和列选择下推到 Parquet 读取层。
+
+        参数:
+            codes (list): 股票代码列表
+            start_date (str): 开始日期，格式YYYYMMDD
+            end_date (str): 结束日期，格式YYYYMMDD
+            columns (list): 需要读取的列，默认为全部列
+
+        返回:
+            DataFrame: 按传入的股票代码顺序、日期升序排列的行情数据
+        """
+        conn = self._connect()
+        if conn is None:
+            return pd.DataFrame(columns=columns)
+        codes = [str(code) for code in codes]
+        entries = []
+        with closing(conn), conn:
+            for i in range(0, len(codes), self.QUERY_CHUNK):
+                chunk = codes[i:i + self.QUERY_CHUNK]
+                entries += conn.execute(
+                    f"SELECT code, year, path FROM files WHERE code IN ({','.join('?' * len(chunk))}) "
+                    "AND frequency=? AND adjust=? AND year BETWEEN ? AND ? AND end_date>=? AND start_date<=?",
+                    chunk + [self.frequency, self.adjust, int(start_date[:4]), int(end_date[:4]),
+                             start_date, end_date]).fetchall()
+            # 记录访问时间，用于按最近使用时间淘汰缓存
+            conn.executemany(
+                "UPDATE files SET accessed_at=? WHERE code=? AND frequency=? AND adjust=? AND year=?",
+                [(time.time(), code, self.frequency, self.adjust, year) for code, year, _ in entries])
+        if not entries:
+            return pd.DataFrame(columns=columns)
+
+        order = {code: i for i, code in enumerate(codes)}
+        entries.sort(key=lambda entry: (order[entry[0]], entry[1]))
+        df = pd.read_parquet(
+            [os.path.join(self.base_path, entry[2]) for entry in entries],
+            columns=columns,
+            filters=[('date', '>=', start_date), ('date', '<=', end_date)]
+        )
+        return df.reset_index(drop=True)
+
+    def verify(self):
+        """
+        校验缓存文件的完整性。
+
+        返回:
+            list[tuple]: 缺失或校验和不一致的 (股票代码, 年份, 文件路径)
+        """
+        conn = self._connect()
+        if conn is None:
+            return []
+        with closing(conn):
+            entries = conn.execute(
+                "SELECT code, year, path, sha256 FROM files WHERE frequency=? AND adjust=?",
+                (self.frequency, self.adjust)).fetchall()
+        corrupted = []
+        for code, year, relative_path, digest in entries:
+            path = os.path.join(self.base_path, relative_path)
+            if not os.path.exists(path):
+                corrupted.append((code, year, path))
+                continue
+            with open(path, 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() != digest:
+                    corrupted.append((code, year, path))
+        return corrupted
+
+    def entries(self):
+        """
+        获取目录中全部文件条目(包括所有频率和复权方式)，用于统计用量和淘汰。
+
+        返回:
+            list[dict]: code、frequency、adjust、year、path(相对路径)、bytes、accessed_at
+        """
+        conn = self._connect()
+        if conn is None:
+            return []
+        with closing(conn):
+            rows = conn.execute(
+                "SELECT code, frequency, adjust, year, path, bytes, accessed_at FROM files").fetchall()
+        names = ('code', 'frequency', 'adjust', 'year', 'path', 'bytes', 'accessed_at')
+        return [dict(zip(names, row)) for row in rows]
+
+    def _remove_coverage(self, conn, key, start_date, end_date):
+        """从已缓存区间中去掉 [start_date, end_date]，被截断的区间保留剩余部分"""
+        overlapping = conn.execute(
+            "SELECT start_date, end_date FROM coverage WHERE code=? AND frequency=? AND adjust=? "
+            "AND start_date<=? AND end_date>=?", key + (end_date, start_date)).fetchall()
+        for interval_start, interval_end in overlapping:
+            conn.execute("DELETE FROM coverage WHERE code=? AND frequency=? AND adjust=? AND start_date=?",
+                         key + (interval_start,))
+            if interval_start < start_date:
+                conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?)",
+                             key + (interval_start, shift_date(start_date, -1)))
+            if interval_end > end_date:
+                conn.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?)",
+                             key + (shift_date(end_date, 1), interval_end))
+
+    def remove_entries(self, entries):
+        """
+        删除文件条目，并把对应年份从已缓存区间中去掉，下次请求时会重新获取。
+        不再被任何条目引用的文件随之删除。
+
+        参数:
+            entries (list[dict]): entries() 返回的条目
+        """
+        if not entries:
+            return
+        with closing(self._connect(create=True)) as conn, conn:
+            for entry in entries:
+                key = (entry['code'], entry['frequency'], entry['adjust'])
+                conn.execute("DELETE FROM files WHERE code=? AND frequency=? AND adjust=? AND year=?",
+                             key + (entry['year'],))
+                self._remove_coverage(conn, key, f"{entry['year']}0101", f"{entry['year']}1231")
+            for relative_path in {entry['path'] for entry in entries}:
+                self._release_object(conn, relative_path)
+
+    def _migrate_legacy(self, conn):
+        """把旧版本的 {code}/{year}.parquet 文件和 _coverage.json 导入目录，导入后删除旧文件"""
+        legacy_path = os.path.join(self.base_path, self.LEGACY_COVERAGE_FILE)
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            legacy_coverage = json.load(f)
+        with conn:
+            for code in os.listdir(self.base_path):
+                code_dir = os.path.join(self.base_path, code)
+                if code == self.OBJECTS_DIR or not os.path.isdir(code_dir):
+                    continue
+                for file_name in sorted(os.listdir(code_dir)):
+                    if not file_name.endswith('.parquet'):
+                        continue
+                    part = pd.read_parquet(os.path.join(code_dir, file_name))
+                    if not part.empty:
+                        self._register(conn, code, file_name[:-len('.parquet')], part)
+                    os.remove(os.path.join(code_dir, file_name))
+                if not os.listdir(code_dir):
+                    os.rmdir(code_dir)
+            for code, intervals in legacy_coverage.items():
+                conn.executemany("INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?)",
+                                 [self._key(code) + tuple(interval) for interval in intervals])
+        os.remove(legacy_path)
+        logger.info(f"已将旧版缓存迁移到目录 {self.catalog_path}")
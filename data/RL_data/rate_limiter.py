@@ -0,0 +1,54 @@
+import threading
+import time
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器。
+
+    桶中最多存放 capacity 个令牌，初始为满；令牌以 (rate - capacity)/per 的速度匀速补充，
+    突发的 capacity 次调用计入配额，因此任意 per 秒内的调用次数都不超过 rate。
+    capacity 等于 rate 时整个配额都用于突发，之后每 per 秒补充一个令牌(如 rate=1 时每周期调用一次)。
+    每次调用 acquire 消耗一个令牌，令牌不足时阻塞等待。
+    """
+
+    # 等待的最短时间(秒)，避免浮点误差导致的剩余令牌极小时空转
+    MIN_WAIT = 1e-3
+
+    def __init__(self, rate, per=60.0, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        参数:
+            rate (int): 每个周期允许的调用次数
+            per (float): 周期长度(秒)，默认60秒，对应按分钟计的配额
+            capacity (int): 桶容量，即允许的最大突发调用次数，不能大于 rate，默认为 max(1, rate // 10)
+            clock (callable): 单调时钟，便于测试注入
+            sleep (callable): 等待函数，便于测试注入
+        """
+        if rate <= 0 or per <= 0:
+            raise ValueError(f"rate 和 per 必须大于0: rate={rate}, per={per}")
+        if capacity is None:
+            capacity = max(1, rate // 10)
+        if not 1 <= capacity <= rate:
+            raise ValueError(f"capacity 必须不小于1且不大于 rate: capacity={capacity}, rate={rate}")
+        self.fill_rate = max(rate - capacity, 1) / per
+        self.capacity = capacity
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.last_time = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.fill_rate)
+        self.last_time = now
+
+    def acquire(self):
+        """获取一个令牌，必要时阻塞到有令牌可用"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = max((1 - self.tokens) / self.fill_rate, self.MIN_WAIT)
+            self.sleep(wait_time)
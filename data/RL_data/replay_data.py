@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from .base_data import BaseDataFetcher
+from .market_cache import MarketDataCache
+from .compact import to_compact, dates_to_days
+from logger.logging_config import logger
+
+class ReplayDataFetcher(BaseDataFetcher):
+    """
+    回放数据源，只读取其他数据源已经缓存的行情，不访问网络，返回的列和类型与真实数据源一致。
+
+    每只股票的全部缓存行情第一次读取后保留在进程内存中(多个实例共享)，
+    之后任意日期区间的请求都在内存中按日期截取。
+    """
+    source_name = 'replay'
+
+    # 进程内共享的行情 {(缓存目录, 股票代码, 是否紧凑格式): DataFrame}，按最近使用顺序淘汰
+    _memory = OrderedDict()
+    max_memory_codes = 4096
+
+    def __init__(self, country, start_date, end_date, code_list, replay_source='baostock', cache_root=None,
+                 compact=False):
+        """
+        参数:
+            replay_source (str): 要回放的数据源名称，对应缓存目录 cachedata/{replay_source}/{country}
+            cache_root (str): 缓存根目录，默认为 data/cachedata
+            compact (bool): 是否以紧凑格式返回数据，进程内保留的行情也使用紧凑格式
+        """
+        super().__init__(country, start_date, end_date, code_list, compact=compact)
+        self.replay_source = replay_source
+        self.cache = MarketDataCache(replay_source, self.country, root_path=cache_root)
+
+    @classmethod
+    def clear_memory(cls):
+        """清空进程内的行情"""
+        cls._memory.clear()
+
+    def _load_code(self, code):
+        """读取一只股票全部已缓存的行情，按日期升序排列"""
+        key = (self.cache.base_path, code, self.compact)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        coverage = self.cache.get_coverage(code)
+        if coverage:
+            frame = self.cache.read([code], coverage[0][0], coverage[-1][1], columns=self.columns)
+            frame = frame.astype(self.dtypes).sort_values('date', ignore_index=True)
+        else:
+            frame = pd.DataFrame(columns=self.columns).astype(self.dtypes)
+        if self.compact:
+            frame = to_compact(frame, [code])
+        self._memory[key] = frame
+        while len(self._memory) > self.max_memory_codes:
+            self._memory.popitem(last=False)
+        return frame
+
+    def _fetch_day_trade_data(self, code_list, start_date, end_date):
+        frames = []
+        frame_codes = []
+        missing = []
+        # 紧凑格式的日期是天数，先把请求的区间也转换为天数
+        start_key, end_key = dates_to_days([start_date, end_date]) if self.compact else (start_date, end_date)
+        for code in code_list:
+            frame = self._load_code(self._to_cache_code(code))
+            dates = frame['date'].to_numpy()
+            start = np.searchsorted(dates, start_key, side='left')
+            end = np.searchsorted(dates, end_key, side='right')
+            if start == end:
+                missing.append(code)
+                continue
+            frames.append(frame.iloc[start:end])
+            frame_codes.append(self._to_cache_code(code))
+        if missing:
+            logger.warning(f"{len(missing)} 只股票在 {self.replay_source} 缓存中没有 "
+                           f"{start_date} 到 {end_date} 的数据: {missing}")
+        if not frames:
+            return self._to_output(pd.DataFrame(columns=self.columns))
+        result = pd.concat(frames, ignore_index=True)
+        if self.compact:
+            # 每只股票的分类只包含自己的代码，合并后按请求的代码顺序重建分类
+            categories = list(dict.fromkeys(self.get_cache_codes()))
+            positions = {code: i for i, code in enumerate(categories)}
+            result['code'] = pd.Categorical.from_codes(
+                np.repeat([positions[code] for code in frame_codes], [len(frame) for frame in frames]),
+                categories=categories)
+        return result
+
+    def get_day_trade_data(self):
+        """从缓存回放请求的行情，不会获取缺失的数据"""
+        return self._fetch_day_trade_data(self.code_list, self.start_date, self.end_date)
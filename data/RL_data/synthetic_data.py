@@ -0,0 +1,82 @@
+import zlib
+import numpy as np
+import pandas as pd
+from .base_data import BaseDataFetcher
+from logger.logging_config import logger
+
+# 合成行情的起始日期，任意日期区间都从这一天开始生成再截取，保证同一股票同一天的价格不随请求区间变化
+SYNTHETIC_ORIGIN = '20000103'
+
+def generate_ohlcv(codes, start_date, end_date, seed=0, origin=SYNTHETIC_ORIGIN):
+    """
+    生成确定性的合成日线行情，收盘价为几何随机游走，交易日为工作日。
+
+    每只股票使用由 seed 和股票代码决定的独立随机数序列，
+    因此同一股票的数据与一起生成的其他股票、请求的日期区间都无关。
+
+    参数:
+        codes (list): 股票代码列表
+        start_date (str): 开始日期，格式YYYYMMDD
+        end_date (str): 结束日期，格式YYYYMMDD
+        seed (int): 随机种子
+        origin (str): 随机游走的起始日期
+
+    返回:
+        DataFrame: 列为 date, code, open, high, low, close, volume，按股票代码顺序、日期升序排列
+    """
+    if start_date > end_date:
+        raise ValueError(f"开始日期 {start_date} 晚于结束日期 {end_date}")
+    dates = pd.bdate_range(min(origin, start_date), end_date).strftime('%Y%m%d').to_numpy()
+    keep = dates >= start_date
+    n_days = len(dates)
+
+    frames = []
+    for code in codes:
+        rng = np.random.default_rng([seed, zlib.crc32(str(code).encode('utf-8'))])
+        initial_price = rng.uniform(5.0, 100.0)
+        # 每天的全部随机数按行一起生成，第 i 天用到的随机数只取决于 i，与生成的总天数无关
+        noise = rng.standard_normal(size=(n_days, 5))
+        close = initial_price * np.exp(np.cumsum(0.0002 + 0.02 * noise[:, 0]))
+        open_ = np.concatenate([[initial_price], close[:-1]]) * np.exp(0.005 * noise[:, 1])
+        high = np.maximum(open_, close) * (1 + np.abs(0.01 * noise[:, 2]))
+        low = np.minimum(open_, close) * (1 - np.abs(0.01 * noise[:, 3]))
+        volume = np.round(np.exp(13.0 + 0.5 * noise[:, 4]))
+        frames.append(pd.DataFrame({
+            'date': dates[keep],
+            'code': str(code),
+            'open': open_[keep],
+            'high': high[keep],
+            'low': low[keep],
+            'close': close[keep],
+            'volume': volume[keep]
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=['date', 'code', 'open', 'high', 'low', 'close', 'volume'])
+    return pd.concat(frames, ignore_index=True)
+
+class SyntheticDataFetcher(BaseDataFetcher):
+    """
+    离线合成数据源，生成确定性、可设置随机种子的日线行情，不访问网络，也不写入缓存。
+    用于在隔离环境中对数据集构建、环境和训练做全市场规模的压力测试。
+    """
+    source_name = 'synthetic'
+
+    def __init__(self, country, start_date, end_date, code_list, seed=0, compact=False):
+        """
+        参数:
+            seed (int): 随机种子，相同的种子和股票代码总是生成相同的行情
+            compact (bool): 是否以紧凑格式返回数据
+        """
+        super().__init__(country, start_date, end_date, code_list, compact=compact)
+        self.seed = seed
+
+    def _fetch_day_trade_data(self, code_list, start_date, end_date):
+        codes = [self._to_cache_code(code) for code in code_list]
+        return generate_ohlcv(codes, start_date, end_date, seed=self.seed)
+
+    def get_day_trade_data(self):
+        """直接生成请求的行情，列和类型与真实数据源一致"""
+        logger.info(f"生成 {len(self.code_list)} 只股票 {self.start_date} 到 {self.end_date} 的合成数据")
+        result = self._fetch_day_trade_data(self.code_list, self.start_date, self.end_date)
+        return self._to_output(result[self.columns])
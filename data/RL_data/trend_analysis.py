@@ -4,6 +4,13 @@ from logger.logging_config import logger
 
 class TrendAnalyzer:
     """趋势分析工具类"""
+
+    # 自动阈值：日均涨跌幅的倍数，以及阈值的上下限(%)
+    PCT_THRESHOLD_MULTIPLIER = 2.0
+    PCT_THRESHOLD_RANGE = (1.0, 5.0)
+    # 自动容忍度：价格区间的比例，以及价格区间为0时的缺省值
+    TOLERANCE_RATIO = 0.02
+    DEFAULT_TOLERANCE = 0.1
     
     @staticmethod
     def zigzag_pivots(df, price_col='close', pct_threshold=2.0):
@@ -96,6 +103,151 @@ class TrendAnalyzer:
             logger.error(f"ZigZag分析失败: {str(e)}")
             return []
 
+    @staticmethod
+    def _zigzag_pivot_arrays(prices_2d, thresholds):
+        """
+        批量 ZigZag 的数组实现，按时间列推进、在所有窗口上同时做向量化比较。
+
+        参数:
+            prices_2d (ndarray): 形状为 (窗口数, 窗口长度) 的价格矩阵
+            thresholds (ndarray): 每个窗口的反转阈值(%)，形状为 (窗口数,)
+
+        返回:
+            tuple: (positions, prices, counts)
+                positions/prices 形状为 (窗口数, 窗口长度)，第 k 列为第 k 个枢纽点的位置和价格；
+                counts 为每个窗口的枢纽点个数。枢纽点类型从 L 开始严格交替，第 k 个为 L(k为偶数) 或 H。
+        """
+        prices = np.asarray(prices_2d, dtype=np.float64)
+        if prices.ndim != 2:
+            raise ValueError(f"prices_2d 必须是二维数组，当前维度: {prices.ndim}")
+        n_windows, n_bars = prices.shape
+        thresholds = np.broadcast_to(np.asarray(thresholds, dtype=np.float64), (n_windows,))
+
+        positions = np.zeros((n_windows, max(n_bars, 1)), dtype=np.int64)
+        pivot_prices = np.zeros((n_windows, max(n_bars, 1)), dtype=np.float64)
+        if n_bars == 0:
+            return positions, pivot_prices, np.zeros(n_windows, dtype=np.int64)
+
+        rows = np.arange(n_windows)
+        # 第一个点默认为波谷
+        pivot_prices[:, 0] = prices[:, 0]
+        counts = np.ones(n_windows, dtype=np.int64)
+        last_pivot_price = prices[:, 0].copy()
+        is_high = np.zeros(n_windows, dtype=bool)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in range(1, n_bars):
+                current_price = prices[:, i]
+                price_change = ((current_price - last_pivot_price) / last_pivot_price) * 100
+
+                # 波谷向上超过阈值 / 波峰向下超过阈值：确认新的枢纽点
+                confirm = np.where(is_high, price_change <= -thresholds, price_change >= thresholds)
+                # 继续创新低 / 创新高：更新最后一个枢纽点
+                extend = ~confirm & np.where(is_high, current_price > last_pivot_price,
+                                             current_price < last_pivot_price)
+
+                counts += confirm
+                is_high ^= confirm
+                moved = confirm | extend
+                slot = counts[moved] - 1
+                positions[rows[moved], slot] = i
+                pivot_prices[rows[moved], slot] = current_price[moved]
+                last_pivot_price[moved] = current_price[moved]
+
+        return positions, pivot_prices, counts
+
+    @staticmethod
+    def _zigzag_pivot_snapshots(prices_2d, thresholds, lengths, snapshots):
+        """
+        同时推进多行的 ZigZag，并在指定列记录部分行的枢纽点，用于一次计算同一窗口的多个前缀。
+
+        处理完前 h 列时 ZigZag 的状态与只输入前 h 列时完全相同，因此在第 h 列记录的枢纽点
+        就是对这些行的前 h 列调用 _zigzag_pivot_arrays 的结果。
+
+        参数:
+            prices_2d (ndarray): 形状为 (行数, 列数) 的价格矩阵
+            thresholds (ndarray): 每行的反转阈值(%)
+            lengths (ndarray): 每行需要处理的列数，须按降序排列，超出的列不再计算
+            snapshots (list[tuple]): (h, 行号数组)，处理完前 h 列时记录这些行的枢纽点
+
+        返回:
+            list[tuple]: 与 snapshots 一一对应的 (positions, prices, counts)，positions/prices 形状为 (行数, h)
+        """
+        prices = np.asarray(prices_2d, dtype=np.float64)
+        n_rows, n_bars = prices.shape
+        thresholds = np.broadcast_to(np.asarray(thresholds, dtype=np.float64), (n_rows,))
+        lengths = np.asarray(lengths)
+
+        positions = np.zeros((n_rows, max(n_bars, 1)), dtype=np.int64)
+        pivot_prices = np.zeros((n_rows, max(n_bars, 1)), dtype=np.float64)
+        counts = np.ones(n_rows, dtype=np.int64)
+        if n_bars > 0:
+            pivot_prices[:, 0] = prices[:, 0]
+            last_pivot_price = prices[:, 0].copy()
+        else:
+            last_pivot_price = np.zeros(n_rows)
+        is_high = np.zeros(n_rows, dtype=bool)
+        # 按列推进，转置后每列的价格在内存中连续
+        columns = np.ascontiguousarray(prices.T)
+        # 第 i 列只需要推进前 n_active[i] 行
+        n_active = np.searchsorted(-lengths, -np.arange(max(n_bars, 1)), side='right')
+
+        by_length = {}
+        for k, (h, _) in enumerate(snapshots):
+            by_length.setdefault(h, []).append(k)
+        results = [None] * len(snapshots)
+
+        def take(h):
+            for k in by_length.get(h, []):
+                snapshot_rows = snapshots[k][1]
+                results[k] = (positions[snapshot_rows, :h], pivot_prices[snapshot_rows, :h],
+                              counts[snapshot_rows].copy())
+
+        take(1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in range(1, n_bars):
+                active = n_active[i]
+                current_price = columns[i, :active]
+                last = last_pivot_price[:active]
+                high = is_high[:active]
+                price_change = ((current_price - last) / last) * 100
+
+                confirm = np.where(high, price_change <= -thresholds[:active], price_change >= thresholds[:active])
+                extend = ~confirm & np.where(high, current_price > last, current_price < last)
+
+                counts[:active] += confirm
+                high ^= confirm
+                moved = np.flatnonzero(confirm | extend)
+                slot = counts[moved] - 1
+                positions[moved, slot] = i
+                pivot_prices[moved, slot] = current_price[moved]
+                last[moved] = current_price[moved]
+                take(i + 1)
+
+        return results
+
+    @classmethod
+    def zigzag_pivots_batch(cls, prices_2d, thresholds):
+        """
+        批量版 ZigZag，一次调用计算多个等长窗口的枢纽点，结果与逐窗口调用 zigzag_pivots 一致。
+
+        参数:
+            prices_2d (ndarray): 形状为 (窗口数, 窗口长度) 的价格矩阵
+            thresholds (float | ndarray): 反转阈值(%)，标量或每个窗口一个值
+
+        返回:
+            list[list[dict]]: 每个窗口的枢纽点列表，index 为窗口内的位置(从0开始)
+        """
+        positions, pivot_prices, counts = cls._zigzag_pivot_arrays(prices_2d, thresholds)
+        types = ('L', 'H')
+        return [
+            [
+                {"index": int(positions[w, k]), "price": pivot_prices[w, k], "type": types[k % 2]}
+                for k in range(counts[w])
+            ]
+            for w in range(len(counts))
+        ]
+
     @staticmethod
     def judge_trend(pivots, tolerance=0.5):
         """
@@ -141,6 +293,74 @@ class TrendAnalyzer:
             logger.error(f"趋势判断失败: {str(e)}")
             return "Sideways"
 
+    @staticmethod
+    def auto_pct_threshold(avg_abs_return_percent):
+        """
+        根据日均涨跌幅(绝对值，%)自动设置 ZigZag 反转阈值，支持标量或数组。
+        简单做一个倍数放大，比如2倍日均波动，并限制在[1, 5]之间。
+        """
+        low, high = TrendAnalyzer.PCT_THRESHOLD_RANGE
+        return np.clip(avg_abs_return_percent * TrendAnalyzer.PCT_THRESHOLD_MULTIPLIER, low, high)
+
+    @staticmethod
+    def auto_tolerance(price_min, price_max):
+        """
+        根据价格区间自动设置趋势判断的容忍度，取区间的2% (可根据需求调整)，支持标量或数组。
+        如果价格区间没变化(比如所有价格都一样), 给个缺省值。
+        """
+        price_range = np.asarray(price_max - price_min)
+        tolerance = np.where(price_range == 0, TrendAnalyzer.DEFAULT_TOLERANCE,
+                             price_range * TrendAnalyzer.TOLERANCE_RATIO)
+        return tolerance if tolerance.ndim else tolerance.item()
+
+    @classmethod
+    def params(cls):
+        """自动阈值和容忍度的参数，参数变化时缓存的趋势标签随之失效"""
+        return {
+            'pct_threshold_multiplier': cls.PCT_THRESHOLD_MULTIPLIER,
+            'pct_threshold_range': list(cls.PCT_THRESHOLD_RANGE),
+            'tolerance_ratio': cls.TOLERANCE_RATIO,
+            'default_tolerance': cls.DEFAULT_TOLERANCE
+        }
+
+    @staticmethod
+    def judge_trend_batch(positions, pivot_prices, counts, tolerances):
+        """
+        批量版趋势判断，输入为 _zigzag_pivot_arrays 的结果，规则与 judge_trend 一致。
+
+        参数:
+            positions (ndarray): 枢纽点位置矩阵
+            pivot_prices (ndarray): 枢纽点价格矩阵
+            counts (ndarray): 每个窗口的枢纽点个数
+            tolerances (float | ndarray): 容忍度，标量或每个窗口一个值
+
+        返回:
+            ndarray: 每个窗口的趋势 "Uptrend" / "Downtrend" / "Sideways"
+        """
+        counts = np.asarray(counts)
+        n_windows = len(counts)
+        trends = np.full(n_windows, "Sideways", dtype='<U9')
+        # 枢纽点高低交替，至少4个时最近两个高点和两个低点就是最后4个枢纽点
+        valid = np.flatnonzero(counts >= 4)
+        if len(valid) == 0:
+            return trends
+
+        tolerances = np.broadcast_to(np.asarray(tolerances, dtype=np.float64), (n_windows,))[valid]
+        first = counts[valid] - 4
+        last_four = pivot_prices[valid[:, None], first[:, None] + np.arange(4)]
+        # 最后4个中第一个为低点(序号为偶数)时顺序为 L,H,L,H，否则为 H,L,H,L
+        starts_low = (first % 2 == 0)
+        l1 = np.where(starts_low, last_four[:, 0], last_four[:, 1])
+        h1 = np.where(starts_low, last_four[:, 1], last_four[:, 0])
+        l2 = np.where(starts_low, last_four[:, 2], last_four[:, 3])
+        h2 = np.where(starts_low, last_four[:, 3], last_four[:, 2])
+
+        uptrend = (h2 >= h1 - tolerances) & (l2 > l1 + tolerances)
+        downtrend = ~uptrend & (h1 > h2 + tolerances) & (l1 > l2 + tolerances)
+        trends[valid[uptrend]] = "Uptrend"
+        trends[valid[downtrend]] = "Downtrend"
+        return trends
+
     @classmethod
     def analyze_stock_trend(cls, df, price_col='close'):
         """
@@ -167,23 +387,14 @@ class TrendAnalyzer:
             avg_abs_return_percent = daily_returns.abs().mean() * 100  # 转成百分比
             
             # ========== 3. 自动设置 pct_threshold ==========
-            # 简单做一个倍数放大，比如2倍日均波动，并限制在[1, 5]之间
-            auto_pct_threshold = avg_abs_return_percent * 2.0
-            pct_threshold = min(max(auto_pct_threshold, 1.0), 5.0)
+            pct_threshold = cls.auto_pct_threshold(avg_abs_return_percent)
             
             # ========== 4. 自动设置 tolerance ==========
-            # 根据最近价格区间做一个2%范围 (可根据需求调整)
-            price_min = df[price_col].min()
-            price_max = df[price_col].max()
-            price_range = price_max - price_min
-            
-            # 如果整个数据价格区间没变化(比如所有价格都一样), 给个缺省值
-            if price_range == 0:
-                tolerance = 0.1
-            else:
-                tolerance = price_range * 0.02  # 2%的区间
+            tolerance = cls.auto_tolerance(df[price_col].min(), df[price_col].max())
             
-            logger.info(f"Auto-calculated pct_threshold={pct_threshold:.2f}, tolerance={tolerance:.2f}")
+            # 每个窗口都会调用，限流避免大量日志拖慢构建
+            logger.info("Auto-calculated pct_threshold=%.2f, tolerance=%.2f", pct_threshold, tolerance,
+                        extra={'rate_limit': 1.0})
             
             # ========== 5. 获取ZigZag枢纽点 ==========
             pivots = cls.zigzag_pivots(df, price_col=price_col, pct_threshold=pct_threshold)
@@ -195,4 +406,235 @@ class TrendAnalyzer:
             
         except Exception as e:
             logger.error(f"趋势分析失败: {str(e)}")
-            return "Sideways", []
\ No newline at end of file
+            return "Sideways", []
+
+    @classmethod
+    def analyze_trend_batch(cls, prices_2d, return_pivots=False):
+        """
+        批量分析多个等长窗口的趋势，阈值和容忍度的自动设置与 analyze_stock_trend 一致。
+
+        参数:
+            prices_2d (ndarray): 形状为 (窗口数, 窗口长度) 的价格矩阵
+            return_pivots (bool): 是否同时返回 _zigzag_pivot_arrays 格式的枢纽点
+
+        返回:
+            ndarray: 每个窗口的趋势 "Uptrend" / "Downtrend" / "Sideways"
+            return_pivots 为 True 时返回 (趋势, positions, prices, counts)
+        """
+        prices = np.asarray(prices_2d, dtype=np.float64)
+        if prices.ndim != 2:
+            raise ValueError(f"prices_2d 必须是二维数组，当前维度: {prices.ndim}")
+        n_windows, n_bars = prices.shape
+        if n_windows == 0 or n_bars < 2:
+            trends = np.full(n_windows, "Sideways", dtype='<U9')
+            if return_pivots:
+                return (trends,) + cls._zigzag_pivot_arrays(prices, np.ones(n_windows))
+            return trends
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 日收益率的平均波动(%)，与 pct_change().dropna() 的计算方式一致
+            abs_returns = np.abs(prices[:, 1:] / prices[:, :-1] - 1)
+            n_returns = np.count_nonzero(~np.isnan(abs_returns), axis=1)
+            avg_abs_return_percent = np.nansum(abs_returns, axis=1) / np.maximum(n_returns, 1) * 100
+
+        pct_thresholds = cls.auto_pct_threshold(avg_abs_return_percent)
+        tolerances = cls.auto_tolerance(np.nanmin(prices, axis=1), np.nanmax(prices, axis=1))
+
+        positions, pivot_prices, counts = cls._zigzag_pivot_arrays(prices, pct_thresholds)
+        trends = cls.judge_trend_batch(positions, pivot_prices, counts, tolerances)
+        trends[n_returns < 1] = "Sideways"
+        if return_pivots:
+            return trends, positions, pivot_prices, counts
+        return trends
+
+    @classmethod
+    def analyze_trend_horizons(cls, prices_2d, horizons, return_pivots=False):
+        """
+        一次分析同一批窗口在多个预测期上的趋势，结果与对每个 h 调用
+        analyze_trend_batch(prices_2d[:, :h]) 完全一致。
+
+        日收益率和逐列的最低/最高价只计算一次，各预测期取前缀；
+        同一窗口在两个预测期的反转阈值相同时(阈值经常被限制在上下限)，较短的预测期直接取
+        较长预测期的 ZigZag 推进到第 h 列时的枢纽点，只有阈值不同的窗口才另外计算。
+
+        参数:
+            prices_2d (ndarray): 形状为 (窗口数, 窗口长度) 的价格矩阵
+            horizons (list[int]): 预测期(前缀长度)，每个都在 [2, 窗口长度] 之间
+            return_pivots (bool): 是否同时返回每个预测期 _zigzag_pivot_arrays 格式的枢纽点
+
+        返回:
+            ndarray: 形状为 (窗口数, 预测期数) 的趋势
+            return_pivots 为 True 时返回 (趋势, [每个预测期的 (positions, prices, counts)])
+        """
+        prices = np.asarray(prices_2d, dtype=np.float64)
+        if prices.ndim != 2:
+            raise ValueError(f"prices_2d 必须是二维数组，当前维度: {prices.ndim}")
+        n_windows, n_bars = prices.shape
+        horizons = [int(h) for h in horizons]
+        if not horizons or min(horizons) < 2 or max(horizons) > n_bars:
+            raise ValueError(f"预测期必须在 [2, {n_bars}] 之间: {horizons}")
+
+        trends = np.full((n_windows, len(horizons)), "Sideways", dtype='<U9')
+        if n_windows == 0:
+            pivots = [cls._zigzag_pivot_arrays(prices[:, :h], np.ones(0)) for h in horizons]
+            return (trends, pivots) if return_pivots else trends
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            abs_returns = np.abs(prices[:, 1:] / prices[:, :-1] - 1)
+        valid_returns = ~np.isnan(abs_returns)
+        running_min = np.fmin.accumulate(prices, axis=1)
+        running_max = np.fmax.accumulate(prices, axis=1)
+
+        thresholds = np.empty((n_windows, len(horizons)))
+        tolerances = np.empty((n_windows, len(horizons)))
+        n_returns = np.empty((n_windows, len(horizons)), dtype=np.int64)
+        for j, h in enumerate(horizons):
+            n_returns[:, j] = np.count_nonzero(valid_returns[:, :h - 1], axis=1)
+            avg_abs_return_percent = np.nansum(abs_returns[:, :h - 1], axis=1) / np.maximum(n_returns[:, j], 1) * 100
+            thresholds[:, j] = cls.auto_pct_threshold(avg_abs_return_percent)
+            tolerances[:, j] = cls.auto_tolerance(running_min[:, h - 1], running_max[:, h - 1])
+
+        # 从最长的预测期开始，为阈值与所有更长预测期都不同的窗口新建一次 ZigZag 推进
+        order = sorted(range(len(horizons)), key=lambda j: -horizons[j])
+        run_of = np.empty((n_windows, len(horizons)), dtype=np.int64)
+        run_windows, run_thresholds, run_lengths = [], [], []
+        n_runs = 0
+        for rank, j in enumerate(order):
+            assigned = np.zeros(n_windows, dtype=bool)
+            for k in order[:rank]:
+                match = ~assigned & (thresholds[:, k] == thresholds[:, j])
+                run_of[match, j] = run_of[match, k]
+                assigned |= match
+            new = np.flatnonzero(~assigned)
+            run_of[new, j] = n_runs + np.arange(len(new))
+            n_runs += len(new)
+            run_windows.append(new)
+            run_thresholds.append(thresholds[new, j])
+            run_lengths.append(np.full(len(new), horizons[j]))
+
+        run_windows = np.concatenate(run_windows)
+        pivots = cls._zigzag_pivot_snapshots(
+            prices[run_windows, :max(horizons)], np.concatenate(run_thresholds), np.concatenate(run_lengths),
+            [(h, run_of[:, j]) for j, h in enumerate(horizons)])
+        for j, (positions, pivot_prices, counts) in enumerate(pivots):
+            trends[:, j] = cls.judge_trend_batch(positions, pivot_prices, counts, tolerances[:, j])
+            trends[n_returns[:, j] < 1, j] = "Sideways"
+        if return_pivots:
+            return trends, pivots
+        return trends
+
+class IncrementalTrendAnalyzer:
+    """
+    增量趋势分析器，逐根K线更新 ZigZag 枢纽点和趋势，每次更新为常数时间。
+
+    维护当前枢纽点状态(最后一个枢纽点的价格和类型)以及日收益率、价格区间的累计统计量，
+    不需要每次都重新计算整段历史。
+
+    注意: 未指定 pct_threshold 时，阈值按截至当前K线的波动统计自动计算，
+    因此与 TrendAnalyzer.analyze_stock_trend 在整段数据上算出的固定阈值可能不同；
+    指定 pct_threshold 时，枢纽点与 TrendAnalyzer.zigzag_pivots 的结果完全一致。
+    """
+
+    def __init__(self, price_col='close', pct_threshold=None):
+        """
+        参数:
+            price_col (str): 当传入的K线为字典或Series时，用于识别枢纽点的价格列名
+            pct_threshold (float): 固定反转阈值(%)，为None时根据累计波动自动设置
+        """
+        self.price_col = price_col
+        self.fixed_pct_threshold = pct_threshold
+        self.reset()
+
+    def reset(self):
+        """清空所有状态"""
+        self.pivots = []
+        self.pivot_type = 'L'
+        self.last_pivot_price = None
+        self.last_price = None
+        self.n_bars = 0
+        # 日收益率(绝对值)的累计统计
+        self.abs_return_sum = 0.0
+        self.n_returns = 0
+        # 价格区间
+        self.price_min = None
+        self.price_max = None
+        self.trend = "Sideways"
+
+    @property
+    def pct_threshold(self):
+        """当前使用的反转阈值(%)"""
+        if self.fixed_pct_threshold is not None:
+            return self.fixed_pct_threshold
+        if self.n_returns == 0:
+            return TrendAnalyzer.auto_pct_threshold(0.0)
+        return TrendAnalyzer.auto_pct_threshold(self.abs_return_sum / self.n_returns * 100)
+
+    @property
+    def tolerance(self):
+        """当前使用的趋势判断容忍度"""
+        if self.price_min is None:
+            return TrendAnalyzer.auto_tolerance(0.0, 0.0)
+        return TrendAnalyzer.auto_tolerance(self.price_min, self.price_max)
+
+    def _extract_price(self, bar):
+        """从K线中取出价格，支持数值、字典和Series"""
+        if isinstance(bar, (dict, pd.Series)):
+            return bar[self.price_col]
+        return bar
+
+    def update(self, bar, index=None):
+        """
+        输入一根新的K线，更新枢纽点和趋势。
+
+        参数:
+            bar (float | dict | Series): 新K线的价格，或包含 price_col 的字典/Series
+            index: 该K线的索引，默认为已输入K线的序号(从0开始)
+
+        返回:
+            tuple: (趋势, 枢纽点列表)
+        """
+        price = self._extract_price(bar)
+        if index is None:
+            index = self.n_bars
+
+        # ========== 1. 更新波动统计 ==========
+        if self.last_price is not None:
+            self.abs_return_sum += abs((price - self.last_price) / self.last_price)
+            self.n_returns += 1
+        self.last_price = price
+        self.n_bars += 1
+        self.price_min = price if self.price_min is None else min(self.price_min, price)
+        self.price_max = price if self.price_max is None else max(self.price_max, price)
+
+        # ========== 2. 更新ZigZag枢纽点 ==========
+        if self.last_pivot_price is None:
+            self.last_pivot_price = price
+            self.pivots.append({"index": index, "price": price, "type": self.pivot_type})
+        else:
+            pct_threshold = self.pct_threshold
+            price_change = ((price - self.last_pivot_price) / self.last_pivot_price) * 100
+            if self.pivot_type == 'L':
+                if price_change >= pct_threshold:
+                    self.pivot_type = 'H'
+                    self.pivots.append({"index": index, "price": price, "type": 'H'})
+                    self.last_pivot_price = price
+                elif price < self.last_pivot_price:
+                    self.pivots[-1] = {"index": index, "price": price, "type": 'L'}
+                    self.last_pivot_price = price
+            else:
+                if price_change <= -pct_threshold:
+                    self.pivot_type = 'L'
+                    self.pivots.append({"index": index, "price": price, "type": 'L'})
+                    self.last_pivot_price = price
+                elif price > self.last_pivot_price:
+                    self.pivots[-1] = {"index": index, "price": price, "type": 'H'}
+                    self.last_pivot_price = price
+
+        # ========== 3. 判断趋势 ==========
+        # 枢纽点高低交替，最近两个高点和两个低点一定在最后4个枢纽点中
+        if self.n_returns < 1:
+            self.trend = "Sideways"
+        else:
+            self.trend = TrendAnalyzer.judge_trend(self.pivots[-4:], tolerance=self.tolerance)
+
+        return self.trend, self.pivots
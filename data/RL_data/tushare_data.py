@@ -1,15 +1,38 @@
-import os
 import tushare as ts
 import pandas as pd
-import numpy as np
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from .base_data import BaseDataFetcher, timestampchange
+from .rate_limiter import TokenBucket
 from config.config import ConfigJson
 from logger.logging_config import logger
 
 class TushareDataFetcher(BaseDataFetcher):
-    def __init__(self, country, start_date, end_date, code_list):
-        super().__init__(country, start_date, end_date, code_list)
+    source_name = 'tushare'
+
+    # 默认并发线程数和每分钟调用配额(与 Tushare daily 接口的积分配额对应)
+    max_workers = 8
+    calls_per_minute = 500
+
+    def __init__(self, country, start_date, end_date, code_list,
+                 api=None, max_workers=None, calls_per_minute=None, compact=False):
+        """
+        参数:
+            api: Tushare pro 接口对象，为None时根据配置的 token 创建，测试时可注入替代对象
+            max_workers (int): 并发获取数据的线程数，为1时串行获取
+            calls_per_minute (int): 每分钟最多调用接口的次数
+            compact (bool): 是否以紧凑格式返回数据
+        """
+        super().__init__(country, start_date, end_date, code_list, compact=compact)
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if calls_per_minute is not None:
+            self.calls_per_minute = calls_per_minute
+        self.rate_limiter = TokenBucket(self.calls_per_minute, per=60.0)
+
+        if api is not None:
+            self.api = api
+            return
         config = ConfigJson()
         config.get_account()
         ts.set_token(config.tushare_token)
@@ -48,54 +71,36 @@ class TushareDataFetcher(BaseDataFetcher):
         data['code'] = data['code'].str.replace('.S[HZ]$', '', regex=True)
         return data[['date', 'code', 'open', 'high', 'low', 'close', 'volume']]
 
-    def _handle_cached_data(self, cache_path):
-        """处理缓存数据"""
-        df = pd.read_csv(cache_path, dtype={
-            'date': str,
-            'code': str,
-            'open': np.float64,
-            'high': np.float64,
-            'low': np.float64,
-            'close': np.float64,
-            'volume': np.float64
-        })
-        return df[df['code'].isin(self.code_list)]
+    def _fetch_one(self, code, start_date, end_date):
+        """获取单只股票的日线数据，受限流器控制，出错时返回None"""
+        formatted_code = self._format_stock_code(code)
+        self.rate_limiter.acquire()
+        try:
+            data = self.api.daily(ts_code=formatted_code, 
+                                start_date=start_date, 
+                                end_date=end_date)
+            if data is not None and not data.empty:
+                return data
+            logger.warning(f"No data returned for {formatted_code}", extra={"rate_limit": 1.0})
+        except Exception as e:
+            logger.error(f"Error fetching data for {formatted_code}: {str(e)}")
+            self.failed_codes.add(code)
+        return None
 
-    def get_day_trade_data(self):
-        cache_path = self.get_cache_path("trade_data")
-        if os.path.exists(cache_path):
-            return self._handle_cached_data(cache_path)
-            
-        result = pd.DataFrame()
-        for code in self.code_list:
-            formatted_code = self._format_stock_code(code)
-            try:
-                data = self.api.daily(ts_code=formatted_code, 
-                                    start_date=self.start_date, 
-                                    end_date=self.end_date)
-                if data is not None and not data.empty:
-                    result = pd.concat([result, data])
-                else:
-                    logger.warning(f"No data returned for {formatted_code}")
-            except Exception as e:
-                logger.error(f"Error fetching data for {formatted_code}: {str(e)}")
+    def _fetch_day_trade_data(self, code_list, start_date, end_date):
+        """从 Tushare 并发获取指定股票和日期区间的日线数据，结果收集后一次性合并"""
+        if self.max_workers > 1 and len(code_list) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(code_list))) as executor:
+                frames = list(executor.map(lambda code: self._fetch_one(code, start_date, end_date), code_list))
+        else:
+            frames = [self._fetch_one(code, start_date, end_date) for code in code_list]
+        frames = [frame for frame in frames if frame is not None]
                 
-        if result.empty:
-            logger.warning(f"No data found for period {self.start_date} to {self.end_date}")
-            return pd.DataFrame(columns=['date', 'code', 'open', 'high', 'low', 'close', 'volume'])
+        if not frames:
+            logger.info(f"No data found for period {start_date} to {end_date}")
+            return pd.DataFrame(columns=self.columns)
             
-        result = self._process_result(result)
+        result = self._process_result(pd.concat(frames, ignore_index=True))
         
         # 保存前确保数据类型正确
-        result = result.astype({
-            'date': str,
-            'code': str,
-            'open': np.float64,
-            'high': np.float64,
-            'low': np.float64,
-            'close': np.float64,
-            'volume': np.float64
-        })
-        
-        result.to_csv(cache_path, index=False)
-        return result 
\ No newline at end of file
+        return result.astype(self.dtypes)
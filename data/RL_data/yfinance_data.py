@@ -1,28 +1,106 @@
-import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
+from yfinance import shared as yf_shared
 import pandas as pd
-import numpy as np
 from datetime import datetime
 from .base_data import BaseDataFetcher, timestampchange
+from .market_cache import shift_date
 from logger.logging_config import logger
 
+# yfinance 对区间内没有行情的股票记录的错误信息，这类股票不算下载失败
+NO_DATA_MESSAGES = ('no data found', 'no price data found')
+
+# yf.download 把结果和错误记录在模块级的全局变量中，并发调用会互相覆盖
+_download_lock = threading.Lock()
+
+class YFinanceDownloadError(Exception):
+    """yf.download 记录了下载失败的股票"""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"yfinance 下载失败: {errors}")
+
+def _download_errors(tickers):
+    """返回本次下载中真正失败的股票及错误信息，没有行情的股票不计入"""
+    recorded = getattr(yf_shared, '_ERRORS', {})
+    errors = {}
+    for ticker in tickers:
+        message = recorded.get(ticker.upper(), recorded.get(ticker))
+        if message is not None and not any(text in str(message).lower() for text in NO_DATA_MESSAGES):
+            errors[ticker] = message
+    return errors
+
+def yfinance_transport(tickers, start, end):
+    """
+    默认的数据传输层，使用yfinance的批量下载功能。
+    yf.download 不会因为单只股票失败而抛出异常，只把错误记录在 yfinance.shared._ERRORS 中，
+    这里检查本次请求的股票：单只请求失败时抛出 YFinanceDownloadError，
+    批量请求中失败的股票从结果中去掉，由调用方逐只重试。
+
+    参数:
+        tickers (list): 股票代码列表
+        start (str): 开始日期，格式YYYY-MM-DD
+        end (str): 结束日期(不包含)，格式YYYY-MM-DD
+
+    返回:
+        DataFrame: 按股票代码分组的多级列数据
+    """
+    with _download_lock:
+        data = yf.download(
+            tickers,
+            start=start,
+            end=end,
+            progress=False,
+            group_by='ticker'
+        )
+        errors = _download_errors(tickers)
+    if errors:
+        if len(tickers) == 1:
+            raise YFinanceDownloadError(errors)
+        if isinstance(data.columns, pd.MultiIndex):
+            data = data.drop(columns=list(errors), level=0, errors='ignore')
+    return data
+
 class YFinanceDataFetcher(BaseDataFetcher):
-    def __init__(self, country, start_date, end_date, code_list):
-        super().__init__(country, start_date, end_date, code_list)
-        yf.pdr_override()
+    source_name = 'yfinance'
+
+    def __init__(self, country, start_date, end_date, code_list,
+                 transport=None, chunk_size=50, max_concurrency=4, retries=2, retry_delay=1.0,
+                 compact=False):
+        """
+        参数:
+            transport (callable): 数据传输层，签名同 yfinance_transport，测试时可注入本地数据
+            chunk_size (int): 每次批量下载的股票数量
+            max_concurrency (int): 同时进行的下载请求数
+            retries (int): 批量下载失败或缺失的股票逐只重试的次数
+            retry_delay (float): 重试前等待的秒数，按重试次数递增
+            compact (bool): 是否以紧凑格式返回数据
+        """
+        super().__init__(country, start_date, end_date, code_list, compact=compact)
+        if transport is None:
+            yf.pdr_override()
+            transport = yfinance_transport
+        self.transport = transport
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.retry_delay = retry_delay
 
     def _format_date(self, date_str):
         """将YYYYMMDD格式转换为YYYY-MM-DD格式"""
         return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
 
-    def _process_result(self, data):
+    def _process_result(self, data, code_list=None):
         """处理返回的数据"""
         if data.empty:
             return data
+        if code_list is None:
+            code_list = self.code_list
             
         # 重置索引并添加代码列
         processed_data = []
-        for code in self.code_list:
+        for code in code_list:
             if code in data:
                 df = data[code].reset_index()
                 df['Date'] = df['Date'].dt.strftime('%Y%m%d')
@@ -35,6 +113,8 @@ class YFinanceDataFetcher(BaseDataFetcher):
                     'Close': 'close',
                     'Volume': 'volume'
                 })
+                # 批量下载时失败的股票对应的行全部为空值
+                df = df.dropna(subset=['open', 'high', 'low', 'close'], how='all')
                 processed_data.append(df[['date', 'code', 'open', 'high', 'low', 'close', 'volume']])
         
         if not processed_data:
@@ -42,59 +122,89 @@ class YFinanceDataFetcher(BaseDataFetcher):
             
         return pd.concat(processed_data, ignore_index=True)
 
-    def _handle_cached_data(self, cache_path):
-        """处理缓存数据"""
-        df = pd.read_csv(cache_path, dtype={
-            'date': str,
-            'code': str,
-            'open': np.float64,
-            'high': np.float64,
-            'low': np.float64,
-            'close': np.float64,
-            'volume': np.float64
-        })
-        return df[df['code'].isin(self.code_list)]
+    async def _download(self, semaphore, tickers, start_date, end_date):
+        """在线程中调用传输层下载一批股票，返回处理后的数据"""
+        async with semaphore:
+            # yfinance 的 end 参数不包含当天，因此向后顺延一天
+            data = await asyncio.to_thread(
+                self.transport, tickers, self._format_date(start_date),
+                self._format_date(shift_date(end_date, 1)))
+        if data is None or data.empty:
+            return pd.DataFrame(columns=self.columns)
+        if not isinstance(data.columns, pd.MultiIndex):
+            # 如果只有一个股票，需要特殊处理
+            data = pd.concat({tickers[0]: data}, axis=1)
+        return self._process_result(data, tickers).astype(self.dtypes)
+
+    async def _download_chunk(self, semaphore, chunk, start_date, end_date, on_chunk):
+        """
+        下载一批股票，批量下载失败或缺失的股票逐只重试，失败只影响该股票。
+        只有抛出异常才算失败；单只下载返回空数据说明该区间没有行情(如节假日、未上市或已退市)，
+        不再重试，照常记为已缓存。
+        """
+        try:
+            result = await self._download(semaphore, chunk, start_date, end_date)
+        except Exception as e:
+            logger.warning(f"批量下载 {len(chunk)} 只股票失败，改为逐只重试: {str(e)}")
+            result = pd.DataFrame(columns=self.columns)
+        frames = [result]
+        fetched = set(result['code'])
+        pending = [code for code in chunk if code not in fetched]
+
+        for attempt in range(1, self.retries + 1):
+            if not pending:
+                break
+            await asyncio.sleep(self.retry_delay * attempt)
+            retry_results = await asyncio.gather(
+                *(self._download(semaphore, [code], start_date, end_date) for code in pending),
+                return_exceptions=True)
+            still_pending = []
+            for code, retry_result in zip(pending, retry_results):
+                if isinstance(retry_result, Exception):
+                    still_pending.append(code)
+                elif not retry_result.empty:
+                    frames.append(retry_result)
+            pending = still_pending
+
+        if pending:
+            logger.error(f"Error fetching data for {pending}")
+            self.failed_codes.update(pending)
+        result = pd.concat(frames, ignore_index=True)
+        if on_chunk is not None:
+            on_chunk(result, [code for code in chunk if code not in pending], start_date, end_date)
+        return result
+
+    async def _download_all(self, code_list, start_date, end_date, on_chunk=None):
+        """把股票分成多批，以有限的并发数同时下载"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        chunks = [code_list[i:i + self.chunk_size] for i in range(0, len(code_list), self.chunk_size)]
+        results = await asyncio.gather(
+            *(self._download_chunk(semaphore, chunk, start_date, end_date, on_chunk) for chunk in chunks))
+        return pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=self.columns)
+
+    def _fetch_day_trade_data(self, code_list, start_date, end_date, on_chunk=None):
+        """
+        从 YFinance 获取指定股票和日期区间的日线数据。
+
+        参数:
+            on_chunk (callable): 每批股票下载完成后的回调，参数为 (数据, 成功的股票, 开始日期, 结束日期)
+        """
+        coro = self._download_all(code_list, start_date, end_date, on_chunk)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        # 在已有事件循环中(如 Jupyter)不能调用 asyncio.run，改在单独的线程中运行
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
+
+    def _fetch_and_cache(self, code_list, start_date, end_date):
+        """每批股票下载完成后立即写入缓存，中途失败时已完成的批次不会丢失"""
+        self._fetch_day_trade_data(code_list, start_date, end_date, on_chunk=self.save_to_cache)
 
     def get_day_trade_data(self):
-        cache_path = self.get_cache_path("trade_data")
-        if os.path.exists(cache_path):
-            return self._handle_cached_data(cache_path)
-            
         try:
-            # 使用yfinance的批量下载功能
-            data = yf.download(
-                self.code_list,
-                start=self._format_date(self.start_date),
-                end=self._format_date(self.end_date),
-                progress=False,
-                group_by='ticker'
-            )
-            
-            if isinstance(data, pd.DataFrame) and not data.empty:
-                # 如果只有一个股票，需要特殊处理
-                if len(self.code_list) == 1:
-                    data = pd.concat({self.code_list[0]: data}, axis=1)
-            
-            if data.empty:
-                logger.warning(f"No data found for period {self.start_date} to {self.end_date}")
-                return pd.DataFrame(columns=['date', 'code', 'open', 'high', 'low', 'close', 'volume'])
-                
-            result = self._process_result(data)
-            
-            # 保存前确保数据类型正确
-            result = result.astype({
-                'date': str,
-                'code': str,
-                'open': np.float64,
-                'high': np.float64,
-                'low': np.float64,
-                'close': np.float64,
-                'volume': np.float64
-            })
-            
-            result.to_csv(cache_path, index=False)
-            return result
-            
+            return super().get_day_trade_data()
         except Exception as e:
             logger.error(f"Error fetching data: {str(e)}")
-            return pd.DataFrame(columns=['date', 'code', 'open', 'high', 'low', 'close', 'volume']) 
\ No newline at end of file
+            return pd.DataFrame(columns=self.columns)
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from logger.logging_config import logger
+
+# 设置为1时在导入时开启 tracemalloc，记录每个阶段的峰值内存
+TRACE_MEMORY_ENV = 'FSLLM_TRACE_MEMORY'
+
+def _escape_label(value):
+    """转义 Prometheus 标签值中的反斜杠、双引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Span:
+    """一次阶段运行的记录：耗时、处理量和峰值内存"""
+
+    def __init__(self, stage, labels, items=None, unit='rows'):
+        self.stage = stage
+        self.labels = labels
+        self.items = items
+        self.unit = unit
+        self.seconds = None
+        # 阶段内相对开始时的内存峰值(字节)，未开启 tracemalloc 时为 None
+        self.peak_memory = None
+        self._start_time = None
+        self._start_memory = 0
+        self._child_peak = 0
+
+    def add_items(self, count):
+        """累加处理量，可以在阶段结束前多次调用"""
+        self.items = (self.items or 0) + int(count)
+
+    @property
+    def throughput(self):
+        """每秒处理量"""
+        if not self.items or not self.seconds:
+            return None
+        return self.items / self.seconds
+
+class Instrumentation:
+    """
+    阶段耗时、吞吐量和内存的统计。
+
+    用 span 包裹一个阶段，同一阶段(名称+标签)的多次运行累加在一起：
+        with instrumentation.span('fetch', source='baostock') as s:
+            ...
+            s.add_items(len(df))
+
+    统计结果可以通过 stats() 读取，也可以导出为 Prometheus 文本格式或汇总表。
+    只有 tracemalloc 开启时才记录峰值内存，嵌套的阶段各自记录自己的峰值。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # {(阶段, 标签): 累计统计}
+        self._stats = {}
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @staticmethod
+    def start_memory_tracing():
+        """开启 tracemalloc，之后的阶段会记录峰值内存(会明显降低运行速度)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def span(self, stage, items=None, unit='rows', **labels):
+        """
+        记录一个阶段。
+
+        参数:
+            stage (str): 阶段名称
+            items (int): 处理量，也可以在阶段内通过 add_items 累加
+            unit (str): 处理量的单位，如 rows/samples/steps
+            **labels: 区分同名阶段的标签，如 source='baostock'
+        """
+        span = Span(stage, tuple(sorted((key, str(value)) for key, value in labels.items())), items, unit)
+        stack = self._stack()
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # 外层阶段此前的峰值先保存下来，再重置峰值统计本阶段
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+            tracemalloc.reset_peak()
+            span._start_memory = current
+        stack.append(span)
+        span._start_time = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - span._start_time
+            stack.pop()
+            if tracing and tracemalloc.is_tracing():
+                _, peak = tracemalloc.get_traced_memory()
+                absolute_peak = max(peak, span._child_peak)
+                span.peak_memory = max(absolute_peak - span._start_memory, 0)
+                if stack:
+                    stack[-1]._child_peak = max(stack[-1]._child_peak, absolute_peak)
+            self._record(span)
+
+    def _record(self, span):
+        with self._lock:
+            stats = self._stats.setdefault((span.stage, span.labels), {
+                'stage': span.stage,
+                'labels': dict(span.labels),
+                'unit': span.unit,
+                'calls': 0,
+                'seconds': 0.0,
+                'items': 0,
+                'peak_memory': None
+            })
+            stats['calls'] += 1
+            stats['seconds'] += span.seconds
+            stats['items'] += span.items or 0
+            if span.peak_memory is not None:
+                stats['peak_memory'] = max(stats['peak_memory'] or 0, span.peak_memory)
+
+    def stats(self):
+        """
+        获取各阶段的累计统计。
+
+        返回:
+            list[dict]: 按首次运行顺序排列，包含 stage、labels、unit、calls、seconds、items、
+                throughput(每秒处理量)、peak_memory(字节，未记录时为 None)
+        """
+        with self._lock:
+            result = [dict(stats, labels=dict(stats['labels'])) for stats in self._stats.values()]
+        for stats in result:
+            stats['throughput'] = stats['items'] / stats['seconds'] if stats['items'] and stats['seconds'] else None
+        return result
+
+    def reset(self):
+        """清空已记录的统计"""
+        with self._lock:
+            self._stats.clear()
+
+    def prometheus_text(self, prefix='fsllm_stage'):
+        """导出为 Prometheus 文本格式"""
+        metrics = [
+            ('seconds_total', 'counter', '阶段累计耗时(秒)', 'seconds'),
+            ('calls_total', 'counter', '阶段运行次数', 'calls'),
+            ('items_total', 'counter', '阶段累计处理量', 'items'),
+            ('peak_memory_bytes', 'gauge', '阶段内存峰值(字节)', 'peak_memory'),
+        ]
+        all_stats = self.stats()
+        lines = []
+        for suffix, metric_type, help_text, key in metrics:
+            name = f'{prefix}_{suffix}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for stats in all_stats:
+                if stats[key] is None:
+                    continue
+                labels = dict(stats['labels'], stage=stats['stage'], unit=stats['unit'])
+                label_text = ','.join(f'{label}="{_escape_label(value)}"' for label, value in sorted(labels.items()))
+                lines.append(f'{name}{{{label_text}}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def summary_table(self):
+        """生成各阶段的汇总表"""
+        headers = ['stage', 'labels', 'calls', 'seconds', 'items', 'throughput', 'peak_mb']
+        rows = []
+        for stats in self.stats():
+            rows.append([
+                stats['stage'],
+                ','.join(f'{key}={value}' for key, value in stats['labels'].items()),
+                str(stats['calls']),
+                f"{stats['seconds']:.3f}",
+                f"{stats['items']} {stats['unit']}" if stats['items'] else '-',
+                f"{stats['throughput']:.1f}/s" if stats['throughput'] else '-',
+                f"{stats['peak_memory'] / 1024 / 1024:.1f}" if stats['peak_memory'] is not None else '-'
+            ])
+        widths = [max(len(row[i]) for row in [headers] + rows) for i in range(len(headers))]
+        lines = ['  '.join(cell.ljust(width) for cell, width in zip(row, widths)) for row in [headers] + rows]
+        lines.insert(1, '  '.join('-' * width for width in widths))
+        return '\n'.join(lines)
+
+    def log_summary(self):
+        """把汇总表写入日志"""
+        if self._stats:
+            logger.info('阶段统计:\n' + self.summary_table())
+
+instrumentation = Instrumentation()
+span = instrumentation.span
+
+if os.environ.get(TRACE_MEMORY_ENV) == '1':
+    Instrumentation.start_memory_tracing()
@@ -1,9 +1,85 @@
+import atexit
 import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import util
 import colorlog
 import datetime
 import os
 
+# 日志文件路径的环境变量。第一次初始化时写入，之后的子进程(包括 spawn 方式启动的进程)都写入同一个文件
+LOG_FILE_ENV = 'FSLLM_LOG_FILE'
+
+class RateLimitFilter(logging.Filter):
+    """
+    按调用位置(文件名+行号)对高频日志限流和采样，在日志进入队列之前丢弃，不产生格式化和 I/O 开销。
+
+    通过 extra 参数为单条日志调用指定规则：
+        logger.info('...', extra={'rate_limit': 1.0})   # 同一位置每秒最多输出一条
+        logger.info('...', extra={'sample_every': 100}) # 同一位置每100条输出一条
+    被省略的条数会附加在该位置下一条输出的日志后面。没有指定规则的日志不受影响。
+    """
+
+    def __init__(self, clock=time.monotonic):
+        super().__init__()
+        self.clock = clock
+        self._lock = threading.Lock()
+        # {(文件路径, 行号): [调用次数, 上次输出的时间, 已省略的条数]}
+        self._sites = {}
+
+    def filter(self, record):
+        interval = getattr(record, 'rate_limit', None)
+        every = getattr(record, 'sample_every', None)
+        if interval is None and every is None:
+            return True
+
+        with self._lock:
+            site = self._sites.setdefault((record.pathname, record.lineno), [0, None, 0])
+            site[0] += 1
+            if every is not None and (site[0] - 1) % every != 0:
+                site[2] += 1
+                return False
+            if interval is not None:
+                now = self.clock()
+                if site[1] is not None and now - site[1] < interval:
+                    site[2] += 1
+                    return False
+                site[1] = now
+            suppressed, site[2] = site[2], 0
+
+        if suppressed:
+            record.msg = f"{record.getMessage()} (该位置已省略 {suppressed} 条)"
+            record.args = ()
+        return True
+
 class Logging(object):
+    # 当前的队列监听线程，日志的格式化输出和写文件都在这个线程中完成
+    listener = None
+    level = 'INFO'
+
+    @staticmethod
+    def log_file_path():
+        """获取日志文件路径：优先使用环境变量，否则新建一个带时间戳的文件并写入环境变量"""
+        log_path = os.environ.get(LOG_FILE_ENV)
+        if log_path:
+            return log_path
+        log_folder_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logfiles")
+        file_name = datetime.datetime.now().strftime('%Y%m%d_%H%M%S') + ".logger"
+        log_path = os.path.join(log_folder_path, file_name)
+        os.environ[LOG_FILE_ENV] = log_path
+        return log_path
+
+    @classmethod
+    def stop_listener(cls):
+        """停止监听线程：处理完队列中剩余的日志后关闭输出处理器"""
+        if cls.listener is None:
+            return
+        cls.listener.stop()
+        for handler in cls.listener.handlers:
+            handler.close()
+        cls.listener = None
 
     def log(self, level='INFO'):  # 生成日志的主方法,传入对那些级别及以上的日志进行处理
 
@@ -16,20 +92,15 @@ class Logging(object):
         }
 
         logger = logging.getLogger()  # 创建日志器
-        # levle = getattr(logging, level)  # 获取日志模块的的级别对象属性
         logger.setLevel(level)  # 设置日志级别
-        # console_handler.setLevel(logging.DEBUG)
-        # file_handler.setLevel(logging.INFO)
+        Logging.level = level
         # Remove all existing handlers
         for handler in logger.handlers[:]:
             logger.removeHandler(handler)
+        Logging.stop_listener()
 
-        log_folder_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logfiles")
-
-        if not os.path.exists(log_folder_path):
-            os.makedirs(log_folder_path)
-        file_name = datetime.datetime.now().strftime('%Y%m%d_%H%M%S') + ".logger"
-        log_path = os.path.join(log_folder_path, file_name)
+        log_path = self.log_file_path()
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
         sh = logging.StreamHandler()  # 创建控制台日志处理器
         fh = logging.FileHandler(filename=log_path, mode='a', encoding="utf-8")  # 创建日志文件处理器
         # 创建格式器
@@ -44,11 +115,51 @@ class Logging(object):
         # 给处理器添加格式
         sh.setFormatter(fmt=sh_fmt)
         fh.setFormatter(fmt=fmt)
-        # 给日志器添加处理器，过滤器一般在工作中用的比较少，如果需要精确过滤，可以使用过滤器
-        logger.addHandler(sh)
-        logger.addHandler(fh)
-        # if not logger.handlers:  # 作用,防止重新生成处理器
+
+        # 日志器只把记录放入队列，控制台和文件输出由监听线程完成，不阻塞调用方
+        log_queue = queue.SimpleQueue()
+        qh = QueueHandler(log_queue)
+        qh.addFilter(RateLimitFilter())
+        logger.addHandler(qh)
+        Logging.listener = QueueListener(log_queue, sh, fh, respect_handler_level=True)
+        Logging.listener.start()
 
         return logger  # 返回日志器
 
-logger = Logging().log()
\ No newline at end of file
+def _acquire_handlers():
+    """
+    fork 前等待监听线程写完当前这条日志。输出流内部的锁在子进程中不会重新初始化，
+    如果 fork 时监听线程正在写入，子进程关闭继承的处理器时会永远阻塞。
+    """
+    if Logging.listener is not None:
+        for handler in Logging.listener.handlers:
+            handler.acquire()
+
+def _release_handlers():
+    """父进程中 fork 完成后释放处理器，子进程中的处理器锁由 logging 重新初始化"""
+    if Logging.listener is not None:
+        for handler in reversed(Logging.listener.handlers):
+            handler.release()
+
+def _restart_in_child():
+    """fork 出的子进程中没有监听线程，重新初始化，继续写入同一个日志文件"""
+    if Logging.listener is not None:
+        Logging().log(Logging.level)
+
+def _stop_at_child_exit(_):
+    """
+    multiprocessing 以 fork 方式启动的子进程(如进程池的工作进程)通过 os._exit 退出，不执行 atexit，
+    退出前由 Finalize 停止监听线程，输出队列中剩余的日志。
+    子进程启动时会清空继承的 Finalize，因此在 multiprocessing 的 after-fork 回调中注册。
+    """
+    if Logging.listener is not None:
+        # 优先级低于其他清理(如 Baostock 登出)，最后停止，清理过程中的日志也能输出
+        util.Finalize(None, Logging.stop_listener, exitpriority=0)
+
+atexit.register(Logging.stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_acquire_handlers, after_in_parent=_release_handlers,
+                        after_in_child=_restart_in_child)
+    util.register_after_fork(Logging, _stop_at_child_exit)
+
+logger = Logging().log()
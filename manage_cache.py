@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from datetime import datetime
+from config.config import ConfigJson, parse_size
+from data.RL_data.cache_manager import (
+    DATASET_CACHE_DIR, default_market_cache_root, market_cache_usage, find_datasets,
+    evict_market_cache, evict_datasets
+)
+
+def validate_size(size_str):
+    try:
+        return parse_size(size_str)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def format_bytes(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M') if timestamp else '-'
+
+def show_usage(args):
+    market = market_cache_usage(args.market_root)
+    print(f'行情缓存 {args.market_root}:')
+    for item in market:
+        print(f"  {item['source']}/{item['country']}: {item['entries']} 个分区, {item['files']} 个文件, "
+              f"{format_bytes(item['bytes'])}, 最早访问 {format_time(item['oldest_access'])}")
+    print(f"  合计: {format_bytes(sum(item['bytes'] for item in market))}")
+
+    datasets = find_datasets(args.dataset_root)
+    print(f'数据集 {args.dataset_root}:')
+    for item in datasets:
+        print(f"  {item['path']}: {format_bytes(item['bytes'])}, 最近访问 {format_time(item['accessed_at'])}")
+    print(f"  合计: {format_bytes(sum(item['bytes'] for item in datasets))}")
+
+def evict(args):
+    budgets = ConfigJson().get_cache_budgets()
+    prefix = '将' if args.dry_run else '已'
+    if args.target in ('market', 'all'):
+        # 命令行参数优先，未指定时使用环境变量中配置的预算
+        max_bytes = args.max_bytes if args.max_bytes is not None else budgets['market']['max_bytes']
+        max_age_days = args.max_age_days if args.max_age_days is not None else budgets['market']['max_age_days']
+        result = evict_market_cache(args.market_root, max_bytes, max_age_days, dry_run=args.dry_run)
+        print(f"行情缓存: {prefix}淘汰 {result['entries']} 个分区, 释放 {format_bytes(result['bytes'])}")
+    if args.target in ('dataset', 'all'):
+        max_bytes = args.max_bytes if args.max_bytes is not None else budgets['dataset']['max_bytes']
+        max_age_days = args.max_age_days if args.max_age_days is not None else budgets['dataset']['max_age_days']
+        result = evict_datasets(args.dataset_root, max_bytes, max_age_days, dry_run=args.dry_run)
+        print(f"数据集: {prefix}淘汰 {result['datasets']} 个数据集, 释放 {format_bytes(result['bytes'])}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='行情缓存和数据集目录管理工具')
+    parser.add_argument('--market-root', type=str, default=default_market_cache_root(),
+                      help='行情缓存根目录，默认为 data/cachedata')
+    parser.add_argument('--dataset-root', type=str, default=DATASET_CACHE_DIR,
+                      help='数据集目录，默认为 cachedataset')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('usage', help='查看缓存用量')
+
+    evict_parser = subparsers.add_parser('evict', help='按容量和未访问时间淘汰缓存')
+    evict_parser.add_argument('--target', type=str, default='all',
+                      choices=['market', 'dataset', 'all'],
+                      help='淘汰的目录: market(行情缓存)/dataset(数据集)/all')
+    evict_parser.add_argument('--max-bytes', type=validate_size, default=None,
+                      help='容量上限，如 500M、20G，默认使用 FSLLM_*_CACHE_MAX_BYTES 环境变量')
+    evict_parser.add_argument('--max-age-days', type=float, default=None,
+                      help='最长未访问天数，默认使用 FSLLM_*_CACHE_MAX_AGE_DAYS 环境变量')
+    evict_parser.add_argument('--dry-run', action='store_true',
+                      help='只显示将要淘汰的内容，不删除')
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'usage':
+            show_usage(args)
+        else:
+            evict(args)
+    except Exception as e:
+        print(f'错误: {str(e)}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Sampler, DataLoader
+from data.RL_data.dataset_store import ShardedArray, load_dataset
+
+class TrendDataset(Dataset):
+    """
+    DatasetBuilder 构建结果的 PyTorch 数据集，可以包装内存中的数组，也可以包装磁盘上的分片数据集。
+
+    按批取样本：索引为整数时返回单个样本，为整数数组、列表或切片时一次取出整批，
+    只做一次花式索引和一次类型转换，不逐个样本调用 Python。
+    连续且不跨分片的一批样本直接是内存映射的视图，torch.from_numpy 不复制数据；
+    特征已是目标类型(如紧凑格式或特征缓存构建的 float32)时也不做类型转换。
+    配合 ShardBatchSampler 和 make_data_loader 使用，DataLoader 的每个任务就是一整批。
+    """
+
+    def __init__(self, X, y, dtype=np.float32):
+        """
+        参数:
+            X (ndarray | ShardedArray): 样本特征
+            y (ndarray | ShardedArray): 样本标签
+            dtype: 返回的特征类型，默认 float32，为 None 时保持原类型
+        """
+        if len(X) != len(y):
+            raise ValueError(f"X 和 y 的样本数不一致: {len(X)} != {len(y)}")
+        self.X = X
+        self.y = y
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+
+    @classmethod
+    def from_dataset(cls, dataset, split='train', dtype=np.float32):
+        """
+        从 build()/build_streaming() 返回的数据集或 build_samples() 返回的样本创建。
+
+        参数:
+            dataset (dict): {'train': {'X', 'y'}, 'val': {...}} 或 {'X', 'y', ...}
+            split (str): dataset 包含训练集和验证集时使用哪个集合
+        """
+        arrays = dataset[split] if split in dataset else dataset
+        return cls(arrays['X'], arrays['y'], dtype)
+
+    @classmethod
+    def from_directory(cls, dataset_dir, split='train', dtype=np.float32):
+        """
+        以写时复制的内存映射打开磁盘上的分片数据集，分片数组可写，torch 张量可以直接共享内存。
+        对张量的原地修改不会写回文件，但本进程之后读到的同一样本也会是修改后的值。
+        """
+        dataset, _ = load_dataset(dataset_dir, mmap_mode='c')
+        return cls.from_dataset(dataset, split, dtype)
+
+    def __len__(self):
+        return len(self.y)
+
+    def shard_sizes(self):
+        """每个分片的样本数，内存中的数组视为一个分片"""
+        if isinstance(self.X, ShardedArray):
+            return [shard['rows'] for shard in self.X.shards]
+        return [len(self)]
+
+    def _to_tensor(self, array, dtype=None):
+        array = np.asarray(array)
+        if dtype is not None:
+            array = array.astype(dtype, copy=False)
+        if not array.flags.writeable:
+            # 只读的内存映射不能安全地共享给张量
+            array = array.copy()
+        return torch.from_numpy(array)
+
+    def __getitem__(self, index):
+        """
+        参数:
+            index (int | slice | list | ndarray): 单个样本或一批样本的位置
+
+        返回:
+            tuple: (特征张量, 标签张量)
+        """
+        if isinstance(index, list):
+            index = np.asarray(index, dtype=np.int64)
+        if isinstance(index, np.ndarray) and index.ndim == 1 and len(index) > 0 and \
+                index[-1] - index[0] + 1 == len(index) and (np.diff(index) == 1).all():
+            # 连续的位置改用切片，不跨分片时得到视图而不是副本
+            index = slice(int(index[0]), int(index[-1]) + 1)
+        return self._to_tensor(self.X[index], self.dtype), self._to_tensor(self.y[index])
+
+class ShardBatchSampler(Sampler):
+    """
+    按分片组织批次的批采样器，每次产生一批样本位置。
+
+    每个批次只包含同一个分片中的样本，批内位置升序排列，读取时按顺序访问同一个内存映射文件。
+    打乱时先打乱分片内的样本再打乱批次顺序，随机数只由 seed 和 epoch 决定，
+    因此与 DataLoader 的工作进程数无关，可以复现。采样在主进程中进行，工作进程只按批取数据。
+    """
+
+    def __init__(self, shard_sizes, batch_size, shuffle=True, drop_last=False, seed=0):
+        """
+        参数:
+            shard_sizes (list[int] | TrendDataset): 每个分片的样本数，或直接传入数据集
+            batch_size (int): 批大小
+            shuffle (bool): 是否打乱
+            drop_last (bool): 是否丢弃每个分片最后不满一批的样本
+            seed (int): 随机种子
+        """
+        if isinstance(shard_sizes, TrendDataset):
+            shard_sizes = shard_sizes.shard_sizes()
+        if batch_size < 1:
+            raise ValueError(f"batch_size 必须为正整数: {batch_size}")
+        self.shard_sizes = [int(size) for size in shard_sizes]
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        """每个 epoch 开始前调用，使各 epoch 的顺序不同"""
+        self.epoch = epoch
+
+    def batches(self):
+        """本 epoch 的全部批次"""
+        rng = np.random.default_rng([self.seed, self.epoch])
+        batches = []
+        offset = 0
+        for size in self.shard_sizes:
+            rows = offset + (rng.permutation(size) if self.shuffle else np.arange(size))
+            stop = size - size % self.batch_size if self.drop_last else size
+            batches.extend(np.sort(rows[begin:begin + self.batch_size]) for begin in range(0, stop, self.batch_size))
+            offset += size
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield batch.tolist()
+
+    def __len__(self):
+        if self.drop_last:
+            return sum(size // self.batch_size for size in self.shard_sizes)
+        return sum(-(-size // self.batch_size) for size in self.shard_sizes)
+
+def make_data_loader(dataset, batch_size, shuffle=True, drop_last=False, seed=0, num_workers=0, **kwargs):
+    """
+    创建按批取数据的 DataLoader：ShardBatchSampler 作为采样器，batch_size=None 关闭逐样本合并，
+    每个工作进程一次取出一整批。工作进程中的分片数组会重新打开内存映射。
+
+    参数:
+        dataset (TrendDataset): 数据集
+        kwargs: 传给 DataLoader 的其他参数，如 pin_memory、persistent_workers
+
+    返回:
+        DataLoader: 每次迭代返回 (特征张量, 标签张量)，每个 epoch 前可以调用 loader.sampler.set_epoch(epoch)
+    """
+    sampler = ShardBatchSampler(dataset, batch_size, shuffle=shuffle, drop_last=drop_last, seed=seed)
+    return DataLoader(dataset, sampler=sampler, batch_size=None, num_workers=num_workers, **kwargs)
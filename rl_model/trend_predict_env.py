@@ -2,20 +2,24 @@ import gym
 import numpy as np
 from gym import spaces
 from data.RL_data.build_dataset import DatasetBuilder
+from data.RL_data.dataset_store import load_dataset
+from data.RL_data.label_cache import LabelCache
+from logger.instrumentation import span
 from logger.logging_config import logger
 
-class TrendPredictEnv(gym.Env):
+def open_trend_dataset(market='zh', source='baostock', codes=None,
+                       start_date=None, end_date=None, dataset_dir=None, feature_store=None):
     """
-    股票趋势预测环境
-    观察空间：60天的历史收盘价数据
-    动作空间：0(下跌)、1(震荡)、2(上涨)
+    打开趋势预测数据集。未指定 dataset_dir 时先构建数据集，再以内存映射方式打开。
+    构建时使用磁盘标签缓存，训练环境和评估环境之间、多次实验之间不会重复计算标签。
+    指定 feature_store 时观察值为归一化的多特征窗口，否则为收盘价窗口。
+
+    返回:
+        tuple: (数据集, 清单)
     """
-    def __init__(self, market='zh', source='baostock', codes=None, 
-                 start_date=None, end_date=None, is_train=True):
-        super(TrendPredictEnv, self).__init__()
-        
+    if dataset_dir is None:
         # 初始化数据集构建器
-        self.builder = DatasetBuilder(
+        builder = DatasetBuilder(
             market=market,
             source=source,
             codes=codes if codes else ['000001'],
@@ -23,13 +27,53 @@ class TrendPredictEnv(gym.Env):
             end_date=end_date,
             input_window=60,    # 输入窗口固定为60天
             output_window=20,   # 输出窗口固定为20天
-            train_ratio=0.8     # 训练集比例
+            train_ratio=0.8,    # 训练集比例
+            label_cache=LabelCache(),
+            feature_store=feature_store
         )
         
         # 构建数据集
-        self.dataset = self.builder.build()
-        if not self.dataset:
-            raise ValueError('数据集构建失败')
+        with span('env_build_dataset', source=source):
+            if not builder.build():
+                raise ValueError('数据集构建失败')
+        dataset_dir = builder.dataset_dir
+    with span('env_load_dataset', unit='samples') as s:
+        dataset, manifest = load_dataset(dataset_dir)
+        s.add_items(sum(arrays['y']['shape'][0] for arrays in manifest['splits'].values()))
+    if manifest['metadata'].get('horizons') is not None:
+        raise ValueError(f"环境只支持单预测期的数据集，当前数据集的预测期: {manifest['metadata']['horizons']}")
+    return dataset, manifest
+
+def observation_space_for(manifest, shape):
+    """
+    根据数据集元信息确定观察空间：归一化特征的取值在 [0, 1] 之间，收盘价只保证非负
+    """
+    normalized = manifest['metadata'].get('features') is not None
+    return spaces.Box(
+        low=0,
+        high=1 if normalized else np.inf,
+        shape=tuple(shape),
+        dtype=np.float32
+    )
+
+class TrendPredictEnv(gym.Env):
+    """
+    股票趋势预测环境
+    观察空间：60天的历史收盘价数据，或 60天 x 特征数的归一化特征
+    动作空间：0(下跌)、1(震荡)、2(上涨)
+    """
+    def __init__(self, market='zh', source='baostock', codes=None, 
+                 start_date=None, end_date=None, is_train=True, dataset_dir=None, feature_store=None):
+        """
+        参数:
+            dataset_dir (str): 已构建的分片数据集目录，指定时直接内存映射打开，不再重新构建
+            feature_store (FeatureStore): 构建数据集时使用的归一化特征缓存，默认观察值为收盘价
+        """
+        super(TrendPredictEnv, self).__init__()
+        
+        # 以内存映射方式打开数据集，只有访问到的样本才会换入内存
+        self.dataset, self.manifest = open_trend_dataset(
+            market, source, codes, start_date, end_date, dataset_dir, feature_store)
             
         # 设置是否为训练模式
         self.is_train = is_train
@@ -42,13 +86,8 @@ class TrendPredictEnv(gym.Env):
         # 定义动作空间：0(下跌)、1(震荡)、2(上涨)
         self.action_space = spaces.Discrete(3)
         
-        # 定义观察空间：60天的历史数据，值域在[0,1]之间
-        self.observation_space = spaces.Box(
-            low=0,
-            high=1,
-            shape=(60,),
-            dtype=np.float32
-        )
+        # 定义观察空间：形状与样本一致，只有归一化特征的值域在[0,1]之间
+        self.observation_space = observation_space_for(self.manifest, self.data['X'].shape[1:])
         
     def reset(self):
         """重置环境"""
@@ -0,0 +1,100 @@
+import numpy as np
+from gym import spaces
+from rl_model.trend_predict_env import open_trend_dataset, observation_space_for
+from logger.logging_config import logger
+
+class VecTrendPredictEnv:
+    """
+    批量股票趋势预测环境
+    同时维护 num_envs 个相互独立的游标，一次 step 处理所有游标，
+    观察值、奖励和结束标记都以连续的数组返回，结束的游标自动重置。
+    观察空间：60天的历史收盘价数据，或 60天 x 特征数的归一化特征
+    动作空间：0(下跌)、1(震荡)、2(上涨)
+    """
+    def __init__(self, num_envs=8, market='zh', source='baostock', codes=None,
+                 start_date=None, end_date=None, is_train=True, dataset_dir=None,
+                 max_step=None, seed=None, feature_store=None):
+        """
+        参数:
+            num_envs (int): 游标数量
+            dataset_dir (str): 已构建的分片数据集目录，指定时直接内存映射打开，不再重新构建
+            max_step (int): 每个回合的最大步数，默认为走完整个数据集
+            seed (int): 随机种子，训练模式下回合的起点随机选取
+            feature_store (FeatureStore): 构建数据集时使用的归一化特征缓存，默认观察值为收盘价
+        """
+        self.dataset, self.manifest = open_trend_dataset(
+            market, source, codes, start_date, end_date, dataset_dir, feature_store)
+        self.is_train = is_train
+        self.data = self.dataset['train'] if is_train else self.dataset['val']
+        self.num_samples = len(self.data['X'])
+        if self.num_samples < 2:
+            raise ValueError('数据集样本数不足，无法构建环境')
+
+        self.num_envs = num_envs
+        self.max_step = max_step if max_step else self.num_samples - 1
+        self.rng = np.random.default_rng(seed)
+
+        # 定义动作空间：0(下跌)、1(震荡)、2(上涨)
+        self.action_space = spaces.Discrete(3)
+        # 定义观察空间：形状与样本一致，只有归一化特征的值域在[0,1]之间
+        self.observation_space = observation_space_for(self.manifest, self.data['X'].shape[1:])
+
+        # 兼容 ElegantRL 的环境属性
+        self.env_name = 'VecTrendPredictEnv'
+        self.env_num = num_envs
+        self.state_dim = int(np.prod(self.observation_space.shape))
+        self.action_dim = 3
+        self.if_discrete = True
+
+        self.cursors = np.zeros(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+
+    def _start_positions(self, env_ids):
+        """新回合的起点：训练模式随机选取，评估模式下各游标固定从均匀分布在数据集上的位置开始"""
+        if self.is_train:
+            return self.rng.integers(0, self.num_samples - 1, size=len(env_ids))
+        return env_ids * (self.num_samples - 1) // self.num_envs
+
+    def _observe(self):
+        return np.ascontiguousarray(self.data['X'][self.cursors], dtype=np.float32)
+
+    def reset(self):
+        """重置所有游标，返回形状为 (num_envs, 60) 的观察值"""
+        self.cursors[:] = self._start_positions(np.arange(self.num_envs))
+        self.steps[:] = 0
+        return self._observe()
+
+    def step(self, actions):
+        """
+        所有游标同时执行一步交互。
+
+        参数:
+            actions (ndarray): 形状为 (num_envs,) 的动作
+
+        返回:
+            tuple: (观察值 float32[num_envs, 60], 奖励 float32[num_envs], 结束标记 bool[num_envs], {})
+                结束的游标已自动重置，返回的是新回合的第一个观察值
+        """
+        actions = np.asarray(actions).reshape(self.num_envs)
+        # 获取当前真实标签
+        true_labels = self.data['y'][self.cursors]
+
+        # 计算奖励：预测正确得1分，预测错误得-1分
+        rewards = np.where(actions == true_labels, 1.0, -1.0).astype(np.float32)
+
+        # 更新索引
+        self.cursors += 1
+        self.steps += 1
+        dones = (self.steps >= self.max_step) | (self.cursors >= self.num_samples - 1)
+
+        # 自动重置结束的游标
+        if dones.any():
+            self.cursors[dones] = self._start_positions(np.flatnonzero(dones))
+            self.steps[dones] = 0
+
+        return self._observe(), rewards, dones, {}
+
+    def render(self, mode='human'):
+        """渲染环境"""
+        if mode == 'human':
+            logger.info(f'当前索引: {self.cursors.tolist()}')
@@ -1,7 +1,14 @@
+import os
 import pytest
+import multiprocessing
+import baostock as bs
+import numpy as np
 import pandas as pd
+from types import SimpleNamespace
 from datetime import datetime
 from data.RL_data.data_factory import DataSourceFactory
+from data.RL_data import baostock_data
+from data.RL_data.baostock_data import BaostockDataFetcher
 
 class TestBaostockDataFetcher:
     @pytest.fixture(autouse=True)
@@ -74,4 +81,138 @@ class TestBaostockDataFetcher:
         
         assert isinstance(df, pd.DataFrame)
         assert df.empty
-        assert list(df.columns) == ["date", "code", "open", "high", "low", "close", "volume", "amount"] 
\ No newline at end of file
+        assert list(df.columns) == ["date", "code", "open", "high", "low", "close", "volume", "amount"] 
+class FakeResultData:
+    """模拟 baostock 的查询结果"""
+    def __init__(self, code, start_date, end_date):
+        self.error_code = '0'
+        self.error_msg = ''
+        dates = pd.bdate_range(start_date, end_date).strftime('%Y-%m-%d')
+        self.data = [[date, code, '10.0', '11.0', '9.0', '10.5', '1000', '10500.0'] for date in dates]
+        self.cur_row_num = 0
+
+    def next(self):
+        return self.cur_row_num < len(self.data)
+
+    def get_row_data(self):
+        row = self.data[self.cur_row_num]
+        self.cur_row_num += 1
+        return row
+
+class TestBaostockMultiProcess:
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch, tmp_path):
+        if multiprocessing.get_start_method() != 'fork':
+            pytest.skip('需要 fork 启动方式，子进程才能继承模拟的 baostock 接口')
+        self.login_log = tmp_path / 'logins.txt'
+        self.logout_log = tmp_path / 'logouts.txt'
+        login_log, logout_log = self.login_log, self.logout_log
+
+        def fake_login():
+            with open(login_log, 'a') as f:
+                f.write(f'{os.getpid()}\n')
+            return SimpleNamespace(error_code='0', error_msg='')
+
+        def fake_logout():
+            with open(logout_log, 'a') as f:
+                f.write(f'{os.getpid()}\n')
+
+        monkeypatch.setattr(bs, 'login', fake_login)
+        monkeypatch.setattr(bs, 'logout', fake_logout)
+        monkeypatch.setattr(bs, 'query_history_k_data_plus',
+                            lambda code, fields, start_date, end_date, frequency, adjustflag:
+                            FakeResultData(code, start_date, end_date))
+        self.codes = [f'{i:06d}' for i in range(1, 11)] + ['600000', '600036']
+
+    def test_parallel_matches_serial(self):
+        """多进程获取的结果与串行获取一致，每个子进程只登录一次并在退出时登出"""
+        parallel = BaostockDataFetcher('zh', '20240101', '20240131', self.codes, workers=3, chunk_size=2)
+        assert not self.login_log.exists(), '多进程模式下主进程不需要登录'
+        df = parallel._fetch_day_trade_data(self.codes, '20240101', '20240131')
+
+        pids = self.login_log.read_text().split()
+        assert 1 <= len(pids) <= 3
+        assert len(set(pids)) == len(pids)
+        assert sorted(self.logout_log.read_text().split()) == sorted(pids)
+
+        serial = BaostockDataFetcher('zh', '20240101', '20240131', self.codes)
+        expected = serial._fetch_day_trade_data(self.codes, '20240101', '20240131')
+        pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True))
+        assert set(df['code']) == set(self.codes)
+
+class FakePagedResultData(FakeResultData):
+    """模拟分页返回的查询结果：当前页读完后 next() 请求下一页"""
+    def __init__(self, code, start_date, end_date, per_page=4):
+        super().__init__(code, start_date, end_date)
+        self.pages = [self.data[i:i + per_page] for i in range(0, len(self.data), per_page)]
+        self.requests = 1
+        self.data = self.pages.pop(0) if self.pages else []
+
+    def next(self):
+        if self.cur_row_num < len(self.data):
+            return True
+        if not self.pages:
+            return False
+        self.data = self.pages.pop(0)
+        self.cur_row_num = 0
+        self.requests += 1
+        return True
+
+    def get_row_data(self):
+        pytest.fail('应该按页整块读取，而不是逐行读取')
+
+class TestBaostockParsing:
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        self.results = []
+
+        def fake_query(code, fields, start_date, end_date, frequency, adjustflag):
+            assert fields.split(',') == baostock_data.FIELDS
+            result = FakePagedResultData(code, start_date, end_date)
+            self.results.append(result)
+            return result
+
+        monkeypatch.setattr(bs, 'query_history_k_data_plus', fake_query)
+
+    def test_reads_pages_in_blocks(self):
+        """按页整块读取到预先分配的数组中，每一页只请求一次"""
+        rows = baostock_data._query_rows(['sh.600000', 'sz.000001'], '2024-01-01', '2024-01-31')
+        expected = FakeResultData('sh.600000', '2024-01-01', '2024-01-31').data
+        assert rows.shape == (2 * len(expected), len(baostock_data.FIELDS))
+        assert rows[:len(expected)].tolist() == expected
+        assert [result.requests for result in self.results] == [6, 6]
+
+    def test_parse_rows(self):
+        """日期去掉连字符，代码只保留数字，数值无法解析的行被过滤"""
+        rows = np.array([
+            ['2024-01-02', 'sh.600000', '10.0', '11.0', '9.0', '10.5', '1000', '10500.0'],
+            ['2024-01-03', 'sh.600000', '10.5', '11.5', '9.5', '11.0', '', ''],
+            ['2024-01-02', 'sz.000001', ' 8.0', '8.5', '7.5', '8.2', '2000', '16400.0'],
+        ], dtype=object)
+        df = baostock_data._parse_rows(rows)
+        assert list(df.columns) == baostock_data.FIELDS
+        assert df['date'].tolist() == ['20240102', '20240102']
+        assert df['code'].tolist() == ['600000', '000001']
+        assert df['open'].tolist() == [10.0, 8.0]
+        assert df['amount'].dtype == np.float64
+
+    def test_parse_thousands_separator(self, caplog):
+        """带千位分隔符的数值正常解析，过滤的行数记录在日志中"""
+        rows = np.array([
+            ['2024-01-02', 'sh.600000', '1,234.5', '1,240.0', '1,230.0', '1,235.0', '1,000', '1,235,000.0'],
+            ['2024-01-03', 'sh.600000', '1,235.0', '1,241.0', '1,231.0', '1,236.0', '', ''],
+        ], dtype=object)
+        with caplog.at_level('WARNING'):
+            df = baostock_data._parse_rows(rows)
+        assert df['open'].tolist() == [1234.5]
+        assert df['amount'].tolist() == [1235000.0]
+        assert '1 行' in caplog.text
+
+    def test_fetch_day_trade_data(self, monkeypatch):
+        monkeypatch.setattr(bs, 'login', lambda: SimpleNamespace(error_code='0', error_msg=''))
+        monkeypatch.setattr(bs, 'logout', lambda: None)
+        fetcher = BaostockDataFetcher('zh', '20240101', '20240131', ['600000', '000001'])
+        df = fetcher._fetch_day_trade_data(['600000', '000001'], '20240101', '20240131')
+        assert df['code'].unique().tolist() == ['600000', '000001']
+        assert df['date'].iloc[0] == '20240101'
+        assert df['close'].dtype == np.float64
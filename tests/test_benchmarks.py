@@ -0,0 +1,39 @@
+import json
+from benchmarks import run_benchmarks
+
+class TestBenchmarks:
+    def test_run_and_compare(self, tmp_path):
+        """小规模运行基准测试，结果写入 JSON 并能与基准对比"""
+        output = tmp_path / 'result.json'
+        argv = ['--codes', '3', '--days', '120', '--repeat', '1', '--max-windows', '20',
+                '--env-steps', '64', '--num-envs', '8', '--output', str(output),
+                '--stages', 'zigzag_pivots,analyze_trend_batch,build_samples,handle_cached_data']
+        assert run_benchmarks.main(argv) == 0
+
+        report = json.loads(output.read_text(encoding='utf-8'))
+        stages = [item['stage'] for item in report['results']]
+        assert stages == ['zigzag_pivots', 'analyze_trend_batch', 'build_samples', 'handle_cached_data']
+        assert all(item['throughput'] > 0 and item['peak_memory_mb'] >= 0 for item in report['results'])
+        assert report['config']['codes'] == 3
+
+        slower = json.loads(json.dumps(report))
+        for item in slower['results']:
+            item['throughput'] *= 10
+        assert run_benchmarks.compare(report, slower, 0.2) == [
+            f"{stage}: 吞吐量为基准的 10%" for stage in stages
+        ]
+
+    def test_only_selected_stages_are_prepared(self, tmp_path, monkeypatch):
+        """只运行部分阶段时，不做其他阶段的准备工作"""
+        def fail(*args, **kwargs):
+            raise AssertionError('未选择的阶段不应准备')
+
+        monkeypatch.setattr(run_benchmarks, 'save_dataset', fail)
+        monkeypatch.setattr(run_benchmarks, 'make_baostock_rows', fail)
+        monkeypatch.setattr(run_benchmarks, 'to_compact', fail)
+        output = tmp_path / 'result.json'
+        argv = ['--codes', '2', '--days', '120', '--repeat', '1', '--max-windows', '10',
+                '--output', str(output), '--stages', 'analyze_trend_batch,build_samples']
+        assert run_benchmarks.main(argv) == 0
+        report = json.loads(output.read_text(encoding='utf-8'))
+        assert [item['stage'] for item in report['results']] == ['analyze_trend_batch', 'build_samples']
@@ -0,0 +1,523 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from data.RL_data import build_dataset
+from data.RL_data.build_dataset import DatasetBuilder, TREND_LABELS
+from data.RL_data.trend_analysis import TrendAnalyzer
+from data.RL_data.label_cache import LabelCache
+from data.RL_data.dataset_store import load_manifest, load_checkpoint
+from data.RL_data.feature_store import FeatureStore
+
+def make_ohlcv(codes, n_days, seed=0):
+    """生成测试用的日线数据"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=n_days).strftime('%Y%m%d')
+    frames = []
+    for code in codes:
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, size=n_days)))
+        frames.append(pd.DataFrame({
+            'date': dates,
+            'code': code,
+            'open': close,
+            'high': close * 1.01,
+            'low': close * 0.99,
+            'close': close,
+            'volume': rng.integers(1000, 10000, size=n_days).astype(np.float64)
+        }))
+    # 打乱行顺序，确保构建过程不依赖输入顺序
+    return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed)
+
+class TestDatasetBuilder:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.codes = ['000001', '600000', '000002']
+        self.builder = DatasetBuilder(
+            codes=self.codes,
+            start_date='20200101',
+            end_date='20201231',
+            input_window=30,
+            output_window=10
+        )
+        self.data = make_ohlcv(self.codes, 150)
+
+    def test_build_samples_matches_reference(self):
+        """向量化构建的样本与逐窗口构建的结果一致"""
+        samples = self.builder.build_samples(self.data)
+
+        expected_X, expected_y = [], []
+        for code in self.codes:
+            close = self.data[self.data['code'] == code].sort_values('date')['close'].values
+            for i in range(0, len(close) - 40 + 1, 5):
+                expected_X.append(close[i:i + 30])
+                trend, _ = TrendAnalyzer.analyze_stock_trend(pd.DataFrame({'close': close[i + 30:i + 40]}))
+                expected_y.append(TREND_LABELS[trend])
+
+        np.testing.assert_array_equal(samples['X'], np.array(expected_X))
+        np.testing.assert_array_equal(samples['y'], np.array(expected_y))
+        assert samples['output_windows'].shape == (len(expected_y), 10)
+
+    def test_build_samples_skips_short_codes(self):
+        """数据不足或不存在的股票不生成样本"""
+        self.builder.codes = ['000001', '999999']
+        short = self.data[self.data['code'] == '000001'].sort_values('date').head(39)
+        samples = self.builder.build_samples(short)
+        assert samples['X'].shape == (0, 30)
+        assert len(samples['y']) == 0
+
+class TestLabelCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.codes = ['000001', '600000']
+        self.data = make_ohlcv(self.codes, 150, seed=3)
+        self.cache = LabelCache(root_path=str(tmp_path / 'labelcache'))
+
+    def make_builder(self, **kwargs):
+        params = dict(codes=self.codes, start_date='20200101', end_date='20201231',
+                      input_window=30, output_window=10, label_cache=self.cache)
+        params.update(kwargs)
+        return DatasetBuilder(**params)
+
+    def test_cached_labels_match_uncached(self):
+        """使用缓存计算的标签与不使用缓存时一致，第二次构建全部命中"""
+        expected = self.make_builder(label_cache=None).build_samples(self.data)['y']
+        np.testing.assert_array_equal(self.make_builder().build_samples(self.data)['y'], expected)
+        assert self.cache.hits == 0 and self.cache.misses == len(expected)
+
+        self.cache.clear_memory()
+        np.testing.assert_array_equal(self.make_builder().build_samples(self.data)['y'], expected)
+        assert self.cache.hits == len(expected)
+
+    def test_reuse_across_input_window(self):
+        """只改变输入窗口长度时，重叠的输出窗口直接复用标签"""
+        self.make_builder(stride=1).build_samples(self.data)
+        misses = self.cache.misses
+        samples = self.make_builder(input_window=40).build_samples(self.data)
+        assert self.cache.misses == misses
+        expected = self.make_builder(input_window=40, label_cache=None).build_samples(self.data)['y']
+        np.testing.assert_array_equal(samples['y'], expected)
+
+    def test_params_change_invalidates(self, monkeypatch):
+        """输出窗口长度或分析参数变化时使用不同的缓存文件"""
+        path = self.cache.entry_path('baostock', 'zh', '000001', 10)
+        assert path != self.cache.entry_path('baostock', 'zh', '000001', 20)
+        monkeypatch.setattr(TrendAnalyzer, 'TOLERANCE_RATIO', 0.05)
+        assert path != self.cache.entry_path('baostock', 'zh', '000001', 10)
+
+    def test_dtype_is_part_of_key(self):
+        """float32 价格计算的标签不会用于 float64 构建，反之亦然"""
+        assert self.cache.entry_path('baostock', 'zh', '000001', 10) != \
+            self.cache.entry_path('baostock', 'zh', '000001', 10, np.float32)
+        compact = self.make_builder(compact=True).build_samples(self.data)['y']
+        misses = self.cache.misses
+        samples = self.make_builder().build_samples(self.data)
+        assert self.cache.misses == misses + len(samples['y'])
+        np.testing.assert_array_equal(samples['y'], self.make_builder(label_cache=None).build_samples(self.data)['y'])
+        expected = self.make_builder(compact=True, label_cache=None).build_samples(self.data)['y']
+        np.testing.assert_array_equal(self.make_builder(compact=True).build_samples(self.data)['y'], expected)
+        np.testing.assert_array_equal(compact, expected)
+
+    def test_stores_last_pivots(self):
+        """缓存中保存最后4个枢纽点"""
+        samples = self.make_builder().build_samples(self.data)
+        assert self.cache.misses == len(samples['y'])
+        entry = np.load(self.cache.entry_path('baostock', 'zh', '000001', 10))
+        assert entry['pivot_positions'].shape == (len(entry['keys']), 4)
+        assert entry['labels'].dtype == np.int8
+        close = self.data[self.data['code'] == '000001'].sort_values('date')['close'].values
+        _, pivots = TrendAnalyzer.analyze_stock_trend(pd.DataFrame({'close': close[30:40]}))
+        assert entry['pivot_counts'][0] == len(pivots)
+        np.testing.assert_allclose(entry['pivot_prices'][0][-min(4, len(pivots)):],
+                                   [p['price'] for p in pivots[-4:]], rtol=1e-6)
+
+class TestParallelBuild:
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        self.codes = [f'{600000 + i:06d}' for i in range(8)]
+        self.data = make_ohlcv(self.codes, 300, seed=5)
+        # 测试数据较少，强制使用进程池
+        monkeypatch.setattr(DatasetBuilder, 'MIN_PARALLEL_WINDOWS', 0)
+        self.pools = []
+        original = build_dataset.ProcessPoolExecutor
+
+        def recording_pool(*args, **kwargs):
+            self.pools.append(kwargs.get('max_workers'))
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(build_dataset, 'ProcessPoolExecutor', recording_pool)
+
+    def make_builder(self, **kwargs):
+        params = dict(codes=self.codes, start_date='20200101', end_date='20201231',
+                      input_window=30, output_window=10, stride=2)
+        params.update(kwargs)
+        return DatasetBuilder(**params)
+
+    def test_matches_serial(self):
+        """多进程构建的样本与串行构建逐字节一致"""
+        serial = self.make_builder().build_samples(self.data)
+        assert self.pools == []
+        parallel = self.make_builder(workers=3).build_samples(self.data)
+        assert self.pools == [3]
+        for key in ['X', 'y', 'output_windows']:
+            assert parallel[key].dtype == serial[key].dtype
+            assert parallel[key].tobytes() == serial[key].tobytes()
+
+    def test_chunks_follow_code_boundaries(self):
+        """按股票边界分批，同一只股票的窗口总在同一批中"""
+        counts = [10, 3, 50, 7, 30]
+        bounds = DatasetBuilder.chunk_bounds(counts, 4)
+        assert bounds[0] == 0 and bounds[-1] == 100
+        assert set(bounds) <= set(np.concatenate([[0], np.cumsum(counts)]))
+        assert bounds == sorted(set(bounds))
+        assert DatasetBuilder.chunk_bounds([100], 8) == [0, 100]
+
+    def test_label_cache(self, tmp_path):
+        """使用标签缓存时未命中的窗口也并行计算，写入缓存的枢纽点一致"""
+        expected = self.make_builder().build_samples(self.data)['y']
+        cache = LabelCache(root_path=str(tmp_path / 'labelcache'))
+        labels = self.make_builder(workers=2, label_cache=cache).build_samples(self.data)['y']
+        assert labels.tobytes() == expected.tobytes()
+        assert self.pools == [2]
+        serial_cache = LabelCache(root_path=str(tmp_path / 'serial'))
+        self.make_builder(label_cache=serial_cache).build_samples(self.data)
+        for code in self.codes:
+            parallel_entry = np.load(cache.entry_path('baostock', 'zh', code, 10))
+            serial_entry = np.load(serial_cache.entry_path('baostock', 'zh', code, 10))
+            for key in serial_entry.files:
+                np.testing.assert_array_equal(parallel_entry[key], serial_entry[key])
+
+class TestStreamingBuild:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.codes = ['000001', '600000', '000002', '600001', '000003']
+        self.data = make_ohlcv(self.codes, 120, seed=5)
+        self.dataset_dir = str(tmp_path / 'dataset')
+        self.fetched = []
+        self.builder = DatasetBuilder(codes=self.codes, start_date='20200101', end_date='20201231',
+                                      input_window=30, output_window=10)
+        self.builder.fetch_data = self.fake_fetch
+
+    def fake_fetch(self, codes=None, strict=False):
+        self.fetched.append(list(codes))
+        return self.data[self.data['code'].isin(codes)]
+
+    def sorted_rows(self, X):
+        return X[np.lexsort(X.T[::-1])]
+
+    def test_streaming_matches_in_memory_samples(self):
+        """流式构建的样本与一次性构建的样本相同，只是划分顺序不同"""
+        dataset = self.builder.build_streaming(batch_size=2, shard_size=16, dataset_dir=self.dataset_dir)
+        assert self.fetched == [self.codes[0:2], self.codes[2:4], self.codes[4:5]]
+        samples = self.builder.build_samples(self.data)
+
+        X = np.concatenate([np.asarray(dataset['train']['X']), np.asarray(dataset['val']['X'])])
+        np.testing.assert_array_equal(self.sorted_rows(X), self.sorted_rows(samples['X']))
+        assert len(dataset['train']['y']) + len(dataset['val']['y']) == len(samples['y'])
+        assert not os.path.exists(os.path.join(self.dataset_dir, 'checkpoint.json'))
+        assert load_manifest(self.dataset_dir)['metadata']['batch_size'] == 2
+
+    def test_resume_after_interrupt(self):
+        """中断后再次构建从下一只未处理的股票继续"""
+        def failing_fetch(codes=None, strict=False):
+            if codes[0] == '000003':
+                raise RuntimeError('interrupted')
+            return self.fake_fetch(codes)
+
+        self.builder.fetch_data = failing_fetch
+        with pytest.raises(RuntimeError):
+            self.builder.build_streaming(batch_size=2, shard_size=16, dataset_dir=self.dataset_dir)
+        assert os.path.exists(os.path.join(self.dataset_dir, 'checkpoint.json'))
+
+        self.fetched.clear()
+        self.builder.fetch_data = self.fake_fetch
+        dataset = self.builder.build_streaming(batch_size=2, shard_size=16, dataset_dir=self.dataset_dir)
+        assert self.fetched == [['000003']]
+        total = len(dataset['train']['y']) + len(dataset['val']['y'])
+        assert total == len(self.builder.build_samples(self.data)['y'])
+
+    def test_resume_removes_unrecorded_shards(self, monkeypatch):
+        """写完分片、保存断点之前中断时，多写的分片在继续构建前删除"""
+        save_checkpoint = build_dataset.save_checkpoint
+
+        def failing_checkpoint(dataset_dir, checkpoint):
+            if checkpoint['next_code'] == 5:
+                # 最后一批的分片已写入，断点还停留在上一批
+                raise RuntimeError('interrupted')
+            save_checkpoint(dataset_dir, checkpoint)
+
+        monkeypatch.setattr(build_dataset, 'save_checkpoint', failing_checkpoint)
+        with pytest.raises(RuntimeError):
+            self.builder.build_streaming(batch_size=2, shard_size=4, dataset_dir=self.dataset_dir)
+        before = set(os.listdir(self.dataset_dir))
+
+        monkeypatch.setattr(build_dataset, 'save_checkpoint', save_checkpoint)
+        # 继续构建时最后一批的样本较少，写出的分片数比中断前少
+        self.data = self.data[~((self.data['code'] == '000003') & (self.data['date'] > '20200315'))]
+        dataset = self.builder.build_streaming(batch_size=2, shard_size=4, dataset_dir=self.dataset_dir)
+        manifest = load_manifest(self.dataset_dir)
+        listed = {shard['file'] for arrays in manifest['splits'].values()
+                  for info in arrays.values() for shard in info['shards']}
+        shard_files = {name for name in os.listdir(self.dataset_dir) if name.endswith('.npy')}
+        assert shard_files == listed
+        assert before - {'checkpoint.json'} - listed
+        total = len(dataset['train']['y']) + len(dataset['val']['y'])
+        assert total == len(self.builder.build_samples(self.data)['y'])
+
+    def test_source_failure_keeps_checkpoint(self):
+        """数据源获取失败时抛出异常，断点不越过失败的股票，再次构建时重新获取"""
+        failed, broken = {'000002'}, {'000003'}
+
+        class FakeSource:
+            def __init__(source, codes):
+                source.codes = codes
+                source.failed_codes = failed & set(codes)
+
+            def get_day_trade_data(source):
+                self.fetched.append(list(source.codes))
+                if broken & set(source.codes):
+                    raise ConnectionError('connection reset')
+                return self.data[self.data['code'].isin(set(source.codes) - source.failed_codes)]
+
+        builder = DatasetBuilder(codes=self.codes, start_date='20200101', end_date='20201231',
+                                 input_window=30, output_window=10)
+        builder.factory.create_data_source = (
+            lambda source, market, start_date, end_date, codes, **kwargs: FakeSource(codes))
+        # 第二批有股票获取失败
+        with pytest.raises(RuntimeError):
+            builder.build_streaming(batch_size=2, shard_size=16, dataset_dir=self.dataset_dir)
+        assert load_checkpoint(self.dataset_dir)['next_code'] == 2
+
+        # 第三批请求出错
+        failed.clear()
+        with pytest.raises(ConnectionError):
+            builder.build_streaming(batch_size=2, shard_size=16, dataset_dir=self.dataset_dir)
+        assert load_checkpoint(self.dataset_dir)['next_code'] == 4
+
+        broken.clear()
+        self.fetched.clear()
+        dataset = builder.build_streaming(batch_size=2, shard_size=16, dataset_dir=self.dataset_dir)
+        assert self.fetched == [['000003']]
+        total = len(dataset['train']['y']) + len(dataset['val']['y'])
+        assert total == len(builder.build_samples(self.data)['y'])
+
+    def test_changed_params_restart(self):
+        """参数变化时不使用旧断点，重新开始构建"""
+        def failing_fetch(codes=None, strict=False):
+            if len(self.fetched) == 1:
+                raise RuntimeError('interrupted')
+            return self.fake_fetch(codes)
+
+        self.builder.fetch_data = failing_fetch
+        with pytest.raises(RuntimeError):
+            self.builder.build_streaming(batch_size=2, dataset_dir=self.dataset_dir)
+        self.fetched.clear()
+        self.builder.fetch_data = self.fake_fetch
+        self.builder.build_streaming(batch_size=3, dataset_dir=self.dataset_dir)
+        assert self.fetched == [self.codes[0:3], self.codes[3:5]]
+
+class TestIncrementalUpdate:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.codes = ['000001', '600000', '000002']
+        self.data = make_ohlcv(self.codes + ['600001'], 200, seed=7)
+        self.dates = sorted(self.data['date'].unique())
+        self.dataset_dir = str(tmp_path / 'dataset')
+        self.fetched = []
+
+    def make_builder(self, end_index, codes=None, **kwargs):
+        builder = DatasetBuilder(codes=codes or self.codes, start_date=self.dates[0],
+                                 end_date=self.dates[end_index], input_window=30, output_window=10, **kwargs)
+
+        def fake_fetch(codes=None, start_date=None):
+            codes = builder.codes if codes is None else codes
+            start_date = start_date or builder.start_date
+            self.fetched.append((list(codes), start_date))
+            data = self.data[self.data['code'].isin(codes)]
+            return data[data['date'].between(start_date, builder.end_date)]
+
+        builder.fetch_data = fake_fetch
+        return builder
+
+    def all_samples(self, dataset):
+        X = np.concatenate([np.asarray(dataset['train']['X']), np.asarray(dataset['val']['X'])])
+        y = np.concatenate([np.asarray(dataset['train']['y']), np.asarray(dataset['val']['y'])])
+        order = np.lexsort(X.reshape(len(X), -1).T[::-1])
+        return X[order], y[order]
+
+    def expected_samples(self, end_index, codes=None, **kwargs):
+        builder = self.make_builder(end_index, codes, **kwargs)
+        data = self.data[self.data['date'] <= self.dates[end_index]]
+        samples = builder.build_samples(data)
+        order = np.lexsort(samples['X'].reshape(len(samples['X']), -1).T[::-1])
+        return samples['X'][order], samples['y'][order]
+
+    def test_update_matches_full_build(self):
+        """增量更新后的样本与用新的 end_date 完整构建的样本相同"""
+        self.make_builder(120).build(self.dataset_dir)
+        n_before = load_manifest(self.dataset_dir)['splits']['train']['y']['shape'][0]
+        self.fetched.clear()
+
+        builder = self.make_builder(170)
+        dataset = builder.update(self.dataset_dir)
+        # 只从续接位置开始获取行情
+        assert len(self.fetched) == 1 and self.fetched[0][1] > self.dates[80]
+        X, y = self.all_samples(dataset)
+        expected_X, expected_y = self.expected_samples(170)
+        np.testing.assert_array_equal(X, expected_X)
+        np.testing.assert_array_equal(y, expected_y)
+
+        manifest = load_manifest(self.dataset_dir)
+        assert manifest['metadata']['end_date'] == self.dates[170]
+        assert manifest['splits']['train']['y']['shape'][0] > n_before
+        csv = pd.read_csv(os.path.join(self.dataset_dir, 'samples.csv'))
+        assert csv['sample_id'].tolist() == list(range(len(y)))
+
+    def test_repeated_daily_updates(self):
+        """逐日更新和一次性构建结果相同，没有新窗口时不追加样本"""
+        self.make_builder(100).build(self.dataset_dir)
+        for end_index in range(101, 131):
+            dataset = self.make_builder(end_index).update(self.dataset_dir)
+        X, y = self.all_samples(dataset)
+        expected_X, expected_y = self.expected_samples(130)
+        np.testing.assert_array_equal(X, expected_X)
+        np.testing.assert_array_equal(y, expected_y)
+
+    def test_new_code(self):
+        """新增的股票从 start_date 开始构建"""
+        self.make_builder(150).build(self.dataset_dir)
+        self.fetched.clear()
+        codes = self.codes + ['600001']
+        dataset = self.make_builder(150, codes).update(self.dataset_dir)
+        assert (['600001'], self.dates[0]) in self.fetched
+        X, _ = self.all_samples(dataset)
+        np.testing.assert_array_equal(X, self.expected_samples(150, codes)[0])
+        assert load_manifest(self.dataset_dir)['metadata']['codes'] == codes
+
+    def test_feature_store(self, tmp_path):
+        """使用特征缓存时，续接位置之前保留特征预热需要的行情"""
+        store = FeatureStore(root_path=str(tmp_path / 'featurestore'))
+        self.make_builder(120, feature_store=store).build(self.dataset_dir)
+        dataset = self.make_builder(170, feature_store=store).update(self.dataset_dir)
+        X, y = self.all_samples(dataset)
+        expected_X, expected_y = self.expected_samples(170, feature_store=store)
+        np.testing.assert_allclose(X, expected_X, atol=1e-6)
+        np.testing.assert_array_equal(y, expected_y)
+
+    def test_removes_unrecorded_shards(self):
+        """上次更新写完分片、保存清单之前中断时多写的分片在更新前删除"""
+        self.make_builder(120).build(self.dataset_dir)
+        stray = os.path.join(self.dataset_dir, 'train_X_00099.npy')
+        np.save(stray, np.zeros((2, 30)))
+        dataset = self.make_builder(170).update(self.dataset_dir)
+        assert not os.path.exists(stray)
+        np.testing.assert_array_equal(self.all_samples(dataset)[0], self.expected_samples(170)[0])
+
+    def test_default_start_date_next_day(self, tmp_path, monkeypatch):
+        """使用默认 start_date 时第二天仍是增量更新，带特征缓存的结果与完整构建一致"""
+        def set_today(today):
+            class FixedDatetime(datetime):
+                @classmethod
+                def now(cls, tz=None):
+                    return today
+            monkeypatch.setattr(build_dataset, 'datetime', FixedDatetime)
+
+        store = FeatureStore(root_path=str(tmp_path / 'featurestore'))
+        kwargs = dict(codes=['000001', '600000'], source='synthetic', input_window=30, output_window=10,
+                      feature_store=store)
+        set_today(datetime(2024, 3, 1))
+        first = DatasetBuilder(**kwargs)
+        first.build(self.dataset_dir)
+        states = load_manifest(self.dataset_dir)['code_state'].values()
+        resume_date = min(state['resume_date'] for state in states)
+
+        set_today(datetime(2024, 3, 15))
+        builder = DatasetBuilder(**kwargs)
+        assert builder.start_date > first.start_date
+        fetch_data = builder.fetch_data
+        fetched = []
+
+        def spy_fetch(codes=None, start_date=None):
+            fetched.append(start_date or builder.start_date)
+            return fetch_data(codes, start_date)
+
+        builder.fetch_data = spy_fetch
+        dataset = builder.update(self.dataset_dir)
+        # 只获取续接所需的行情，没有改为完整构建
+        assert fetched == [resume_date] and resume_date > first.start_date
+        assert load_manifest(self.dataset_dir)['metadata']['start_date'] == first.start_date
+
+        X, y = self.all_samples(dataset)
+        full = DatasetBuilder(start_date=first.start_date, end_date=builder.end_date, **kwargs)
+        samples = full.build_samples(full.fetch_data())
+        order = np.lexsort(samples['X'].reshape(len(samples['X']), -1).T[::-1])
+        np.testing.assert_allclose(X, samples['X'][order], atol=1e-6)
+        np.testing.assert_array_equal(y, samples['y'][order])
+
+    def test_changed_params_rebuild(self):
+        """构建参数变化时完整重新构建"""
+        self.make_builder(120).build(self.dataset_dir)
+        self.fetched.clear()
+        self.make_builder(170, stride=3).update(self.dataset_dir)
+        assert self.fetched == [(self.codes, self.dates[0])]
+        assert load_manifest(self.dataset_dir)['metadata']['stride'] == 3
+
+class TestMultiHorizon:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.codes = [f'{600000 + i:06d}' for i in range(4)]
+        self.data = make_ohlcv(self.codes, 200, seed=11)
+        self.horizons = [5, 10, 20]
+
+    def make_builder(self, **kwargs):
+        params = dict(codes=self.codes, start_date='20200101', end_date='20201231',
+                      input_window=30, output_window=self.horizons, stride=2)
+        params.update(kwargs)
+        return DatasetBuilder(**params)
+
+    def test_labels_per_horizon(self):
+        """每列标签是输出窗口前 h 天的趋势，最长预测期与单预测期构建一致"""
+        samples = self.make_builder().build_samples(self.data)
+        assert samples['y'].shape == (len(samples['X']), 3)
+        assert samples['output_windows'].shape[1] == 20
+        for j, h in enumerate(self.horizons):
+            trends = TrendAnalyzer.analyze_trend_batch(samples['output_windows'][:, :h])
+            np.testing.assert_array_equal(samples['y'][:, j], DatasetBuilder.trends_to_labels(trends))
+        single = self.make_builder(output_window=20).build_samples(self.data)
+        np.testing.assert_array_equal(samples['y'][:, 2], single['y'])
+        np.testing.assert_array_equal(samples['X'], single['X'])
+
+    def test_metadata(self):
+        builder = self.make_builder()
+        assert builder.output_window == 20
+        assert builder.get_metadata()['horizons'] == self.horizons
+        assert builder.default_dataset_dir().endswith('_in30_out5-10-20')
+        assert self.make_builder(output_window=20).get_metadata()['horizons'] is None
+        with pytest.raises(ValueError):
+            self.make_builder(output_window=[1, 20])
+
+    def test_label_cache(self, tmp_path):
+        """多预测期按预测期写入标签缓存，单预测期构建可以直接复用"""
+        expected = self.make_builder().build_samples(self.data)['y']
+        cache = LabelCache(root_path=str(tmp_path / 'labelcache'))
+        np.testing.assert_array_equal(self.make_builder(label_cache=cache).build_samples(self.data)['y'], expected)
+        assert cache.misses == expected.size
+        misses = cache.misses
+        single = self.make_builder(output_window=20, label_cache=cache).build_samples(self.data)['y']
+        assert cache.misses == misses
+        np.testing.assert_array_equal(single, expected[:, 2])
+
+    def test_parallel(self, monkeypatch):
+        monkeypatch.setattr(DatasetBuilder, 'MIN_PARALLEL_WINDOWS', 0)
+        serial = self.make_builder().build_samples(self.data)
+        parallel = self.make_builder(workers=2).build_samples(self.data)
+        assert parallel['y'].tobytes() == serial['y'].tobytes()
+
+    def test_build(self, tmp_path):
+        """保存的数据集和 CSV 中每个预测期一列标签"""
+        builder = self.make_builder()
+        builder.fetch_data = lambda codes=None, start_date=None: self.data
+        dataset = builder.build(str(tmp_path / 'dataset'))
+        assert dataset['train']['y'].shape[1] == 3
+        csv = pd.read_csv(os.path.join(builder.dataset_dir, 'samples.csv'))
+        assert [f'label_{h}' for h in self.horizons] == [c for c in csv.columns if c.startswith('label')]
@@ -0,0 +1,170 @@
+import os
+import time
+import pytest
+import numpy as np
+import pandas as pd
+from config.config import ConfigJson, parse_size
+from data.RL_data.market_cache import MarketDataCache
+from data.RL_data.dataset_store import save_dataset, load_dataset, load_manifest, save_manifest
+from data.RL_data.cache_manager import (
+    select_evictions, market_cache_usage, evict_market_cache, find_datasets, evict_datasets,
+    enforce_market_budget
+)
+from tests.test_market_cache import make_trade_data
+
+DAY = 86400
+
+class TestSelectEvictions:
+    def test_ttl_then_lru(self):
+        """先淘汰过期条目，仍超出容量时按访问时间从早到晚淘汰"""
+        now = 100 * DAY
+        items = [
+            {'name': 'a', 'bytes': 10, 'accessed_at': now - 1 * DAY},
+            {'name': 'b', 'bytes': 10, 'accessed_at': now - 40 * DAY},
+            {'name': 'c', 'bytes': 10, 'accessed_at': now - 3 * DAY},
+            {'name': 'd', 'bytes': 10, 'accessed_at': now - 2 * DAY},
+        ]
+        assert [item['name'] for item in select_evictions(items, max_age_days=30, now=now)] == ['b']
+        assert [item['name'] for item in select_evictions(items, max_bytes=20, now=now)] == ['b', 'c']
+        assert [item['name'] for item in select_evictions(items, 15, 30, now)] == ['b', 'c', 'd']
+        assert select_evictions(items, now=now) == []
+
+class TestMarketCacheEviction:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.root = str(tmp_path)
+        self.cache = MarketDataCache('baostock', 'zh', root_path=self.root)
+        self.cache.write(make_trade_data(['000001', '600000'], '2020-01-01', '2021-12-31'))
+        self.cache.add_coverage(['000001', '600000'], '20200101', '20211231')
+        # 最近访问 600000 的 2021 年数据
+        time.sleep(0.01)
+        self.cache.read(['600000'], '20210101', '20211231')
+
+    def test_usage(self):
+        usage = market_cache_usage(self.root)
+        assert len(usage) == 1
+        assert usage[0]['source'] == 'baostock' and usage[0]['country'] == 'zh'
+        assert usage[0]['entries'] == 4 and usage[0]['files'] == 4
+        assert usage[0]['bytes'] == sum(entry['bytes'] for entry in self.cache.entries())
+
+    def test_lru_eviction(self):
+        """按最近最少使用淘汰分区，被淘汰的年份会重新获取"""
+        recent = self.cache.partition_path('600000', 2021)
+        budget = os.path.getsize(recent)
+        result = evict_market_cache(self.root, max_bytes=budget)
+        assert result['entries'] == 3
+        assert [(entry['code'], entry['year']) for entry in self.cache.entries()] == [('600000', 2021)]
+        assert os.path.exists(recent)
+        assert sum(len(files) for _, _, files in os.walk(os.path.join(self.cache.base_path, 'objects'))) == 1
+        assert self.cache.missing_ranges('600000', '20200101', '20211231') == [('20200101', '20201231')]
+        assert self.cache.missing_ranges('000001', '20200101', '20211231') == [('20200101', '20211231')]
+
+    def test_ttl_eviction_and_dry_run(self):
+        now = time.time() + 10 * DAY
+        dry = evict_market_cache(self.root, max_age_days=5, now=now, dry_run=True)
+        assert dry['entries'] == 4
+        assert len(self.cache.entries()) == 4
+        evict_market_cache(self.root, max_age_days=5, now=now)
+        assert self.cache.entries() == []
+        assert self.cache.read(['000001'], '20200101', '20211231').empty
+
+    def test_enforce_uses_configured_budget(self, monkeypatch):
+        """只有配置了预算时才淘汰"""
+        monkeypatch.delenv('FSLLM_MARKET_CACHE_MAX_BYTES', raising=False)
+        monkeypatch.delenv('FSLLM_MARKET_CACHE_MAX_AGE_DAYS', raising=False)
+        assert enforce_market_budget(self.root) is None
+        monkeypatch.setenv('FSLLM_MARKET_CACHE_MAX_BYTES', '0')
+        assert enforce_market_budget(self.root)['entries'] == 4
+
+class TestDatasetEviction:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.root = str(tmp_path / 'cachedataset')
+        dataset = {
+            'train': {'X': np.zeros((20, 4)), 'y': np.zeros(20, dtype=np.int64)},
+            'val': {'X': np.zeros((5, 4)), 'y': np.zeros(5, dtype=np.int64)}
+        }
+        self.dirs = [os.path.join(self.root, f'dataset_{i}') for i in range(3)]
+        for i, dataset_dir in enumerate(self.dirs):
+            save_dataset(dataset, dataset_dir, {'index': i})
+            manifest = load_manifest(dataset_dir)
+            manifest['accessed_at'] = time.time() - (3 - i) * DAY
+            save_manifest(dataset_dir, manifest)
+
+    def test_access_time_tracked(self):
+        """加载数据集会更新清单中的访问时间"""
+        before = load_manifest(self.dirs[0])['accessed_at']
+        load_dataset(self.dirs[0])
+        assert load_manifest(self.dirs[0])['accessed_at'] > before
+        assert [item['path'] for item in find_datasets(self.root)] == self.dirs
+
+    def test_lru_eviction(self):
+        load_dataset(self.dirs[0])
+        size = find_datasets(self.root)[0]['bytes']
+        result = evict_datasets(self.root, max_bytes=size)
+        assert result['datasets'] == 2
+        assert [item['path'] for item in find_datasets(self.root)] == [self.dirs[0]]
+
+    def test_keep_and_ttl(self):
+        result = evict_datasets(self.root, max_age_days=1.5, keep=[self.dirs[0]])
+        assert result['datasets'] == 1
+        assert [item['path'] for item in find_datasets(self.root)] == [self.dirs[0], self.dirs[2]]
+
+    def test_unfinished_build_and_unrelated_directory(self):
+        """只有断点的未完成构建按文件修改时间淘汰，没有清单和断点的目录不是数据集，不会被淘汰"""
+        stale = os.path.join(self.root, 'dataset_old')
+        os.makedirs(stale)
+        with open(os.path.join(stale, 'checkpoint.json'), 'w', encoding='utf-8') as f:
+            f.write('{}')
+        os.utime(os.path.join(stale, 'checkpoint.json'), (0, 0))
+        unrelated = os.path.join(self.root, 'my_photos')
+        os.makedirs(unrelated)
+        pd.DataFrame({'a': [1]}).to_csv(os.path.join(unrelated, 'samples.csv'))
+        os.utime(os.path.join(unrelated, 'samples.csv'), (0, 0))
+
+        assert unrelated not in [item['path'] for item in find_datasets(self.root)]
+        evict_datasets(self.root, max_age_days=10)
+        assert not os.path.exists(stale)
+        assert os.path.exists(os.path.join(unrelated, 'samples.csv'))
+        assert len(find_datasets(self.root)) == 3
+
+    def test_build_outside_cache_dir(self, tmp_path, monkeypatch):
+        """数据集保存在自定义目录时不淘汰同级目录"""
+        from data.RL_data.build_dataset import DatasetBuilder
+        from data.RL_data import build_dataset
+        monkeypatch.setenv('FSLLM_DATASET_CACHE_MAX_AGE_DAYS', '30')
+        evicted_roots = []
+        monkeypatch.setattr(build_dataset, 'enforce_dataset_budget',
+                            lambda root, keep=(): evicted_roots.append(root))
+        parent = tmp_path / 'hz'
+        sibling = parent / 'other_project'
+        sibling.mkdir(parents=True)
+        (sibling / 'notes.txt').write_text('keep me')
+        os.utime(sibling / 'notes.txt', (0, 0))
+
+        builder = DatasetBuilder(codes=['000001'], start_date='20200101', end_date='20201231',
+                                 input_window=30, output_window=10, source='synthetic')
+        builder.build(str(parent / 'run1'))
+        assert evicted_roots == []
+        assert (sibling / 'notes.txt').exists()
+
+        builder.dataset_dir = os.path.join(build_dataset.DATASET_CACHE_DIR, 'dataset_x')
+        builder.enforce_dataset_budget()
+        assert evicted_roots == [build_dataset.DATASET_CACHE_DIR]
+
+class TestCacheBudgets:
+    def test_parse_size(self):
+        assert parse_size('1048576') == 1048576
+        assert parse_size('500M') == 500 * 1024 ** 2
+        assert parse_size('1.5gb') == int(1.5 * 1024 ** 3)
+        with pytest.raises(ValueError):
+            parse_size('abc')
+
+    def test_budgets_from_env(self, monkeypatch):
+        monkeypatch.setenv('FSLLM_DATASET_CACHE_MAX_BYTES', '20G')
+        monkeypatch.setenv('FSLLM_DATASET_CACHE_MAX_AGE_DAYS', '7')
+        monkeypatch.delenv('FSLLM_MARKET_CACHE_MAX_BYTES', raising=False)
+        monkeypatch.delenv('FSLLM_MARKET_CACHE_MAX_AGE_DAYS', raising=False)
+        budgets = ConfigJson().get_cache_budgets()
+        assert budgets['dataset'] == {'max_bytes': 20 * 1024 ** 3, 'max_age_days': 7.0}
+        assert budgets['market'] == {'max_bytes': None, 'max_age_days': None}
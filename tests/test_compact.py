@@ -0,0 +1,116 @@
+import pytest
+import numpy as np
+import pandas as pd
+from data.RL_data.compact import to_compact, dates_to_days, days_to_dates
+from data.RL_data.data_factory import DataSourceFactory
+from data.RL_data.build_dataset import DatasetBuilder
+from data.RL_data.label_cache import LabelCache
+from data.RL_data.market_cache import MarketDataCache
+from data.RL_data.replay_data import ReplayDataFetcher
+from data.RL_data.synthetic_data import generate_ohlcv
+from tests.test_market_cache import FakeDataFetcher
+
+class TestCompactFrame:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.data = generate_ohlcv(['000001', '600000'], '20191225', '20200110', seed=4)
+
+    def test_day_numbers_round_trip(self):
+        dates = np.array(['19700101', '20000229', '20191231', '20240101'])
+        days = dates_to_days(dates)
+        assert days.dtype == np.int32
+        assert days[0] == 0 and days[2] + 1 == dates_to_days(['20200101'])[0]
+        np.testing.assert_array_equal(days_to_dates(days), dates)
+
+    def test_schema(self):
+        """价格为 float32，日期为天数，代码为分类，成交量为 int64"""
+        compact = to_compact(self.data, codes=['600000', '000001', '000002'])
+        assert list(compact.columns) == list(self.data.columns)
+        assert compact['date'].dtype == np.int32
+        assert compact['close'].dtype == np.float32
+        assert compact['volume'].dtype == np.int64
+        assert list(compact['code'].cat.categories) == ['600000', '000001', '000002']
+        np.testing.assert_array_equal(days_to_dates(compact['date']), self.data['date'].to_numpy(dtype=str))
+        np.testing.assert_allclose(compact['close'], self.data['close'], rtol=1e-6)
+
+    def test_memory(self):
+        data = generate_ohlcv([f'{600000 + i:06d}' for i in range(20)], '20180101', '20201231')
+        compact = to_compact(data)
+        assert compact.memory_usage(deep=True).sum() < data.memory_usage(deep=True).sum() * 0.6
+
+    def test_empty(self):
+        compact = to_compact(pd.DataFrame(columns=self.data.columns))
+        assert compact.empty and compact['close'].dtype == np.float32
+
+class TestCompactFetchers:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.cache_root = str(tmp_path / 'cachedata')
+        self.codes = ['000001', '600000']
+        self.data = generate_ohlcv(self.codes, '20190101', '20201231', seed=2)
+        ReplayDataFetcher.clear_memory()
+        yield
+        ReplayDataFetcher.clear_memory()
+
+    def assert_matches(self, compact, standard):
+        assert compact['close'].dtype == np.float32
+        assert compact['code'].astype(str).tolist() == standard['code'].tolist()
+        np.testing.assert_array_equal(days_to_dates(compact['date']), standard['date'].to_numpy(dtype=str))
+        np.testing.assert_allclose(compact['close'], standard['close'], rtol=1e-6)
+
+    def test_synthetic(self):
+        args = ('synthetic', 'zh', '20200101', '20200331', ['600000', '000001'])
+        standard = DataSourceFactory.create_data_source(*args, seed=1).get_day_trade_data()
+        compact = DataSourceFactory.create_data_source(*args, seed=1, compact=True).get_day_trade_data()
+        self.assert_matches(compact, standard)
+
+    def test_cached_data(self):
+        """缓存中保存标准格式，读取时转换为紧凑格式"""
+        fetcher = FakeDataFetcher('zh', '20200101', '20200630', self.codes, self.data, self.cache_root)
+        fetcher.compact = True
+        compact = fetcher.get_day_trade_data()
+        expected = self.data[self.data['date'].between('20200101', '20200630')].reset_index(drop=True)
+        self.assert_matches(compact, expected)
+        cached = fetcher.cache.read(self.codes, '20200101', '20200630')
+        assert cached['date'].tolist() == expected['date'].tolist()
+
+    def test_replay(self):
+        cache = MarketDataCache('baostock', 'zh', root_path=self.cache_root)
+        cache.write(self.data)
+        cache.add_coverage(self.codes, '20190101', '20201231')
+        compact = DataSourceFactory.create_data_source(
+            'replay', 'zh', '20200301', '20200630', ['600000', 'sz.000001'],
+            cache_root=self.cache_root, compact=True).get_day_trade_data()
+        expected = pd.concat([
+            self.data[(self.data['code'] == code) & self.data['date'].between('20200301', '20200630')]
+            for code in ['600000', '000001']
+        ], ignore_index=True)
+        self.assert_matches(compact, expected)
+        assert list(compact['code'].cat.categories) == ['600000', '000001']
+
+class TestCompactBuild:
+    def test_build_samples(self):
+        """紧凑格式构建的样本与标准格式一致，特征为 float32"""
+        codes = ['000001', '600000']
+        data = generate_ohlcv(codes, '20190101', '20201231', seed=5)
+        builder = DatasetBuilder(codes=codes, start_date='20190101', end_date='20201231', source='synthetic')
+        compact_builder = DatasetBuilder(codes=codes, start_date='20190101', end_date='20201231',
+                                         source='synthetic', compact=True)
+        standard = builder.build_samples(data)
+        compact = compact_builder.build_samples(to_compact(data, codes))
+        assert compact['X'].dtype == np.float32
+        np.testing.assert_allclose(compact['X'], standard['X'], rtol=1e-6)
+        assert (compact['y'] == standard['y']).mean() > 0.99
+        assert compact_builder.get_metadata()['compact'] is True
+
+    def test_label_cache(self, tmp_path):
+        """紧凑格式的天数日期转换为字符串后查找标签缓存"""
+        codes = ['000001']
+        data = to_compact(generate_ohlcv(codes, '20190101', '20201231', seed=6), codes)
+        kwargs = dict(codes=codes, start_date='20190101', end_date='20201231', source='synthetic', compact=True)
+        expected = DatasetBuilder(**kwargs).build_samples(data)['y']
+        label_cache = LabelCache(root_path=str(tmp_path))
+        builder = DatasetBuilder(label_cache=label_cache, **kwargs)
+        np.testing.assert_array_equal(builder.build_samples(data)['y'], expected)
+        np.testing.assert_array_equal(builder.build_samples(data)['y'], expected)
+        assert label_cache.hits > 0
@@ -0,0 +1,69 @@
+import os
+import pickle
+import pytest
+import numpy as np
+from data.RL_data.dataset_store import save_dataset, load_dataset, load_manifest
+
+class TestDatasetStore:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        rng = np.random.default_rng(0)
+        self.dataset = {
+            'train': {'X': rng.normal(size=(25, 6)), 'y': rng.integers(0, 3, size=25)},
+            'val': {'X': rng.normal(size=(7, 6)), 'y': rng.integers(0, 3, size=7)}
+        }
+        self.dataset_dir = str(tmp_path / 'dataset')
+        self.metadata = {'market': 'zh', 'codes': ['000001'], 'input_window': 6}
+        save_dataset(self.dataset, self.dataset_dir, self.metadata, shard_size=10)
+
+    def test_manifest(self):
+        """清单记录形状、类型和分片，不需要加载数组即可读取"""
+        manifest = load_manifest(self.dataset_dir)
+        assert manifest['metadata'] == self.metadata
+        train_X = manifest['splits']['train']['X']
+        assert train_X['shape'] == [25, 6]
+        assert np.dtype(train_X['dtype']) == np.float64
+        assert [shard['rows'] for shard in train_X['shards']] == [10, 10, 5]
+        for shard in train_X['shards']:
+            assert os.path.exists(os.path.join(self.dataset_dir, shard['file']))
+
+    def test_lazy_loading(self):
+        """只有访问到的分片才会打开，并以内存映射方式读取"""
+        dataset, _ = load_dataset(self.dataset_dir)
+        X = dataset['train']['X']
+        assert X._opened == [None, None, None]
+        np.testing.assert_array_equal(X[12], self.dataset['train']['X'][12])
+        assert X._opened[0] is None and X._opened[2] is None
+        assert isinstance(X._opened[1], np.memmap)
+
+    def test_indexing(self):
+        dataset, _ = load_dataset(self.dataset_dir)
+        X, expected = dataset['train']['X'], self.dataset['train']['X']
+        assert len(X) == 25 and X.shape == (25, 6)
+        np.testing.assert_array_equal(X[-1], expected[-1])
+        np.testing.assert_array_equal(X[3:7], expected[3:7])
+        np.testing.assert_array_equal(X[5:23], expected[5:23])
+        np.testing.assert_array_equal(X[::4], expected[::4])
+        index = np.array([24, 0, 11, 11, -2])
+        np.testing.assert_array_equal(X[index], expected[index])
+        np.testing.assert_array_equal(np.asarray(X), expected)
+        np.testing.assert_array_equal(np.asarray(dataset['val']['y']), self.dataset['val']['y'])
+        with pytest.raises(IndexError):
+            X[25]
+
+    def test_pickle_reopens_shards(self):
+        """序列化时不携带已打开的内存映射"""
+        dataset, _ = load_dataset(self.dataset_dir)
+        X = dataset['train']['X']
+        X[0]
+        restored = pickle.loads(pickle.dumps(X))
+        assert restored._opened == [None, None, None]
+        np.testing.assert_array_equal(restored[0], self.dataset['train']['X'][0])
+
+    def test_resave_removes_old_shards(self):
+        small = {'train': {'X': np.zeros((3, 6)), 'y': np.zeros(3)}, 'val': {'X': np.zeros((0, 6)), 'y': np.zeros(0)}}
+        save_dataset(small, self.dataset_dir, self.metadata, shard_size=10)
+        files = sorted(f for f in os.listdir(self.dataset_dir) if f.endswith('.npy'))
+        assert files == ['train_X_00000.npy', 'train_y_00000.npy']
+        dataset, _ = load_dataset(self.dataset_dir)
+        assert len(dataset['val']['X']) == 0
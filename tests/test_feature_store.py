@@ -0,0 +1,133 @@
+import os
+import pytest
+import numpy as np
+from data.RL_data.build_dataset import DatasetBuilder
+from data.RL_data.compact import to_compact
+from data.RL_data.dataset_store import save_dataset, load_manifest
+from data.RL_data.feature_store import FeatureStore, compute_features, DEFAULT_FEATURES
+from data.RL_data.synthetic_data import generate_ohlcv
+
+class TestComputeFeatures:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.data = generate_ohlcv(['600000'], '20190101', '20201231', seed=3)
+
+    def test_normalized(self):
+        """所有特征都在 [0, 1] 之间，没有 NaN"""
+        features = compute_features(self.data)
+        assert features.shape == (len(self.data), len(DEFAULT_FEATURES))
+        assert features.dtype == np.float32
+        assert np.isfinite(features).all()
+        assert features.min() >= 0 and features.max() <= 1
+
+    def test_causal(self):
+        """特征只依赖当天及之前的数据，追加新数据不改变已有的特征"""
+        full = compute_features(self.data)
+        head = compute_features(self.data.iloc[:200])
+        np.testing.assert_array_equal(full[:200], head)
+
+    def test_flat_prices(self):
+        """价格不变时特征取中性值"""
+        data = self.data.iloc[:30].copy()
+        data[['open', 'high', 'low', 'close']] = 10.0
+        data['volume'] = 1000.0
+        features = compute_features(data, ['close_range', 'log_return', 'volume_z', 'hl_range'])
+        np.testing.assert_allclose(features, np.tile([0.5, 0.5, 0.5, 0.0], (30, 1)))
+
+    def test_unknown_feature(self):
+        with pytest.raises(ValueError):
+            compute_features(self.data, ['rsi'])
+
+class TestFeatureStore:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.root = str(tmp_path / 'featurestore')
+        self.data = generate_ohlcv(['600000'], '20190101', '20201231', seed=3)
+
+    def test_cache_hit(self):
+        """日期完全一致时复用缓存，内存清空后从磁盘读取"""
+        store = FeatureStore(root_path=self.root)
+        features = store.get('synthetic', 'zh', '600000', self.data)
+        assert os.path.exists(store.entry_path('synthetic', 'zh', '600000'))
+        store.clear_memory()
+        np.testing.assert_array_equal(store.get('synthetic', 'zh', '600000', self.data), features)
+        assert (store.hits, store.misses) == (1, 1)
+
+    def test_dates_changed(self):
+        """日期范围变化时重新计算"""
+        store = FeatureStore(root_path=self.root)
+        store.get('synthetic', 'zh', '600000', self.data)
+        features = store.get('synthetic', 'zh', '600000', self.data.iloc[:100])
+        assert len(features) == 100 and store.misses == 2
+
+    def test_compact_dates(self):
+        """紧凑格式的天数日期与字符串日期对应同一个缓存条目"""
+        store = FeatureStore(root_path=self.root)
+        store.get('synthetic', 'zh', '600000', self.data)
+        store.clear_memory()
+        store.get('synthetic', 'zh', '600000', to_compact(self.data))
+        assert store.hits == 1
+
+    def test_params_hash(self):
+        assert FeatureStore(lookback=10).params_hash() != FeatureStore(lookback=20).params_hash()
+        with pytest.raises(ValueError):
+            FeatureStore(features=['rsi'])
+
+class TestFeatureDataset:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.codes = ['000001', '600000']
+        self.data = generate_ohlcv(self.codes, '20190101', '20201231', seed=5)
+        self.store = FeatureStore(root_path=str(tmp_path / 'featurestore'))
+        self.kwargs = dict(codes=self.codes, start_date='20190101', end_date='20201231', source='synthetic')
+
+    def test_feature_windows(self):
+        """X 为特征矩阵上的滑动窗口，标签与收盘价样本一致"""
+        builder = DatasetBuilder(feature_store=self.store, **self.kwargs)
+        samples = builder.build_samples(self.data)
+        standard = DatasetBuilder(**self.kwargs).build_samples(self.data)
+        n_features = len(DEFAULT_FEATURES)
+        assert samples['X'].shape == (len(standard['y']), 60, n_features)
+        assert samples['X'].dtype == np.float32
+        np.testing.assert_array_equal(samples['y'], standard['y'])
+        np.testing.assert_array_equal(samples['input_windows'], standard['input_windows'])
+
+        # 第二只股票的第3个窗口
+        features = compute_features(self.data[self.data['code'] == '600000'])
+        n_first = (len(self.data[self.data['code'] == '000001']) - 80) // builder.stride + 1
+        begin = 2 * builder.stride
+        np.testing.assert_array_equal(samples['X'][n_first + 2], features[begin:begin + 60])
+
+    def test_metadata_and_dir(self):
+        builder = DatasetBuilder(feature_store=self.store, **self.kwargs)
+        assert builder.get_metadata()['features'] == self.store.params()
+        assert DatasetBuilder(**self.kwargs).get_metadata()['features'] is None
+        assert builder.default_dataset_dir() != DatasetBuilder(**self.kwargs).default_dataset_dir()
+
+    def test_empty(self):
+        builder = DatasetBuilder(feature_store=self.store, **self.kwargs)
+        samples = builder.build_samples(self.data.iloc[:50])
+        assert samples['X'].shape == (0, 60, len(DEFAULT_FEATURES))
+
+class TestFeatureObservationSpace:
+    def test_bounds(self, tmp_path):
+        """归一化特征的观察空间为 [0, 1]，收盘价为 [0, inf)"""
+        pytest.importorskip('gym')
+        from rl_model.trend_predict_env import TrendPredictEnv
+        rng = np.random.default_rng(0)
+        dataset = {split: {'X': rng.random(size=(10, 60, 5)).astype(np.float32), 'y': rng.integers(0, 3, size=10)}
+                   for split in ('train', 'val')}
+        feature_dir = str(tmp_path / 'features')
+        save_dataset(dataset, feature_dir, {'features': FeatureStore().params()})
+        env = TrendPredictEnv(dataset_dir=feature_dir)
+        assert env.observation_space.shape == (60, 5)
+        assert env.observation_space.contains(env.reset())
+
+        close_dir = str(tmp_path / 'close')
+        dataset = {split: {'X': rng.random(size=(10, 60)) * 50, 'y': rng.integers(0, 3, size=10)}
+                   for split in ('train', 'val')}
+        save_dataset(dataset, close_dir, {'input_window': 60})
+        env = TrendPredictEnv(dataset_dir=close_dir)
+        assert env.observation_space.shape == (60,)
+        assert np.isinf(env.observation_space.high).all()
+        assert 'features' not in load_manifest(close_dir)['metadata']
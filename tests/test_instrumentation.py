@@ -0,0 +1,74 @@
+import tracemalloc
+import pytest
+import numpy as np
+from logger.instrumentation import Instrumentation
+from data.RL_data.data_factory import DataSourceFactory
+from logger import instrumentation as instrumentation_module
+
+class TestInstrumentation:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.instrumentation = Instrumentation()
+
+    def test_span_accumulates_by_stage_and_labels(self):
+        """同一阶段和标签的多次运行累加，吞吐量为处理量除以耗时"""
+        for _ in range(2):
+            with self.instrumentation.span('fetch', source='a') as s:
+                s.add_items(10)
+        with self.instrumentation.span('fetch', items=5, source='b'):
+            pass
+
+        stats = self.instrumentation.stats()
+        assert [(item['stage'], item['labels'], item['calls'], item['items']) for item in stats] == [
+            ('fetch', {'source': 'a'}, 2, 20),
+            ('fetch', {'source': 'b'}, 1, 5),
+        ]
+        assert stats[0]['throughput'] == pytest.approx(20 / stats[0]['seconds'])
+        assert stats[0]['peak_memory'] is None or not tracemalloc.is_tracing()
+
+    def test_span_records_on_error(self):
+        """阶段内抛出异常时仍然记录"""
+        with pytest.raises(RuntimeError):
+            with self.instrumentation.span('build'):
+                raise RuntimeError('failed')
+        assert self.instrumentation.stats()[0]['calls'] == 1
+
+    def test_nested_peak_memory(self):
+        """开启 tracemalloc 时内外层阶段各自记录峰值内存"""
+        was_tracing = tracemalloc.is_tracing()
+        tracemalloc.start()
+        try:
+            with self.instrumentation.span('outer'):
+                before = np.ones(2_000_000)
+                del before
+                with self.instrumentation.span('inner'):
+                    inner = np.ones(500_000)
+                    del inner
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        stats = {item['stage']: item for item in self.instrumentation.stats()}
+        assert 4_000_000 <= stats['inner']['peak_memory'] < 8_000_000
+        assert stats['outer']['peak_memory'] >= 16_000_000
+
+    def test_exports(self):
+        """Prometheus 文本格式和汇总表"""
+        with self.instrumentation.span('save_dataset', items=3, unit='samples', source='x"y'):
+            pass
+        text = self.instrumentation.prometheus_text()
+        assert '# TYPE fsllm_stage_seconds_total counter' in text
+        assert 'fsllm_stage_items_total{source="x\\"y",stage="save_dataset",unit="samples"} 3' in text
+        assert 'fsllm_stage_peak_memory_bytes{' not in text or tracemalloc.is_tracing()
+
+        table = self.instrumentation.summary_table().splitlines()
+        assert table[0].split() == ['stage', 'labels', 'calls', 'seconds', 'items', 'throughput', 'peak_mb']
+        assert table[2].startswith('save_dataset')
+        assert '3 samples' in table[2]
+
+    def test_fetchers_are_instrumented(self):
+        """数据源的创建和读取会记录到全局统计"""
+        instrumentation_module.instrumentation.reset()
+        DataSourceFactory.create_data_source(
+            'synthetic', 'zh', '20200101', '20200131', ['000001']).get_day_trade_data()
+        stages = [item['stage'] for item in instrumentation_module.instrumentation.stats()]
+        assert 'create_data_source' in stages
@@ -0,0 +1,132 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+import pytest
+from logging.handlers import QueueHandler
+from logger.logging_config import Logging, RateLimitFilter, LOG_FILE_ENV
+
+def log_in_child(count):
+    for i in range(count):
+        logging.getLogger().info('child record %d', i)
+
+class SlowStream:
+    """写入较慢的输出流，写入期间持有内部锁，和带缓冲的文件对象一样在 fork 后不会重新初始化"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writing = threading.Event()
+
+    def write(self, text):
+        with self.lock:
+            self.writing.set()
+            time.sleep(0.3)
+
+    def flush(self):
+        with self.lock:
+            pass
+
+    def close(self):
+        pass
+
+def make_record(lineno=10, **extra):
+    record = logging.LogRecord('test', logging.INFO, __file__, lineno, 'value=%d', (1,), None)
+    record.__dict__.update(extra)
+    return record
+
+class TestRateLimitFilter:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.now = 0.0
+        self.filter = RateLimitFilter(clock=lambda: self.now)
+
+    def test_plain_records_pass(self):
+        """没有指定规则的日志全部通过"""
+        assert all(self.filter.filter(make_record()) for _ in range(5))
+
+    def test_rate_limit_per_call_site(self):
+        """同一位置在时间间隔内只输出一条，下一条附带省略的条数"""
+        assert self.filter.filter(make_record(rate_limit=1.0))
+        assert not self.filter.filter(make_record(rate_limit=1.0))
+        assert not self.filter.filter(make_record(rate_limit=1.0))
+        # 不同位置独立计数
+        assert self.filter.filter(make_record(lineno=11, rate_limit=1.0))
+
+        self.now = 1.5
+        record = make_record(rate_limit=1.0)
+        assert self.filter.filter(record)
+        assert record.getMessage() == 'value=1 (该位置已省略 2 条)'
+
+    def test_sampling(self):
+        """每 N 条输出一条"""
+        passed = [self.filter.filter(make_record(sample_every=3)) for _ in range(7)]
+        assert passed == [True, False, False, True, False, False, True]
+
+class TestLogging:
+    def test_queue_handler_and_single_log_file(self, tmp_path, monkeypatch):
+        """日志经过队列写入环境变量指定的同一个文件"""
+        log_path = str(tmp_path / 'logs' / 'run.logger')
+        monkeypatch.setenv(LOG_FILE_ENV, log_path)
+        try:
+            root = Logging().log('INFO')
+            assert len(root.handlers) == 1 and isinstance(root.handlers[0], QueueHandler)
+            root.info('hello %s', 'queue')
+            for _ in range(3):
+                root.info('hot path', extra={'rate_limit': 60.0})
+            Logging.stop_listener()
+            with open(log_path, encoding='utf-8') as f:
+                content = f.read()
+            assert 'hello queue' in content
+            assert content.count('hot path') == 1
+            assert Logging.log_file_path() == log_path
+        finally:
+            monkeypatch.undo()
+            Logging().log('INFO')
+
+    def test_default_path_exported_to_env(self, monkeypatch):
+        """未指定日志文件时新建的路径写入环境变量，供子进程复用"""
+        monkeypatch.delenv(LOG_FILE_ENV)
+        path = Logging.log_file_path()
+        assert os.environ[LOG_FILE_ENV] == path
+        assert Logging.log_file_path() == path
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 fork')
+    def test_child_process_flushes_on_exit(self, tmp_path, monkeypatch):
+        """fork 出的子进程通过 os._exit 退出时，队列中剩余的日志也写入文件"""
+        log_path = str(tmp_path / 'logs' / 'run.logger')
+        monkeypatch.setenv(LOG_FILE_ENV, log_path)
+        try:
+            Logging().log('INFO')
+            process = multiprocessing.get_context('fork').Process(target=log_in_child, args=(2000,))
+            process.start()
+            process.join()
+            assert process.exitcode == 0
+            Logging.stop_listener()
+            with open(log_path, encoding='utf-8') as f:
+                content = f.read()
+            assert 'child record 0' in content and 'child record 1999' in content
+        finally:
+            monkeypatch.undo()
+            Logging().log('INFO')
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='需要 fork')
+    def test_fork_while_listener_writes(self, tmp_path, monkeypatch):
+        """监听线程正在写日志时 fork，子进程不会因为继承了被占用的输出流而阻塞"""
+        monkeypatch.setenv(LOG_FILE_ENV, str(tmp_path / 'run.logger'))
+        try:
+            root = Logging().log('INFO')
+            # 与日志文件处理器一样，关闭时会刷新输出流
+            handler = logging.FileHandler(str(tmp_path / 'slow.logger'), delay=True)
+            handler.stream = stream = SlowStream()
+            Logging.listener.handlers += (handler,)
+            root.info('slow record')
+            assert stream.writing.wait(5)
+            process = multiprocessing.get_context('fork').Process(target=log_in_child, args=(1,))
+            process.start()
+            process.join(10)
+            if process.is_alive():
+                process.kill()
+            assert process.exitcode == 0
+        finally:
+            monkeypatch.undo()
+            Logging().log('INFO')
@@ -0,0 +1,242 @@
+import os
+import json
+import sqlite3
+import hashlib
+import pytest
+import numpy as np
+import pandas as pd
+from data.RL_data.market_cache import MarketDataCache
+from data.RL_data.base_data import BaseDataFetcher
+
+def make_trade_data(codes, start, end):
+    dates = pd.bdate_range(start, end).strftime('%Y%m%d')
+    return pd.concat([
+        pd.DataFrame({
+            'date': dates,
+            'code': code,
+            'open': np.arange(len(dates), dtype=np.float64),
+            'close': np.arange(len(dates), dtype=np.float64) + 1
+        })
+        for code in codes
+    ], ignore_index=True)
+
+class TestMarketDataCache:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.cache = MarketDataCache('baostock', 'zh', root_path=str(tmp_path))
+        self.data = make_trade_data(['000001', '600000'], '2019-06-01', '2021-06-30')
+        self.cache.write(self.data)
+
+    def test_partition_layout(self):
+        """按股票代码和年份分区，文件按内容的哈希命名并登记在目录中"""
+        for code in ['000001', '600000']:
+            for year in [2019, 2020, 2021]:
+                path = self.cache.partition_path(code, year)
+                file_name = os.path.basename(path)
+                assert code not in path and len(file_name) == len('0' * 64 + '.parquet')
+                with open(path, 'rb') as f:
+                    assert hashlib.sha256(f.read()).hexdigest() == file_name[:64]
+                df = pd.read_parquet(path)
+                assert set(df['code']) == {code}
+                assert df['date'].str.startswith(str(year)).all()
+        assert self.cache.partition_path('000001', 2018) is None
+        assert self.cache.verify() == []
+
+    def test_read_pushdown(self):
+        """只返回请求的股票代码、日期范围和列"""
+        df = self.cache.read(['600000'], '20200105', '20200301', columns=['date', 'close'])
+        expected = self.data[(self.data['code'] == '600000')
+                             & (self.data['date'] >= '20200105')
+                             & (self.data['date'] <= '20200301')]
+        assert list(df.columns) == ['date', 'close']
+        assert df['date'].tolist() == expected['date'].tolist()
+        assert df['close'].tolist() == expected['close'].tolist()
+
+    def test_read_missing(self):
+        """没有缓存的股票返回空数据"""
+        df = self.cache.read(['300750'], '20200101', '20201231', columns=['date', 'code'])
+        assert df.empty
+        assert list(df.columns) == ['date', 'code']
+
+    def test_write_merges_partitions(self):
+        """重复写入同一分区时按日期去重，以新数据为准"""
+        update = make_trade_data(['000001'], '2021-06-28', '2021-07-02')
+        update['close'] = -1.0
+        self.cache.write(update)
+        df = self.cache.read(['000001'], '20210601', '20210731')
+        assert not df['date'].duplicated().any()
+        assert df['date'].is_monotonic_increasing
+        assert (df[df['date'] >= '20210628']['close'] == -1.0).all()
+        assert (df[df['date'] < '20210628']['close'] != -1.0).all()
+
+    def test_coverage_merge(self):
+        """重叠和相邻的区间合并为一个"""
+        self.cache.add_coverage(['000001'], '20200101', '20200131')
+        self.cache.add_coverage(['000001'], '20200301', '20200331')
+        self.cache.add_coverage(['000001'], '20200201', '20200215')
+        assert self.cache.get_coverage('000001') == [['20200101', '20200215'], ['20200301', '20200331']]
+        self.cache.add_coverage(['000001'], '20200210', '20200305')
+        assert self.cache.get_coverage('000001') == [['20200101', '20200331']]
+        assert self.cache.get_coverage('600000') == []
+
+    def test_missing_ranges(self):
+        """只返回尚未缓存的区间"""
+        self.cache.add_coverage(['000001'], '20200101', '20200131')
+        self.cache.add_coverage(['000001'], '20200301', '20200331')
+        assert self.cache.missing_ranges('000001', '20200110', '20200120') == []
+        assert self.cache.missing_ranges('000001', '20200101', '20200401') == [
+            ('20200201', '20200229'), ('20200401', '20200401')]
+        assert self.cache.missing_ranges('000001', '20191201', '20200131') == [('20191201', '20191231')]
+        assert self.cache.missing_ranges('600000', '20200101', '20200102') == [('20200101', '20200102')]
+
+    def test_missing_ranges_for(self, monkeypatch):
+        """批量计算的缺失区间与逐只计算一致，股票数超过 QUERY_CHUNK 时分批查询"""
+        monkeypatch.setattr(MarketDataCache, 'QUERY_CHUNK', 2)
+        codes = ['000001', '600000', '000002', '300001', '600519']
+        self.cache.add_coverage(codes[:3], '20200101', '20200131')
+        self.cache.add_coverage(['600000', '600519'], '20200301', '20200331')
+        missing = self.cache.missing_ranges_for(codes, '20200101', '20200401')
+        assert list(missing) == codes
+        for code in codes:
+            assert missing[code] == self.cache.missing_ranges(code, '20200101', '20200401')
+        assert missing['300001'] == [('20200101', '20200401')]
+        assert self.cache.missing_ranges_for(codes, '20200401', '20200101') == {code: [] for code in codes}
+
+    def test_schema_created_once(self, monkeypatch):
+        """每个实例只执行一次建表语句，目录文件被删除后重新建表"""
+        calls = []
+        create_schema = MarketDataCache._create_schema
+        monkeypatch.setattr(MarketDataCache, '_create_schema',
+                            staticmethod(lambda conn: (calls.append(1), create_schema(conn))))
+        cache = MarketDataCache('baostock', 'zh', root_path=self.cache.root_path)
+        for code in ['000001', '600000', '000002']:
+            cache.get_coverage(code)
+        cache.add_coverage(['000001'], '20200101', '20200131')
+        assert len(calls) == 1
+
+        os.remove(cache.catalog_path)
+        assert cache.get_coverage('000001') == []
+        cache.add_coverage(['000001'], '20200101', '20200131')
+        assert len(calls) == 2
+        assert cache.get_coverage('000001') == [['20200101', '20200131']]
+
+    def test_rewrite_releases_old_file(self):
+        """分区内容变化后旧文件不再被引用时删除，内容相同的写入不产生新文件"""
+        old_path = self.cache.partition_path('000001', 2020)
+        self.cache.write(self.data[self.data['code'] == '000001'])
+        assert self.cache.partition_path('000001', 2020) == old_path
+
+        update = make_trade_data(['000001'], '2020-03-02', '2020-03-02')
+        update['close'] = -1.0
+        self.cache.write(update)
+        assert self.cache.partition_path('000001', 2020) != old_path
+        assert not os.path.exists(old_path)
+
+    def test_catalog_records_metadata(self):
+        """目录记录每个文件的行数、字节数、日期范围和访问时间"""
+        with sqlite3.connect(self.cache.catalog_path) as conn:
+            rows, size, start_date, end_date = conn.execute(
+                "SELECT rows, bytes, start_date, end_date FROM files WHERE code='600000' AND year=2020").fetchone()
+        expected = self.data[(self.data['code'] == '600000') & self.data['date'].str.startswith('2020')]
+        assert rows == len(expected)
+        assert size == os.path.getsize(self.cache.partition_path('600000', 2020))
+        assert (start_date, end_date) == (expected['date'].min(), expected['date'].max())
+
+    def test_verify_detects_corruption(self):
+        path = self.cache.partition_path('600000', 2019)
+        with open(path, 'ab') as f:
+            f.write(b'corrupted')
+        assert self.cache.verify() == [('600000', 2019, path)]
+
+    def test_frequency_and_adjust_are_keys(self):
+        """频率或复权方式不同的缓存互不影响"""
+        other = MarketDataCache('baostock', 'zh', root_path=self.cache.base_path[:-len('/baostock/zh')],
+                                adjust='qfq')
+        assert other.read(['000001'], '20200101', '20201231').empty
+        assert other.partition_path('000001', 2020) is None
+
+    def test_migrates_legacy_layout(self, tmp_path):
+        """旧版本按文件名存储的缓存首次打开时导入目录"""
+        legacy = tmp_path / 'legacy' / 'tushare' / 'zh'
+        os.makedirs(legacy / '000001')
+        part = make_trade_data(['000001'], '2020-01-01', '2020-01-31')
+        part.to_parquet(legacy / '000001' / '2020.parquet', index=False)
+        with open(legacy / '_coverage.json', 'w', encoding='utf-8') as f:
+            json.dump({'000001': [['20200101', '20200131']]}, f)
+
+        cache = MarketDataCache('tushare', 'zh', root_path=str(tmp_path / 'legacy'))
+        assert cache.get_coverage('000001') == [['20200101', '20200131']]
+        assert cache.read(['000001'], '20200101', '20200131')['date'].tolist() == part['date'].tolist()
+        assert not os.path.exists(legacy / '_coverage.json')
+        assert not os.path.exists(legacy / '000001')
+
+
+class FakeDataFetcher(BaseDataFetcher):
+    """从内存数据中取数的测试数据源，记录每次请求"""
+    source_name = 'fake'
+    columns = ['date', 'code', 'open', 'close']
+
+    def __init__(self, country, start_date, end_date, code_list, data, cache_root):
+        super().__init__(country, start_date, end_date, code_list)
+        self.cache = MarketDataCache(self.source_name, self.country, root_path=cache_root)
+        self.data = data
+        self.calls = []
+
+    def _fetch_day_trade_data(self, code_list, start_date, end_date):
+        self.calls.append((sorted(code_list), start_date, end_date))
+        data = self.data
+        return data[data['code'].isin(code_list) & (data['date'] >= start_date) & (data['date'] <= end_date)]
+
+class TestDeltaFetching:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.cache_root = str(tmp_path)
+        self.data = make_trade_data(['000001', '600000', '000002'], '2020-01-01', '2024-01-31')
+
+    def fetch(self, codes, start_date, end_date):
+        fetcher = FakeDataFetcher('zh', start_date, end_date, codes, self.data, self.cache_root)
+        return fetcher.get_day_trade_data(), fetcher.calls
+
+    def test_subset_served_from_cache(self):
+        """已缓存数据的子区间和子集不再访问数据源"""
+        df, calls = self.fetch(['000001', '600000'], '20200101', '20240101')
+        assert calls == [(['000001', '600000'], '20200101', '20240101')]
+        assert set(df['code']) == {'000001', '600000'}
+
+        df, calls = self.fetch(['600000'], '20210101', '20210630')
+        assert calls == []
+        expected = self.data[(self.data['code'] == '600000')
+                             & (self.data['date'] >= '20210101') & (self.data['date'] <= '20210630')]
+        assert df['date'].tolist() == expected['date'].tolist()
+
+    def test_only_gaps_are_fetched(self):
+        """只获取缺失的日期区间和股票"""
+        self.fetch(['000001', '600000'], '20200101', '20240101')
+        df, calls = self.fetch(['000001', '600000', '000002'], '20200101', '20240102')
+        assert sorted(calls) == [(['000001', '600000'], '20240102', '20240102'),
+                                 (['000002'], '20200101', '20240102')]
+        assert len(df) == len(self.data[self.data['date'] <= '20240102'])
+        assert not df.duplicated(['date', 'code']).any()
+        assert list(df.columns) == FakeDataFetcher.columns
+
+    def test_missing_ranges_single_connection(self, monkeypatch):
+        """计算全部股票的缺失区间只打开一次缓存目录"""
+        self.fetch(['000001', '600000'], '20200101', '20240101')
+        fetcher = FakeDataFetcher('zh', '20200101', '20240102', ['000001', '600000', '000002'],
+                                  self.data, self.cache_root)
+        connects = []
+        connect = fetcher.cache._connect
+
+        def counting_connect(*args, **kwargs):
+            connects.append(1)
+            return connect(*args, **kwargs)
+
+        monkeypatch.setattr(fetcher.cache, '_connect', counting_connect)
+        assert fetcher.get_missing_ranges() == {('20240102', '20240102'): ['000001', '600000'],
+                                                ('20200101', '20240102'): ['000002']}
+        assert len(connects) == 1
+
+    def test_dtypes(self):
+        df, _ = self.fetch(['000001'], '20200101', '20200131')
+        assert df['open'].dtype == 'float64'
+        assert df['close'].dtype == 'float64'
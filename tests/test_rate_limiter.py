@@ -0,0 +1,91 @@
+import pytest
+import threading
+import numpy as np
+from data.RL_data.rate_limiter import TokenBucket
+
+class FakeClock:
+    """可手动推进的时钟，sleep 直接推进时间"""
+    def __init__(self):
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+class TestTokenBucket:
+    def test_burst_then_throttle(self):
+        """桶满时允许突发，之后按扣除突发后的速率放行"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=65, per=60.0, capacity=5, clock=clock, sleep=clock.sleep)
+        for _ in range(5):
+            bucket.acquire()
+        assert clock.now == 0.0
+        bucket.acquire()
+        assert clock.now == pytest.approx(1.0)
+        for _ in range(10):
+            bucket.acquire()
+        assert clock.now == pytest.approx(11.0)
+
+    def test_refill_capped_by_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, per=1.0, capacity=5, clock=clock, sleep=clock.sleep)
+        for _ in range(5):
+            bucket.acquire()
+        clock.now += 100.0
+        for _ in range(5):
+            bucket.acquire()
+        assert clock.now == pytest.approx(100.0)
+        bucket.acquire()
+        assert clock.now > 100.0
+
+    @pytest.mark.parametrize('capacity', [None, 1, 499])
+    def test_quota_in_any_window(self, capacity):
+        """第一个周期和空闲之后的周期内调用次数都不超过配额"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=500, per=60.0, capacity=capacity, clock=clock, sleep=clock.sleep)
+        times = []
+        for _ in range(1200):
+            bucket.acquire()
+            times.append(clock.now)
+        clock.now += 600.0
+        for _ in range(1200):
+            bucket.acquire()
+            times.append(clock.now)
+        times = np.array(times)
+        assert (times < 60.0).sum() <= 500
+        counts = np.searchsorted(times, times + 60.0, side='left') - np.arange(len(times))
+        assert counts.max() <= 500
+
+    def test_min_wait(self):
+        """剩余令牌极接近1时至少等待 MIN_WAIT，不会空转"""
+        clock = FakeClock()
+        waits = []
+        bucket = TokenBucket(rate=2, per=1.0, capacity=1, clock=clock,
+                             sleep=lambda seconds: (waits.append(seconds), clock.sleep(seconds)))
+        bucket.acquire()
+        bucket.tokens = 1 - 1e-12
+        bucket.acquire()
+        assert waits == [TokenBucket.MIN_WAIT]
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=10, capacity=11)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=10, capacity=0)
+
+    def test_rate_one(self):
+        """rate=1 时默认容量为1，每个周期只允许一次调用"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, per=60.0, clock=clock, sleep=clock.sleep)
+        times = []
+        for _ in range(4):
+            bucket.acquire()
+            times.append(clock())
+        assert np.diff(times).min() >= 60.0 - 1e-9
+        assert times[-1] == pytest.approx(180.0)
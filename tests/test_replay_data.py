@@ -0,0 +1,43 @@
+import pytest
+import pandas as pd
+from data.RL_data.data_factory import DataSourceFactory
+from data.RL_data.market_cache import MarketDataCache
+from data.RL_data.replay_data import ReplayDataFetcher
+from data.RL_data.synthetic_data import generate_ohlcv
+
+class TestReplayDataFetcher:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.cache_root = str(tmp_path / 'cachedata')
+        self.codes = ['000001', '600000']
+        self.data = generate_ohlcv(self.codes, '20190101', '20201231', seed=2)
+        cache = MarketDataCache('baostock', 'zh', root_path=self.cache_root)
+        cache.write(self.data)
+        cache.add_coverage(self.codes, '20190101', '20201231')
+        ReplayDataFetcher.clear_memory()
+        yield
+        ReplayDataFetcher.clear_memory()
+
+    def create(self, start_date, end_date, codes):
+        return DataSourceFactory.create_data_source(
+            'replay', 'zh', start_date, end_date, codes, replay_source='baostock', cache_root=self.cache_root)
+
+    def test_replays_cached_range(self):
+        """按请求的股票和日期区间回放缓存中的行情"""
+        fetcher = self.create('20200301', '20200630', ['sz.000001', '600000'])
+        result = fetcher.get_day_trade_data()
+        expected = self.data[self.data['date'].between('20200301', '20200630')].reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected.astype(fetcher.dtypes), check_dtype=False)
+
+    def test_serves_from_memory(self, monkeypatch):
+        """第一次读取后的请求不再访问缓存文件"""
+        self.create('20190101', '20201231', self.codes).get_day_trade_data()
+        monkeypatch.setattr(MarketDataCache, 'read', lambda *args, **kwargs: pytest.fail('读取了缓存文件'))
+        result = self.create('20190601', '20190610', ['600000']).get_day_trade_data()
+        assert result['date'].tolist() == pd.bdate_range('20190601', '20190610').strftime('%Y%m%d').tolist()
+
+    def test_missing_codes(self):
+        """缓存中没有的股票不返回数据，也不会访问网络"""
+        result = self.create('20200101', '20200110', ['000002']).get_day_trade_data()
+        assert result.empty
+        assert list(result.columns) == ReplayDataFetcher.columns
@@ -0,0 +1,47 @@
+import os
+import pytest
+import numpy as np
+from data.RL_data.data_factory import DataSourceFactory
+from data.RL_data.synthetic_data import SyntheticDataFetcher, generate_ohlcv
+
+class TestGenerateOhlcv:
+    def test_deterministic_and_independent_of_range(self):
+        """同一股票同一天的数据与请求的区间和其他股票无关"""
+        full = generate_ohlcv(['000001', '600000'], '20200101', '20201231', seed=1)
+        part = generate_ohlcv(['600000'], '20200601', '20200630', seed=1)
+        expected = full[(full['code'] == '600000') & full['date'].between('20200601', '20200630')]
+        for col in ('open', 'high', 'low', 'close', 'volume'):
+            np.testing.assert_allclose(part[col].to_numpy(), expected[col].to_numpy())
+        assert (full['high'] >= full[['open', 'close']].max(axis=1)).all()
+        assert (full['low'] <= full[['open', 'close']].min(axis=1)).all()
+
+    def test_extending_end_date(self):
+        """延长结束日期不改变已生成日期的任何一列"""
+        short = generate_ohlcv(['600000'], '20200101', '20200601', seed=2)
+        long = generate_ohlcv(['600000'], '20200101', '20200815', seed=2)
+        head = long.iloc[:len(short)].reset_index(drop=True)
+        assert head['date'].tolist() == short['date'].tolist()
+        for col in ('open', 'high', 'low', 'close', 'volume'):
+            np.testing.assert_array_equal(head[col].to_numpy(), short[col].to_numpy())
+
+    def test_seed_changes_data(self):
+        a = generate_ohlcv(['000001'], '20200101', '20200301', seed=0)
+        b = generate_ohlcv(['000001'], '20200101', '20200301', seed=1)
+        assert not np.allclose(a['close'], b['close'])
+
+    def test_invalid_range(self):
+        with pytest.raises(ValueError):
+            generate_ohlcv(['000001'], '20200301', '20200101')
+
+class TestSyntheticDataFetcher:
+    def test_factory_creates_synthetic_source(self):
+        """工厂创建的合成数据源返回与真实数据源一致的列和类型"""
+        fetcher = DataSourceFactory.create_data_source(
+            'synthetic', 'zh', '20200101', '20200331', ['sh.600000', '000001'], seed=3)
+        assert isinstance(fetcher, SyntheticDataFetcher)
+        data = fetcher.get_day_trade_data()
+        assert list(data.columns) == fetcher.columns
+        assert data['code'].unique().tolist() == ['600000', '000001']
+        assert data['close'].dtype == np.float64
+        assert data['date'].min() >= '20200101' and data['date'].max() <= '20200331'
+        assert not os.path.exists(fetcher.cache.base_path)
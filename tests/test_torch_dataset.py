@@ -0,0 +1,94 @@
+import pytest
+import numpy as np
+from data.RL_data.dataset_store import save_dataset
+
+torch = pytest.importorskip('torch')
+from rl_model.torch_dataset import TrendDataset, ShardBatchSampler, make_data_loader
+
+class TestTrendDataset:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        rng = np.random.default_rng(0)
+        self.X = rng.random(size=(50, 60))
+        self.y = rng.integers(0, 3, size=50)
+        self.dataset_dir = str(tmp_path / 'dataset')
+        save_dataset({'train': {'X': self.X, 'y': self.y}, 'val': {'X': self.X[:10], 'y': self.y[:10]}},
+                     self.dataset_dir, {'input_window': 60}, shard_size=16)
+
+    def test_in_memory(self):
+        """内存中的 float32 数组直接共享给张量，float64 按批转换为 float32"""
+        X = self.X.astype(np.float32)
+        dataset = TrendDataset.from_dataset({'X': X, 'y': self.y})
+        features, labels = dataset[5:10]
+        assert features.dtype == torch.float32 and labels.dtype == torch.int64
+        assert np.shares_memory(features.numpy(), X)
+        np.testing.assert_array_equal(labels.numpy(), self.y[5:10])
+
+        features, labels = TrendDataset.from_dataset({'X': self.X, 'y': self.y})[[3, 1]]
+        np.testing.assert_array_equal(features.numpy(), self.X[[3, 1]].astype(np.float32))
+        assert int(TrendDataset(self.X, self.y)[7][1]) == self.y[7]
+
+    def test_from_directory(self):
+        """分片数据集以写时复制方式映射，分片内连续的一批不复制，修改张量不影响文件"""
+        dataset = TrendDataset.from_directory(self.dataset_dir, dtype=None)
+        assert len(dataset) == 50 and dataset.shard_sizes() == [16, 16, 16, 2]
+        features, labels = dataset[16:32]
+        assert isinstance(dataset.X.shard(1), np.memmap)
+        assert np.shares_memory(features.numpy(), dataset.X.shard(1))
+        features += 1
+        np.testing.assert_array_equal(np.load(f'{self.dataset_dir}/train_X_00001.npy'), self.X[16:32])
+
+        features, labels = dataset[np.array([40, 2, 33])]
+        np.testing.assert_array_equal(features.numpy(), self.X[[40, 2, 33]])
+        np.testing.assert_array_equal(labels.numpy(), self.y[[40, 2, 33]])
+        assert len(TrendDataset.from_directory(self.dataset_dir, split='val')) == 10
+
+    def test_length_mismatch(self):
+        with pytest.raises(ValueError):
+            TrendDataset(self.X, self.y[:10])
+
+class TestShardBatchSampler:
+    def test_batches_within_shards(self):
+        """每批只包含一个分片的样本，覆盖全部样本各一次"""
+        sampler = ShardBatchSampler([16, 16, 16, 2], batch_size=5, seed=1)
+        batches = list(sampler)
+        assert len(batches) == len(sampler) == 13
+        assert sorted(np.concatenate(batches).tolist()) == list(range(50))
+        for batch in batches:
+            assert batch == sorted(batch)
+            assert len({i // 16 for i in batch}) == 1
+
+    def test_deterministic_per_epoch(self):
+        sampler = ShardBatchSampler([30, 20], batch_size=8, seed=3)
+        first = list(sampler)
+        assert list(sampler) == first
+        sampler.set_epoch(1)
+        assert list(sampler) != first
+        assert list(ShardBatchSampler([30, 20], batch_size=8, seed=3)) == first
+
+    def test_drop_last_and_no_shuffle(self):
+        sampler = ShardBatchSampler([10, 7], batch_size=4, shuffle=False, drop_last=True)
+        assert list(sampler) == [[0, 1, 2, 3], [4, 5, 6, 7], [10, 11, 12, 13]]
+        assert len(sampler) == 3
+
+class TestDataLoader:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        rng = np.random.default_rng(1)
+        self.X = rng.random(size=(40, 60))
+        self.y = rng.integers(0, 3, size=40)
+        self.dataset_dir = str(tmp_path / 'dataset')
+        save_dataset({'train': {'X': self.X, 'y': self.y}, 'val': {'X': self.X[:4], 'y': self.y[:4]}},
+                     self.dataset_dir, {'input_window': 60}, shard_size=16)
+
+    @pytest.mark.parametrize('num_workers', [0, 2])
+    def test_batches(self, num_workers):
+        """多进程和单进程得到相同的批次"""
+        dataset = TrendDataset.from_directory(self.dataset_dir)
+        loader = make_data_loader(dataset, batch_size=6, seed=2, num_workers=num_workers)
+        batches = list(loader)
+        assert len(batches) == len(loader.sampler)
+        for (features, labels), rows in zip(batches, loader.sampler):
+            assert features.shape == (len(rows), 60) and features.dtype == torch.float32
+            np.testing.assert_array_equal(features.numpy(), self.X[rows].astype(np.float32))
+            np.testing.assert_array_equal(labels.numpy(), self.y[rows])
@@ -0,0 +1,113 @@
+import pytest
+import numpy as np
+import pandas as pd
+from data.RL_data.trend_analysis import TrendAnalyzer, IncrementalTrendAnalyzer
+
+class TestZigzagPivotsBatch:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        rng = np.random.default_rng(42)
+        returns = rng.normal(0, 0.02, size=(200, 20))
+        self.prices = 10 * np.exp(np.cumsum(returns, axis=1))
+        self.thresholds = rng.uniform(1.0, 5.0, size=200)
+
+    def test_matches_scalar_version(self):
+        """批量结果应与逐窗口调用完全一致"""
+        batch = TrendAnalyzer.zigzag_pivots_batch(self.prices, self.thresholds)
+        assert len(batch) == len(self.prices)
+        for window, threshold, pivots in zip(self.prices, self.thresholds, batch):
+            expected = TrendAnalyzer.zigzag_pivots(pd.DataFrame({'close': window}), pct_threshold=threshold)
+            assert pivots == expected
+
+    def test_scalar_threshold(self):
+        """标量阈值应广播到所有窗口"""
+        batch = TrendAnalyzer.zigzag_pivots_batch(self.prices, 2.0)
+        expected = TrendAnalyzer.zigzag_pivots(pd.DataFrame({'close': self.prices[3]}), pct_threshold=2.0)
+        assert batch[3] == expected
+
+    def test_empty_windows(self):
+        """空窗口返回空的枢纽点列表"""
+        assert TrendAnalyzer.zigzag_pivots_batch(np.empty((3, 0)), 2.0) == [[], [], []]
+        assert TrendAnalyzer.zigzag_pivots_batch(np.empty((0, 20)), 2.0) == []
+
+    def test_invalid_shape(self):
+        with pytest.raises(ValueError):
+            TrendAnalyzer.zigzag_pivots_batch(np.ones(20), 2.0)
+
+class TestIncrementalTrendAnalyzer:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        rng = np.random.default_rng(7)
+        self.prices = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, size=120)))
+        self.df = pd.DataFrame({'close': self.prices})
+
+    def test_fixed_threshold_matches_batch(self):
+        """固定阈值时，逐根更新的枢纽点与整段计算结果一致"""
+        analyzer = IncrementalTrendAnalyzer(pct_threshold=2.0)
+        for price in self.prices:
+            _, pivots = analyzer.update(price)
+        assert pivots == TrendAnalyzer.zigzag_pivots(self.df, pct_threshold=2.0)
+
+    def test_final_trend_matches_analyze_stock_trend(self):
+        """使用整段数据的自动阈值时，最终趋势与 analyze_stock_trend 一致"""
+        avg_abs_return = self.df['close'].pct_change().dropna().abs().mean() * 100
+        analyzer = IncrementalTrendAnalyzer(pct_threshold=TrendAnalyzer.auto_pct_threshold(avg_abs_return))
+        for _, bar in self.df.iterrows():
+            trend, pivots = analyzer.update(bar, index=bar.name)
+        assert (trend, pivots) == TrendAnalyzer.analyze_stock_trend(self.df)
+
+    def test_auto_threshold_and_reset(self):
+        """自动阈值限制在[1, 5]之间，reset 后状态清空"""
+        analyzer = IncrementalTrendAnalyzer()
+        trend, pivots = analyzer.update({'close': 10.0})
+        assert trend == "Sideways" and len(pivots) == 1
+        for price in self.prices:
+            analyzer.update(price)
+        assert 1.0 <= analyzer.pct_threshold <= 5.0
+        analyzer.reset()
+        assert analyzer.pivots == [] and analyzer.n_bars == 0
+
+class TestAnalyzeTrendBatch:
+    def test_matches_analyze_stock_trend(self):
+        """批量趋势判断与逐窗口 analyze_stock_trend 一致"""
+        rng = np.random.default_rng(0)
+        drift = rng.choice([-0.01, 0.0, 0.01], size=(300, 1))
+        prices = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(300, 20)) + drift, axis=1))
+        trends = TrendAnalyzer.analyze_trend_batch(prices)
+        expected = [TrendAnalyzer.analyze_stock_trend(pd.DataFrame({'close': w}))[0] for w in prices]
+        assert trends.tolist() == expected
+        assert {'Uptrend', 'Downtrend', 'Sideways'} <= set(expected)
+
+    def test_short_and_flat_windows(self):
+        """过短或价格不变的窗口判断为横盘"""
+        assert TrendAnalyzer.analyze_trend_batch(np.ones((2, 1))).tolist() == ["Sideways"] * 2
+        assert TrendAnalyzer.analyze_trend_batch(np.ones((2, 20))).tolist() == ["Sideways"] * 2
+
+class TestAnalyzeTrendHorizons:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        rng = np.random.default_rng(3)
+        # 一半窗口波动很小，阈值被限制在下限，各预测期共用 ZigZag 推进
+        scale = np.where(rng.random((400, 1)) < 0.5, 0.003, 0.02)
+        drift = rng.choice([-0.01, 0.0, 0.01], size=(400, 1))
+        self.prices = 10 * np.exp(np.cumsum(rng.normal(0, 1, size=(400, 40)) * scale + drift, axis=1))
+        self.prices[7, 5] = np.nan
+        self.horizons = [10, 5, 40, 20]
+
+    def test_matches_batch_per_horizon(self):
+        """每个预测期的趋势和枢纽点与对前缀单独调用 analyze_trend_batch 一致"""
+        trends, pivots = TrendAnalyzer.analyze_trend_horizons(self.prices, self.horizons, return_pivots=True)
+        assert trends.shape == (400, 4)
+        for j, h in enumerate(self.horizons):
+            expected = TrendAnalyzer.analyze_trend_batch(self.prices[:, :h], return_pivots=True)
+            assert trends[:, j].tolist() == expected[0].tolist()
+            for actual, reference in zip(pivots[j], expected[1:]):
+                np.testing.assert_array_equal(actual, reference)
+
+    def test_empty_and_invalid(self):
+        trends, pivots = TrendAnalyzer.analyze_trend_horizons(np.empty((0, 20)), [5, 20], return_pivots=True)
+        assert trends.shape == (0, 2) and len(pivots) == 2
+        with pytest.raises(ValueError):
+            TrendAnalyzer.analyze_trend_horizons(self.prices, [1, 20])
+        with pytest.raises(ValueError):
+            TrendAnalyzer.analyze_trend_horizons(self.prices, [60])
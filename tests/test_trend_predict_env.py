@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+from data.RL_data.dataset_store import save_dataset
+
+gym = pytest.importorskip('gym')
+from rl_model.trend_predict_env import TrendPredictEnv
+from rl_model.vec_trend_predict_env import VecTrendPredictEnv
+
+class TestTrendPredictEnv:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        rng = np.random.default_rng(0)
+        self.dataset = {
+            'train': {'X': rng.random(size=(30, 60)), 'y': rng.integers(0, 3, size=30)},
+            'val': {'X': rng.random(size=(10, 60)), 'y': rng.integers(0, 3, size=10)}
+        }
+        self.dataset_dir = str(tmp_path / 'dataset')
+        save_dataset(self.dataset, self.dataset_dir, {'input_window': 60}, shard_size=8)
+
+    def test_open_existing_dataset(self):
+        """指定数据集目录时直接内存映射打开，不重新构建"""
+        env = TrendPredictEnv(dataset_dir=self.dataset_dir)
+        np.testing.assert_array_equal(env.reset(), self.dataset['train']['X'][0])
+
+        observation, reward, done, _ = env.step(self.dataset['train']['y'][0])
+        assert reward == 1.0 and not done
+        np.testing.assert_array_equal(observation, self.dataset['train']['X'][1])
+
+    def test_eval_split(self):
+        env = TrendPredictEnv(dataset_dir=self.dataset_dir, is_train=False)
+        assert env.max_index == 9
+        np.testing.assert_array_equal(env.reset(), self.dataset['val']['X'][0])
+
+class TestVecTrendPredictEnv:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        rng = np.random.default_rng(1)
+        self.X = rng.random(size=(40, 60))
+        self.y = rng.integers(0, 3, size=40)
+        self.dataset_dir = str(tmp_path / 'dataset')
+        save_dataset({'train': {'X': self.X, 'y': self.y}, 'val': {'X': self.X[:12], 'y': self.y[:12]}},
+                     self.dataset_dir, {'input_window': 60}, shard_size=16)
+
+    def test_batched_step(self):
+        """批量返回 float32 观察值、奖励和结束标记"""
+        env = VecTrendPredictEnv(num_envs=4, dataset_dir=self.dataset_dir, max_step=5, seed=0)
+        observations = env.reset()
+        assert observations.shape == (4, 60) and observations.dtype == np.float32
+        assert observations.flags['C_CONTIGUOUS']
+        cursors = env.cursors.copy()
+        np.testing.assert_array_equal(observations, self.X[cursors].astype(np.float32))
+
+        actions = self.y[cursors].copy()
+        actions[0] = (actions[0] + 1) % 3
+        observations, rewards, dones, _ = env.step(actions)
+        assert rewards.dtype == np.float32
+        np.testing.assert_array_equal(rewards, [-1.0, 1.0, 1.0, 1.0])
+        assert dones.dtype == bool and not dones.any()
+        np.testing.assert_array_equal(observations, self.X[cursors + 1].astype(np.float32))
+
+    def test_auto_reset(self):
+        """达到最大步数的游标自动重置"""
+        env = VecTrendPredictEnv(num_envs=3, dataset_dir=self.dataset_dir, max_step=4, seed=0)
+        env.reset()
+        for step in range(1, 9):
+            _, _, dones, _ = env.step(np.zeros(3, dtype=np.int64))
+            assert dones.all() == (step % 4 == 0)
+        assert (env.steps == 0).all()
+
+    def test_eval_cursors_cover_dataset(self):
+        """评估模式下游标均匀分布，走到数据集末尾时结束"""
+        env = VecTrendPredictEnv(num_envs=3, dataset_dir=self.dataset_dir, is_train=False)
+        env.reset()
+        np.testing.assert_array_equal(env.cursors, [0, 3, 7])
+        assert env.max_step == 11
+        for _ in range(4):
+            _, _, dones, _ = env.step(np.zeros(3, dtype=np.int64))
+        np.testing.assert_array_equal(dones, [False, False, True])
+        np.testing.assert_array_equal(env.cursors, [4, 7, 7])
@@ -1,4 +1,6 @@
 import pytest
+import threading
+import time
 import pandas as pd
 from data.RL_data.data_factory import DataSourceFactory
 
@@ -34,4 +36,76 @@ class TestTushareDataFetcher:
         # 检查数据值是否合理
         assert df['open'].min() > 0
         assert df['close'].min() > 0
-        assert df['volume'].min() >= 0 
\ No newline at end of file
+        assert df['volume'].min() >= 0 
+class FakeTushareApi:
+    """模拟 Tushare pro 接口，记录并发调用情况"""
+    def __init__(self, failing_codes=()):
+        self.failing_codes = set(failing_codes)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+
+    def daily(self, ts_code, start_date, end_date):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.calls.append(ts_code)
+        try:
+            time.sleep(0.01)
+            if ts_code in self.failing_codes:
+                raise RuntimeError('quota exceeded')
+            dates = pd.bdate_range(start_date, end_date)
+            return pd.DataFrame({
+                'ts_code': ts_code,
+                'trade_date': dates.strftime('%Y%m%d'),
+                'open': 10.0,
+                'high': 11.0,
+                'low': 9.0,
+                'close': 10.5,
+                'vol': 1000.0
+            })
+        finally:
+            with self.lock:
+                self.active -= 1
+
+class TestTushareConcurrentFetch:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.codes = [f'{i:06d}' for i in range(1, 21)]
+
+    def create(self, api, **kwargs):
+        return DataSourceFactory().create_data_source(
+            'tushare', 'zh', '20240101', '20240131', self.codes, api=api, **kwargs)
+
+    def test_concurrent_fetch(self):
+        """多线程获取，结果与请求的股票一一对应"""
+        api = FakeTushareApi()
+        fetcher = self.create(api, max_workers=4, calls_per_minute=100000)
+        df = fetcher._fetch_day_trade_data(self.codes, '20240101', '20240131')
+        assert 1 < api.max_active <= 4
+        assert sorted(api.calls) == sorted(f'{code}.SZ' for code in self.codes)
+        assert set(df['code']) == set(self.codes)
+        assert len(df) == 20 * len(pd.bdate_range('20240101', '20240131'))
+        assert list(df.columns) == ['date', 'code', 'open', 'high', 'low', 'close', 'volume']
+        assert df['volume'].dtype == 'float64'
+
+    def test_failed_codes_are_isolated(self):
+        """单只股票失败不影响其他股票"""
+        api = FakeTushareApi(failing_codes={'000003.SZ'})
+        fetcher = self.create(api, max_workers=4, calls_per_minute=100000)
+        df = fetcher._fetch_day_trade_data(self.codes, '20240101', '20240131')
+        assert set(df['code']) == set(self.codes) - {'000003'}
+
+    def test_serial_fetch(self):
+        api = FakeTushareApi()
+        fetcher = self.create(api, max_workers=1)
+        df = fetcher._fetch_day_trade_data(self.codes[:3], '20240101', '20240131')
+        assert api.max_active == 1
+        assert set(df['code']) == set(self.codes[:3])
+
+    def test_one_call_per_minute(self):
+        """每分钟只允许调用一次时也能创建"""
+        fetcher = self.create(FakeTushareApi(), calls_per_minute=1)
+        assert fetcher.rate_limiter.capacity == 1
+        assert fetcher.rate_limiter.fill_rate == pytest.approx(1 / 60)
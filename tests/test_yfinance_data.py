@@ -1,6 +1,12 @@
 import pytest
+import asyncio
+import threading
+import yfinance as yf
+from yfinance import shared as yf_shared
 import pandas as pd
 from data.RL_data.data_factory import DataSourceFactory
+from data.RL_data.market_cache import MarketDataCache
+from data.RL_data.yfinance_data import YFinanceDownloadError, yfinance_transport
 
 class TestYFinanceDataFetcher:
     @pytest.fixture(autouse=True)
@@ -34,4 +40,122 @@ class TestYFinanceDataFetcher:
         # 检查数据值是否合理
         assert df['open'].min() > 0
         assert df['close'].min() > 0
-        assert df['volume'].min() >= 0 
\ No newline at end of file
+        assert df['volume'].min() >= 0 
+class FakeTransport:
+    """本地数据传输层，返回与 yf.download(group_by='ticker') 相同结构的数据"""
+    def __init__(self, flaky=(), missing=(), broken=()):
+        self.flaky = set(flaky)
+        self.missing = set(missing)
+        self.broken = set(broken)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def __call__(self, tickers, start, end):
+        with self.lock:
+            self.calls.append(list(tickers))
+        # 包含 flaky 股票的批量请求失败，单只请求成功
+        if len(tickers) > 1 and self.flaky & set(tickers):
+            raise TimeoutError('timeout')
+        # broken 股票的请求总是失败
+        if self.broken & set(tickers):
+            raise ConnectionError('connection reset')
+        dates = pd.date_range(start, end, freq='B', inclusive='left', name='Date')
+        frames = {}
+        for i, ticker in enumerate(tickers):
+            if ticker in self.missing:
+                continue
+            price = 100.0 + i
+            frames[ticker] = pd.DataFrame({
+                'Open': price, 'High': price + 1, 'Low': price - 1,
+                'Close': price + 0.5, 'Volume': 1000.0
+            }, index=dates)
+        if not frames:
+            return pd.DataFrame()
+        if len(tickers) == 1:
+            return frames[tickers[0]]
+        return pd.concat(frames, axis=1)
+
+class TestYFinancePipeline:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.cache_root = str(tmp_path)
+        self.codes = [f'T{i:02d}' for i in range(10)]
+
+    def create(self, transport, codes=None, **kwargs):
+        fetcher = DataSourceFactory().create_data_source(
+            'yfinance', 'us', '20240101', '20240131', codes or self.codes,
+            transport=transport, chunk_size=3, max_concurrency=2, retry_delay=0, **kwargs)
+        fetcher.cache = MarketDataCache('yfinance', 'us', root_path=self.cache_root)
+        return fetcher
+
+    def test_chunked_download(self):
+        """按批下载，结果包含所有股票且包含结束日期"""
+        transport = FakeTransport()
+        df = self.create(transport).get_day_trade_data()
+        assert sorted(len(call) for call in transport.calls) == [1, 3, 3, 3]
+        assert set(df['code']) == set(self.codes)
+        assert df['date'].max() == '20240131'
+        assert list(df.columns) == ['date', 'code', 'open', 'high', 'low', 'close', 'volume']
+
+    def test_failures_are_isolated_and_retried(self):
+        """批量失败的股票逐只重试，始终失败的股票不影响其他股票，也不记为已缓存"""
+        transport = FakeTransport(flaky={'T04'}, broken={'T08'})
+        fetcher = self.create(transport)
+        df = fetcher.get_day_trade_data()
+        assert set(df['code']) == set(self.codes) - {'T08'}
+        assert fetcher.failed_codes == {'T08'}
+        assert fetcher.cache.get_coverage('T08') == []
+        assert fetcher.cache.get_coverage('T04') == [['20240101', '20240131']]
+
+        # 再次请求只会重新获取失败的股票
+        transport.calls.clear()
+        self.create(transport).get_day_trade_data()
+        assert transport.calls and all(call == ['T08'] for call in transport.calls)
+
+    def test_empty_result_is_covered(self):
+        """区间内没有行情的股票只单独请求一次，不算失败，记为已缓存，之后不再请求"""
+        transport = FakeTransport(missing={'T07'})
+        fetcher = self.create(transport)
+        df = fetcher.get_day_trade_data()
+        assert set(df['code']) == set(self.codes) - {'T07'}
+        assert fetcher.failed_codes == set()
+        assert [call for call in transport.calls if call == ['T07']] == [['T07']]
+        assert fetcher.cache.get_coverage('T07') == [['20240101', '20240131']]
+
+        transport.calls.clear()
+        self.create(transport).get_day_trade_data()
+        assert transport.calls == []
+
+    def test_chunks_written_incrementally(self):
+        """每批下载完成后立即写入缓存"""
+        written = []
+        fetcher = self.create(FakeTransport())
+        fetcher._fetch_day_trade_data(self.codes, '20240101', '20240131',
+                                      on_chunk=lambda df, codes, start, end: written.append(sorted(codes)))
+        assert sorted(code for codes in written for code in codes) == self.codes
+        assert len(written) == 4
+
+    def test_called_inside_running_loop(self):
+        """在已有事件循环中调用时改在单独的线程中运行"""
+        async def main():
+            return self.create(FakeTransport())._fetch_day_trade_data(self.codes, '20240101', '20240131')
+        df = asyncio.run(main())
+        assert set(df['code']) == set(self.codes)
+
+    def test_recorded_errors_are_failures(self, monkeypatch):
+        """yf.download 记录在 _ERRORS 中的股票算作失败，没有行情的股票照常记为已缓存"""
+        def fake_download(tickers, start, end, **kwargs):
+            yf_shared._ERRORS = {'T01': "ConnectionError('connection reset')",
+                                 'T02': 'No data found for this date range, symbol may be delisted'}
+            return FakeTransport(missing={'T01', 'T02'})(tickers, start, end)
+        monkeypatch.setattr(yf, 'download', fake_download)
+        monkeypatch.setattr(yf_shared, '_ERRORS', {}, raising=False)
+
+        with pytest.raises(YFinanceDownloadError):
+            yfinance_transport(['T01'], '2024-01-01', '2024-02-01')
+        fetcher = self.create(yfinance_transport, codes=['T00', 'T01', 'T02'])
+        df = fetcher.get_day_trade_data()
+        assert set(df['code']) == {'T00'}
+        assert fetcher.failed_codes == {'T01'}
+        assert fetcher.cache.get_coverage('T01') == []
+        assert fetcher.cache.get_coverage('T02') == [['20240101', '20240131']]